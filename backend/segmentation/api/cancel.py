@@ -5,16 +5,120 @@ Handles cancellation of PyTorch processing jobs
 
 from fastapi import APIRouter, HTTPException, BackgroundTasks
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from dataclasses import dataclass
+from datetime import datetime, timezone
 import logging
 import asyncio
+import gc
+import threading
+import time
 import torch
 from contextlib import asynccontextmanager
 
 logger = logging.getLogger(__name__)
 
-# Global registry for active jobs
-active_jobs: Dict[str, Dict[str, Any]] = {}
+# CUDA availability cannot change after process start; probing the driver on
+# every cancel is wasted work on CPU-only / MPS deployments.
+_CUDA_AVAILABLE = torch.cuda.is_available()
+
+@dataclass(slots=True)
+class Job:
+    """Registry entry for a tracked job"""
+    type: str
+    started_at: float
+    cancelled: bool
+    cancel_event: asyncio.Event
+    cancel_reason: Optional[str] = None
+    device_idx: Optional[int] = None
+    # Wall-clock stamps, only formatted when reported to clients; durations
+    # are computed from the monotonic started_at.
+    started_at_wall: Optional[datetime] = None
+    cancelled_at: Optional[datetime] = None
+
+@dataclass(frozen=True, slots=True)
+class JobView:
+    """Point-in-time copy of a Job for reporting"""
+    job_id: str
+    type: str
+    started_at: float
+    cancelled: bool
+    started_at_wall: Optional[datetime]
+
+# Registry of active jobs, sharded by job id. Each shard has its own lock, so
+# unrelated jobs never contend and callers never see the live storage -- use
+# register_job / lookup_job / unregister_job / snapshot_active instead.
+# Must be a power of two.
+_JOB_SHARDS = 16
+_job_shards: List[Dict[str, Job]] = [{} for _ in range(_JOB_SHARDS)]
+_job_locks: List[threading.Lock] = [
+    threading.Lock() for _ in range(_JOB_SHARDS)
+]
+
+def _shard_index(job_id: str) -> int:
+    return hash(job_id) & (_JOB_SHARDS - 1)
+
+def _job_lock(job_id: str) -> threading.Lock:
+    """Return the lock guarding job_id's shard"""
+    return _job_locks[_shard_index(job_id)]
+
+def register_job(
+    job_id: str,
+    operation_type: str = "segmentation",
+    device_idx: Optional[int] = None
+) -> Job:
+    """Create and register a Job under job_id"""
+    job = Job(
+        type=operation_type,
+        started_at=time.monotonic(),
+        cancelled=False,
+        cancel_event=asyncio.Event(),
+        device_idx=device_idx,
+        started_at_wall=datetime.now(timezone.utc)
+    )
+    idx = _shard_index(job_id)
+    with _job_locks[idx]:
+        _job_shards[idx][job_id] = job
+    return job
+
+def lookup_job(job_id: str) -> Optional[Job]:
+    """Return the active Job for job_id, or None"""
+    # A single dict read is atomic under the GIL; no lock needed.
+    return _job_shards[_shard_index(job_id)].get(job_id)
+
+def unregister_job(job_id: str) -> Optional[Job]:
+    """Remove job_id from the registry, returning its Job if it was present"""
+    idx = _shard_index(job_id)
+    with _job_locks[idx]:
+        return _job_shards[idx].pop(job_id, None)
+
+def _iter_jobs() -> Iterator[Tuple[str, Job]]:
+    """Yield (job_id, Job) pairs, copying each shard under its lock"""
+    for lock, shard in zip(_job_locks, _job_shards):
+        with lock:
+            items = list(shard.items())
+        yield from items
+
+def snapshot_active() -> List[JobView]:
+    """Return an immutable view of every active job"""
+    return [
+        JobView(
+            job_id, job.type, job.started_at, job.cancelled,
+            job.started_at_wall
+        )
+        for job_id, job in _iter_jobs()
+    ]
+
+# empty_cache() walks every block in the caching allocator and synchronize()
+# is a device-wide barrier that stalls unrelated in-flight inference, so the
+# cancel path only reclaims cached memory once enough cancellations have piled
+# up, and never more often than every _EMPTY_CACHE_MIN_INTERVAL_S seconds.
+# On-demand reclamation is available via /api/v1/monitoring/gpu/clear-cache
+# (gated on memory pressure; pass ?force=true to reclaim unconditionally).
+_EMPTY_CACHE_CANCEL_THRESHOLD = 4
+_EMPTY_CACHE_MIN_INTERVAL_S = 30.0
+_pending_cancellations = 0
+_last_empty_cache_ts = float("-inf")
 
 class CancelRequest(BaseModel):
     job_id: str
@@ -29,43 +133,87 @@ class CancelResponse(BaseModel):
 router = APIRouter()
 
 @asynccontextmanager
-async def job_context(job_id: str, operation_type: str = "segmentation"):
-    """Context manager to track active jobs for cancellation"""
+async def job_context(
+    job_id: str,
+    operation_type: str = "segmentation",
+    device_idx: Optional[int] = None
+):
+    """Context manager to track active jobs for cancellation
+
+    device_idx records the CUDA device the job runs on, so cancellation
+    cleanup trims that device's cache rather than the implicit current one.
+    """
     try:
-        # Register job as active
-        active_jobs[job_id] = {
-            "type": operation_type,
-            "started_at": asyncio.get_event_loop().time(),
-            "cancelled": False,
-            "cancel_event": asyncio.Event()
-        }
+        job = register_job(job_id, operation_type, device_idx)
         logger.info(f"Started tracking job {job_id}")
-        yield active_jobs[job_id]
+        yield job
     finally:
-        # Clean up job from registry
-        if job_id in active_jobs:
-            del active_jobs[job_id]
+        if unregister_job(job_id) is not None:
             logger.info(f"Cleaned up job {job_id}")
 
 def is_job_cancelled(job_id: str) -> bool:
     """Check if a job has been cancelled"""
-    if job_id in active_jobs:
-        return active_jobs[job_id].get("cancelled", False)
-    return False
-
-def get_cancel_event(job_id: str) -> asyncio.Event:
-    """Get the cancel event for a job"""
-    if job_id in active_jobs:
-        return active_jobs[job_id]["cancel_event"]
-    return asyncio.Event()
-
-async def cleanup_gpu_resources():
-    """Clean up GPU memory and resources"""
-    try:
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
+    job = lookup_job(job_id)
+    return job.cancelled if job is not None else False
+
+def get_cancel_event(job_id: str) -> Optional[asyncio.Event]:
+    """Get the cancel event for a job, or None if the job is not active"""
+    job = lookup_job(job_id)
+    return job.cancel_event if job is not None else None
+
+def _mark_cancelled(job_id: str, job: Job, reason: str) -> None:
+    """Flag a job as cancelled and wake anything awaiting its event"""
+    with _job_lock(job_id):
+        job.cancelled = True
+        job.cancel_reason = reason
+        job.cancelled_at = datetime.now(timezone.utc)
+    job.cancel_event.set()
+
+def _release_cached_memory(devices: Tuple[Optional[int], ...]) -> None:
+    """Synchronize and trim the caching allocator on each device (blocking)"""
+    # Drop Python references first so their blocks are actually free,
+    # and let queued kernels finish before the allocator is trimmed.
+    gc.collect()
+    for device_idx in devices:
+        if device_idx is None:
+            # Never fall back to a hard-coded cuda:0 — that would create a
+            # context on device 0 for jobs running elsewhere.
+            device_idx = torch.cuda.current_device()
+        with torch.cuda.device(device_idx):
             torch.cuda.synchronize()
-            logger.info("GPU memory cleared after cancellation")
+            torch.cuda.empty_cache()
+
+async def cleanup_gpu_resources(
+    cancelled_count: int = 1, devices: Iterable[Optional[int]] = (None,)
+):
+    """Clean up GPU memory after cancellations (throttled)
+
+    devices lists the CUDA devices the cancelled jobs ran on (None for the
+    current device). The blocking trim runs in a worker thread, so it never
+    stalls the event loop.
+    """
+    global _pending_cancellations, _last_empty_cache_ts
+
+    if not _CUDA_AVAILABLE:
+        return
+
+    _pending_cancellations += cancelled_count
+    now = time.monotonic()
+    if (
+        _pending_cancellations < _EMPTY_CACHE_CANCEL_THRESHOLD
+        or now - _last_empty_cache_ts < _EMPTY_CACHE_MIN_INTERVAL_S
+    ):
+        return
+
+    # Claim this trim before yielding, so concurrent cleanups are throttled
+    pending = _pending_cancellations
+    _pending_cancellations = 0
+    _last_empty_cache_ts = now
+    try:
+        await asyncio.to_thread(
+            _release_cached_memory, tuple(dict.fromkeys(devices))
+        )
+        logger.info("GPU memory cleared after %d cancellations", pending)
     except Exception as e:
         logger.warning(f"Failed to clear GPU memory: {e}")
 
@@ -87,23 +235,20 @@ async def cancel_segmentation(
         CancelResponse with cancellation status
     """
     try:
-        if job_id not in active_jobs:
+        job = lookup_job(job_id)
+        if job is None:
             raise HTTPException(
                 status_code=404,
                 detail=f"Job {job_id} not found or already completed"
             )
 
-        job_info = active_jobs[job_id]
-
-        # Mark job as cancelled
-        job_info["cancelled"] = True
-        job_info["cancel_reason"] = cancel_request.reason
+        # Mark job as cancelled and trigger its event to notify the job
+        _mark_cancelled(job_id, job, cancel_request.reason)
 
-        # Trigger cancel event to notify job
-        job_info["cancel_event"].set()
-
-        # Schedule GPU cleanup
-        background_tasks.add_task(cleanup_gpu_resources)
+        # Schedule GPU cleanup on the device the job ran on
+        background_tasks.add_task(
+            cleanup_gpu_resources, 1, (job.device_idx,)
+        )
 
         logger.info(f"Job {job_id} marked for cancellation: {cancel_request.reason}")
 
@@ -111,7 +256,7 @@ async def cancel_segmentation(
             success=True,
             job_id=job_id,
             message=f"Job cancellation requested: {cancel_request.reason}",
-            cancelled_at=str(asyncio.get_event_loop().time())
+            cancelled_at=job.cancelled_at.isoformat(timespec="milliseconds")
         )
 
     except HTTPException:
@@ -127,19 +272,23 @@ async def cancel_segmentation(
 async def get_active_jobs():
     """Get list of currently active jobs"""
     try:
-        jobs_info = {}
-        current_time = asyncio.get_event_loop().time()
-
-        for job_id, job_data in active_jobs.items():
-            jobs_info[job_id] = {
-                "type": job_data["type"],
-                "duration": current_time - job_data["started_at"],
-                "cancelled": job_data["cancelled"]
+        snapshot = snapshot_active()
+        current_time = time.monotonic()
+        jobs_info = {
+            view.job_id: {
+                "type": view.type,
+                "duration": current_time - view.started_at,
+                "started_at": view.started_at_wall.isoformat(
+                    timespec="milliseconds"
+                ),
+                "cancelled": view.cancelled
             }
+            for view in snapshot
+        }
 
         return {
             "active_jobs": jobs_info,
-            "total_count": len(active_jobs)
+            "total_count": len(snapshot)
         }
 
     except Exception as e:
@@ -154,16 +303,21 @@ async def cancel_all_jobs(background_tasks: BackgroundTasks):
     """Cancel all active jobs (emergency stop)"""
     try:
         cancelled_jobs = []
+        devices = []
 
-        for job_id, job_info in active_jobs.items():
-            if not job_info["cancelled"]:
-                job_info["cancelled"] = True
-                job_info["cancel_reason"] = "Emergency stop - all jobs cancelled"
-                job_info["cancel_event"].set()
+        # Shards are copied as we go: jobs may finish (and unregister) meanwhile
+        for job_id, job in _iter_jobs():
+            if not job.cancelled:
+                _mark_cancelled(
+                    job_id, job, "Emergency stop - all jobs cancelled"
+                )
                 cancelled_jobs.append(job_id)
+                devices.append(job.device_idx)
 
-        # Schedule GPU cleanup
-        background_tasks.add_task(cleanup_gpu_resources)
+        # Schedule GPU cleanup on every device the cancelled jobs ran on
+        background_tasks.add_task(
+            cleanup_gpu_resources, len(cancelled_jobs), devices or (None,)
+        )
 
         logger.warning(f"Emergency cancellation of {len(cancelled_jobs)} jobs")
 
@@ -187,5 +341,10 @@ __all__ = [
     "job_context",
     "is_job_cancelled",
     "get_cancel_event",
-    "active_jobs"
+    "register_job",
+    "lookup_job",
+    "unregister_job",
+    "snapshot_active",
+    "Job",
+    "JobView"
 ]
\ No newline at end of file
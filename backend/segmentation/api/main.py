@@ -4,7 +4,6 @@ import logging
 import sys
 import os
 from pathlib import Path
-from datetime import datetime
 import torch
 
 # Add the current directory to path first
@@ -85,18 +84,24 @@ if torch.cuda.is_available():
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 from contextlib import asynccontextmanager
 from prometheus_fastapi_instrumentator import Instrumentator
 
-from api.routes import router
+from api.routes import (router, shutdown_decode_pool, iso_now, JSONBodyCache,
+                        probe_device_info, device_info as app_device_info)
 from api.models import ErrorResponse, HealthResponse
-from api.metrics_endpoint import router as metrics_router
+from api.metrics_endpoint import router as metrics_router, warm_up_metrics
 from api.monitoring import router as monitoring_router
 from api.tracker_kymograph import router as tracker_kymograph_router
 from api.mt_metrics import router as mt_metrics_router
 from api._errors import internal_error
+# ml.model_loader (torchvision + segmentation_models_pytorch, ~3s) is imported
+# eagerly on purpose: uvicorn only binds the port once lifespan startup has
+# finished, so deferring it into lifespan would not make the worker ready any
+# sooner -- model pre-loading there needs it immediately anyway.
 from ml.model_loader import ModelLoader
+from ml.inference_scheduler import InferenceScheduler
 
 # Log GPU initialization summary status
 if _gpu_initialized:
@@ -111,6 +116,12 @@ async def lifespan(app: FastAPI):
     """Manage application lifespan"""
     # Startup
     logger.info("Starting segmentation microservice...")
+    # Docker probes /health every few seconds; keep driver calls out of it.
+    app.state.device_info = probe_device_info()
+    try:
+        warm_up_metrics()
+    except Exception as e:
+        logger.warning(f"OpenCV warm-up failed: {e}")
     try:
         model_loader_instance = ModelLoader()
         app.state.model_loader = model_loader_instance
@@ -135,6 +146,16 @@ async def lifespan(app: FastAPI):
         app.state.models_failed = models_failed
 
         logger.info(f"Pre-loaded {loaded_count}/{len(models_to_load)} models")
+
+        # Coalesces concurrent /segment requests into batched forward passes
+        scheduler = InferenceScheduler(
+            model_loader_instance,
+            max_batch_size=int(os.getenv("ML_SCHEDULER_MAX_BATCH", "8")),
+            max_delay_s=float(os.getenv("ML_SCHEDULER_MAX_DELAY_MS", "5")) / 1000,
+            queue_max=int(os.getenv("ML_SCHEDULER_QUEUE_MAX", "64"))
+        )
+        scheduler.start()
+        app.state.inference_scheduler = scheduler
         
         logger.info("Segmentation microservice started successfully")
     except Exception as e:
@@ -145,6 +166,10 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down segmentation microservice...")
+    if hasattr(app.state, "inference_scheduler"):
+        await app.state.inference_scheduler.stop()
+        delattr(app.state, "inference_scheduler")
+    shutdown_decode_pool()
     if hasattr(app.state, "model_loader"):
         delattr(app.state, "model_loader")
     logger.info("Segmentation microservice shut down")
@@ -154,7 +179,10 @@ app = FastAPI(
     title="Cell Segmentation Microservice",
     description="AI-powered cell segmentation using deep learning models",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # orjson serialises the float-heavy polygon / metrics payloads far faster
+    # than the stdlib json encoder (and handles numpy scalars natively).
+    default_response_class=ORJSONResponse
 )
 
 # Global OPTIONS handler for CORS preflight (must be before routers)
@@ -171,7 +199,12 @@ async def options_handler(path: str):
         }
     )
 
-# Simple approach - allow all origins
+# Simple approach - allow all origins. This is also the cheapest CORS
+# configuration: with ["*"] Starlette sets allow_all_origins and never scans an
+# origin list or runs a regex, and allow_credentials=False skips the
+# credentials header and the echo-the-origin path. The service is only called
+# service-to-service behind nginx, so there is nothing to gain from an
+# explicit origin allow-list here.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -253,44 +286,28 @@ async def root():
     }
 
 # Health endpoint at root level for Docker health checks
+_health_body = JSONBodyCache()
+
 @app.get("/health", response_model=HealthResponse)
 async def health():
     """Root level health check endpoint"""
     try:
-        # Detect CUDA
-        cuda_available = torch.cuda.is_available()
-        
-        # Detect MPS (Apple Silicon)
-        mps_available = torch.backends.mps.is_available() if hasattr(torch.backends, 'mps') else False
-        
-        # Determine device info
-        gpu_available = cuda_available or mps_available
-        
-        if cuda_available:
-            device_count = torch.cuda.device_count()
-            try:
-                device_name = torch.cuda.get_device_name(0)
-            except Exception:
-                device_name = "CUDA (unknown)"
-        elif mps_available:
-            device_count = 1
-            device_name = "Apple MPS"
-        else:
-            device_count = 0
-            device_name = "CPU"
-        
-        # Count loaded models
-        models_loaded = 0
-        if hasattr(app.state, 'model_loader') and hasattr(app.state.model_loader, 'loaded_models'):
-            loaded_models = app.state.model_loader.loaded_models
-            models_loaded = sum(1 for model in loaded_models.values() if model is not None)
+        # Device info is probed once at startup (see lifespan)
+        device_info = app_device_info(app)
 
-        return HealthResponse(
+        model_loader = getattr(app.state, 'model_loader', None)
+        models_loaded = model_loader.loaded_count if model_loader is not None else 0
+
+        timestamp = iso_now()
+        gpu_available = device_info["gpu_available"]
+
+        body = _health_body.get((timestamp, models_loaded, gpu_available), lambda: HealthResponse(
             status="healthy",
-            timestamp=datetime.now().isoformat(),
+            timestamp=timestamp,
             models_loaded=models_loaded,
             gpu_available=gpu_available
-        )
+        ).model_dump())
+        return Response(body, media_type="application/json")
     except Exception as e:
         raise internal_error(logger, "Health check failed", e)
 
@@ -1,11 +1,16 @@
+import asyncio
 import logging
+import math
 import os
 import sys
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
 import cv2
 import numpy as np
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 
 # Import characteristic_functions from utils package
@@ -16,6 +21,14 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api", tags=["metrics"])
 
+# Metric computation is synchronous OpenCV/numpy work that releases the GIL, so
+# it runs on a shared thread pool (cheaper than a process pool: no pickling of
+# contours) instead of blocking the event loop serving /health and cancels.
+_metrics_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("ML_METRICS_WORKERS", str(os.cpu_count() or 4))),
+    thread_name_prefix="metrics",
+)
+
 
 class DisintegrationRequest(BaseModel):
     """Request body for DI computation.
@@ -74,10 +87,6 @@ class DisintegrationResponse(BaseModel):
     closing_radius_px: Optional[int] = None
     min_fragment_px: Optional[int] = None
 
-class Point(BaseModel):
-    x: float
-    y: float
-
 class MetricsRequest(BaseModel):
     contour: List[List[float]]  # [[x1, y1], [x2, y2], ...]
     holes: List[List[List[float]]] = []  # Optional holes/internal polygons
@@ -102,99 +111,238 @@ class MetricsResponse(BaseModel):
     BoundingBoxWidth: float
     BoundingBoxHeight: float
 
-@router.post("/calculate-metrics", response_model=MetricsResponse)
-async def calculate_metrics(request: MetricsRequest):
+def _invalid_polygon(loc: Tuple[Any, ...], msg: str) -> RequestValidationError:
+    return RequestValidationError(
+        [{"type": "value_error", "loc": loc, "msg": msg, "input": None}]
+    )
+
+
+def _parse_polygon(
+    item: Any, loc: Tuple[Any, ...]
+) -> Tuple[np.ndarray, List[np.ndarray]]:
+    """Light manual check of one MetricsRequest-shaped JSON object.
+
+    Stands in for Pydantic's per-float validation of ``contour`` / ``holes``,
+    which costs one Python coercion per coordinate on large contours. numpy
+    converts the nested lists in C and rejects ragged or non-numeric input;
+    failures surface as the same 422 FastAPI would return.
+    """
+    if not isinstance(item, dict) or "contour" not in item:
+        raise _invalid_polygon(loc, "Expected an object with a 'contour' field")
+    holes = item.get("holes") or []
+    if not isinstance(holes, list):
+        raise _invalid_polygon(loc + ("holes",), "'holes' must be a list")
+    try:
+        contour = np.asarray(item["contour"], dtype=np.float32)
+        hole_arrays = [np.asarray(hole, dtype=np.float32) for hole in holes]
+    except (TypeError, ValueError):
+        raise _invalid_polygon(
+            loc, "Polygon coordinates must be lists of numeric [x, y] points"
+        )
+    for arr in (contour, *hole_arrays):
+        if arr.size and arr.ndim != 2:
+            raise _invalid_polygon(
+                loc, "Polygon coordinates must be lists of numeric [x, y] points"
+            )
+    return contour, hole_arrays
+
+
+def _to_cv_contour(pts: np.ndarray) -> np.ndarray:
+    """Reshape an (N, 2) float32 point array into OpenCV (N, 1, 2) form (a view)."""
+    a = np.asarray(pts, dtype=np.float32)
+    return a.reshape(-1, 1, 2) if a.ndim == 2 else a
+
+
+def _to_cv_contours(
+    contour: np.ndarray, holes: List[np.ndarray]
+) -> Tuple[np.ndarray, List[np.ndarray]]:
+    """OpenCV-format outer contour and hole contours for one parsed polygon."""
+    return _to_cv_contour(contour), [_to_cv_contour(hole) for hole in holes]
+
+
+def _polygon_areas(contours: List[np.ndarray]) -> np.ndarray:
+    """Unsigned shoelace area of every contour in one vectorised pass.
+
+    Equivalent to ``[cv2.contourArea(c) for c in contours]`` but concatenates
+    all vertices and reduces per polygon with ``np.add.reduceat``, so many
+    small holes cost one numpy pass instead of one OpenCV call each.
+    """
+    polys = [c.reshape(-1, 2) for c in contours if c.size]
+    areas = np.zeros(len(polys), dtype=np.float64)
+    if not polys:
+        return areas
+    lengths = np.fromiter((len(p) for p in polys), dtype=np.intp, count=len(polys))
+    starts = np.zeros(len(polys), dtype=np.intp)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    pts = np.concatenate(polys).astype(np.float64, copy=False)
+    # Index of each vertex's successor, wrapping the last vertex of every
+    # polygon back to its first.
+    nxt = np.arange(1, len(pts) + 1, dtype=np.intp)
+    nxt[starts + lengths - 1] = starts
+    x, y = pts[:, 0], pts[:, 1]
+    cross = x * y[nxt] - x[nxt] * y
+    areas[:] = 0.5 * np.abs(np.add.reduceat(cross, starts))
+    return areas
+
+
+_FOUR_PI = 4.0 * math.pi
+
+
+def _adjust_for_holes(
+    metrics: Dict[str, Any], hole_contours: List[np.ndarray], hull_area: float
+) -> None:
+    """Subtract hole areas in place and re-derive the area-dependent metrics."""
+    total_hole_area = float(_polygon_areas(hole_contours).sum())
+    metrics["Area"] = max(0, metrics["Area"] - total_hole_area)
+
+    # Recalculate area-dependent metrics with adjusted area. Plain math on
+    # Python floats: these are scalars, numpy would only add 0-d allocations.
+    area = metrics["Area"]
+    if area > 0:
+        eq_diameter = math.sqrt(4.0 * area / math.pi)
+        metrics["EquivalentDiameter"] = eq_diameter
+        # Circularity and compactness use perimeter WITH holes
+        perimeter_with_holes = metrics["PerimeterWithHoles"]
+        if perimeter_with_holes > 0:
+            perimeter_sq = perimeter_with_holes * perimeter_with_holes
+            metrics["Circularity"] = min(1.0, _FOUR_PI * area / perimeter_sq)
+            metrics["Compactness"] = perimeter_sq / (_FOUR_PI * area)
+            metrics["Sphericity"] = math.pi * eq_diameter / perimeter_with_holes
+        else:
+            metrics["Circularity"] = 0
+            metrics["Compactness"] = 0
+            metrics["Sphericity"] = 0
+        # Solidity needs recalculation with adjusted area
+        metrics["Solidity"] = area / hull_area if hull_area > 0 else 0
+        # Extent needs recalculation
+        bbox_area = metrics["BoundingBoxWidth"] * metrics["BoundingBoxHeight"]
+        metrics["Extent"] = area / bbox_area if bbox_area > 0 else 0
+    else:
+        # Set safe values when area is non-positive
+        metrics["EquivalentDiameter"] = 0
+        metrics["Circularity"] = 0
+        metrics["Compactness"] = 0
+        metrics["Sphericity"] = 0
+        metrics["Solidity"] = 0
+        metrics["Extent"] = 0
+
+
+def _compute_metrics(
+    contour: np.ndarray, hole_contours: List[np.ndarray]
+) -> Dict[str, float]:
+    """Compute the MetricsResponse fields for one contour and its holes.
+
+    Plain synchronous function (no Pydantic, no HTTPException) so the single
+    and batch endpoints share it and the batch path can run it off the event
+    loop. Raises whatever OpenCV/numpy raise on malformed input.
+    """
+    # Calculate all metrics with hole support. The hull area comes back too so
+    # the hole branch can re-derive Solidity without another convexHull pass.
+    metrics, hull_area = calculate_all(
+        contour, hole_contours if hole_contours else None, return_hull_area=True
+    )
+
+    # If there are holes, adjust the area
+    if hole_contours:
+        _adjust_for_holes(metrics, hole_contours, hull_area)
+
+    # Plain floats so the batch path can skip Pydantic coercion
+    return {key: float(value) for key, value in metrics.items()}
+
+
+# Returned for batch items whose metrics could not be computed.
+_ZERO_METRICS: Dict[str, float] = {
+    name: 0.0 for name in MetricsResponse.model_fields
+}
+
+
+def _compute_batch_item(
+    index: int, polygon: Tuple[np.ndarray, List[np.ndarray]]
+) -> Dict[str, float]:
+    """Compute one batch item; a failure yields all-zero metrics."""
+    try:
+        return _compute_metrics(*_to_cv_contours(*polygon))
+    except Exception:
+        logger.exception("Failed to calculate metrics for polygon %d", index)
+        return _ZERO_METRICS
+
+
+def warm_up_metrics() -> None:
+    """Run one metrics computation so OpenCV's lazy init happens at startup.
+
+    The first convexHull / fitEllipse / minAreaRect call initialises OpenCV's
+    dispatch tables and thread pool; doing it here keeps that one-off cost out
+    of the first /calculate-metrics request.
+    """
+    square = np.array([[0, 0], [8, 0], [8, 8], [0, 8]], dtype=np.float32)
+    hole = np.array([[3, 3], [5, 3], [5, 5], [3, 5]], dtype=np.float32)
+    _compute_metrics(*_to_cv_contours(square, [hole]))
+
+
+async def _read_json_body(request: Request) -> Any:
+    try:
+        return await request.json()
+    except ValueError:
+        raise _invalid_polygon(("body",), "Request body must be valid JSON")
+
+
+# The bodies are parsed by hand (see _parse_polygon), so the request schemas
+# are attached explicitly to keep the OpenAPI docs accurate.
+_METRICS_REQUEST_SCHEMA = MetricsRequest.model_json_schema()
+
+
+@router.post(
+    "/calculate-metrics",
+    response_model=MetricsResponse,
+    openapi_extra={"requestBody": {"required": True, "content": {
+        "application/json": {"schema": _METRICS_REQUEST_SCHEMA}
+    }}},
+)
+async def calculate_metrics(request: Request):
     """
     Calculate comprehensive metrics for a polygon contour.
     Optionally accounts for holes (internal polygons) by subtracting their areas.
     """
+    contour, holes = _parse_polygon(await _read_json_body(request), ("body",))
     try:
-        # Convert contour to numpy array
-        contour = np.array(request.contour, dtype=np.float32)
-
-        if len(contour.shape) == 2:
-            contour = contour.reshape((-1, 1, 2))
-
-        # Process hole contours if provided
-        hole_contours = []
-        if request.holes:
-            for hole in request.holes:
-                hole_contour = np.array(hole, dtype=np.float32)
-                if len(hole_contour.shape) == 2:
-                    hole_contour = hole_contour.reshape((-1, 1, 2))
-                hole_contours.append(hole_contour)
-
-        # Calculate all metrics with hole support
-        metrics = calculate_all(contour, hole_contours if hole_contours else None)
-
-        # If there are holes, adjust the area
-        if hole_contours:
-            total_hole_area = sum(cv2.contourArea(hole) for hole in hole_contours)
-            metrics["Area"] = max(0, metrics["Area"] - total_hole_area)
-
-            # Recalculate area-dependent metrics with adjusted area
-            if metrics["Area"] > 0:
-                metrics["EquivalentDiameter"] = np.sqrt(4 * metrics["Area"] / np.pi)
-                # Circularity and compactness use perimeter WITH holes
-                perimeter_with_holes = metrics["PerimeterWithHoles"]
-                metrics["Circularity"] = min(1.0, (4 * np.pi * metrics["Area"]) / (perimeter_with_holes ** 2)) if perimeter_with_holes > 0 else 0
-                metrics["Compactness"] = (perimeter_with_holes ** 2) / (4 * np.pi * metrics["Area"]) if metrics["Area"] > 0 else 0
-                metrics["Sphericity"] = np.pi * np.sqrt(4 * metrics["Area"] / np.pi) / perimeter_with_holes if perimeter_with_holes > 0 else 0
-                # Solidity needs recalculation with adjusted area
-                hull = cv2.convexHull(contour)
-                hull_area = cv2.contourArea(hull)
-                metrics["Solidity"] = metrics["Area"] / hull_area if hull_area > 0 else 0
-                # Extent needs recalculation
-                bbox_area = metrics["BoundingBoxWidth"] * metrics["BoundingBoxHeight"]
-                metrics["Extent"] = metrics["Area"] / bbox_area if bbox_area > 0 else 0
-            else:
-                # Set safe values when area is non-positive
-                metrics["EquivalentDiameter"] = 0
-                metrics["Circularity"] = 0
-                metrics["Compactness"] = 0
-                metrics["Sphericity"] = 0
-                metrics["Solidity"] = 0
-                metrics["Extent"] = 0
-        
-        return MetricsResponse(**metrics)
-        
+        loop = asyncio.get_running_loop()
+        metrics = await loop.run_in_executor(
+            _metrics_executor, _compute_metrics, *_to_cv_contours(contour, holes)
+        )
+        return MetricsResponse.model_construct(**metrics)
+
     except Exception as e:
         raise internal_error(logger, "Failed to calculate metrics", e)
 
-@router.post("/batch-calculate-metrics")
-async def batch_calculate_metrics(polygons: List[MetricsRequest]) -> List[MetricsResponse]:
+@router.post(
+    "/batch-calculate-metrics",
+    response_model=List[MetricsResponse],
+    openapi_extra={"requestBody": {"required": True, "content": {
+        "application/json": {
+            "schema": {"type": "array", "items": _METRICS_REQUEST_SCHEMA}
+        }
+    }}},
+)
+async def batch_calculate_metrics(request: Request) -> ORJSONResponse:
     """
     Calculate metrics for multiple polygons in batch.
+
+    The per-item dicts already hold exactly the MetricsResponse fields as plain
+    floats, so they are serialised directly — no model build, validation or dump.
     """
-    results = []
-    for polygon_request in polygons:
-        try:
-            metrics = await calculate_metrics(polygon_request)
-            results.append(metrics)
-        except Exception as e:
-            # Return default values on error
-            results.append(MetricsResponse(
-                Area=0,
-                Perimeter=0,
-                PerimeterWithHoles=0,
-                EquivalentDiameter=0,
-                Circularity=0,
-                FeretDiameterMax=0,
-                FeretDiameterMaxOrthogonalDistance=0,
-                FeretDiameterMin=0,
-                FeretAspectRatio=0,
-                LengthMajorDiameterThroughCentroid=0,
-                LengthMinorDiameterThroughCentroid=0,
-                Compactness=0,
-                Convexity=0,
-                Solidity=0,
-                Sphericity=0,
-                Extent=0,
-                BoundingBoxWidth=0,
-                BoundingBoxHeight=0
-            ))
-    
-    return results
+    payload = await _read_json_body(request)
+    if not isinstance(payload, list):
+        raise _invalid_polygon(("body",), "Expected a list of polygons")
+    polygons = [_parse_polygon(item, ("body", i)) for i, item in enumerate(payload)]
+
+    # Fan the polygons out across the metrics pool and await them on the
+    # loop; gather keeps the results in request order.
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(*(
+        loop.run_in_executor(_metrics_executor, _compute_batch_item, i, polygon)
+        for i, polygon in enumerate(polygons)
+    ))
+    return ORJSONResponse(content=results)
 
 @router.post("/disintegration-index", response_model=DisintegrationResponse)
 async def disintegration_index(request: DisintegrationRequest):
@@ -3,16 +3,18 @@ GPU Monitoring API Endpoints
 Provides REST endpoints for GPU metrics and monitoring data
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import ORJSONResponse
 from typing import Dict, Any, Optional
+import functools
 import logging
-import sys
-import os
+import operator
+
+import torch
 
 from api._errors import internal_error
 
-# Add monitoring module to path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Resolved against the service root (/app), which api/main.py puts on sys.path.
 try:
     from monitoring.gpu_monitor import get_gpu_monitor, cleanup_gpu_monitor
     gpu_monitor_available = True
@@ -21,55 +23,82 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/monitoring", tags=["monitoring"])
+# Set on the router too (not only app-wide in main.py) so the dashboard-polled
+# endpoints stay on orjson wherever this router is mounted.
+router = APIRouter(
+    prefix="/monitoring",
+    tags=["monitoring"],
+    default_response_class=ORJSONResponse
+)
+
+# Response keys for /gpu/batch-metrics entries and the matching
+# BatchProcessingMetrics attributes, read in one C-level attrgetter call.
+_BATCH_METRIC_KEYS = (
+    "model", "batch_size", "inference_time_ms", "throughput_imgs_sec",
+    "memory_delta_mb", "gpu_utilization", "success", "error"
+)
+_batch_metric_fields = operator.attrgetter(
+    "model_name", "batch_size", "inference_time_ms", "throughput_imgs_sec",
+    "memory_delta_mb", "gpu_utilization", "success", "error_message"
+)
+
+# Upper bound for ?limit= on /gpu/batch-metrics, keeping response size predictable
+_BATCH_METRICS_MAX_LIMIT = 1000
+
+@functools.lru_cache(maxsize=1)
+def _static_device_info() -> Optional[Dict[str, Any]]:
+    """Device id/name/total memory, read once -- they never change at runtime"""
+    return get_gpu_monitor().get_static_info()
 
 @router.get("/gpu/status")
-async def get_gpu_status() -> Dict[str, Any]:
+async def get_gpu_status() -> ORJSONResponse:
     """
     Get current GPU status and metrics
     
     Returns:
-        Dictionary containing GPU metrics and status
+        GPU metrics and status, serialized straight to orjson (no
+        response_model validation or jsonable_encoder pass)
     """
     if not gpu_monitor_available:
-        return {
+        return ORJSONResponse({
             "status": "unavailable",
             "message": "GPU monitoring not available",
             "gpu_present": False
-        }
+        })
     
     try:
-        monitor = get_gpu_monitor()
-        current_metrics = monitor.get_current_metrics()
+        static_info = _static_device_info()
+        # Served from the monitor's background sampler; no NVML call here
+        dynamic = get_gpu_monitor().get_latest_dynamic_metrics() if static_info else None
         
-        if current_metrics:
-            return {
+        if dynamic:
+            return ORJSONResponse({
                 "status": "active",
                 "gpu_present": True,
                 "device": {
-                    "id": current_metrics.device_id,
-                    "name": current_metrics.device_name
+                    "id": static_info["id"],
+                    "name": static_info["name"]
                 },
                 "memory": {
-                    "allocated_mb": current_metrics.memory_allocated_mb,
-                    "reserved_mb": current_metrics.memory_reserved_mb,
-                    "free_mb": current_metrics.memory_free_mb,
-                    "total_mb": current_metrics.memory_total_mb,
-                    "usage_percent": current_metrics.memory_usage_percent
+                    "allocated_mb": dynamic["allocated_mb"],
+                    "reserved_mb": dynamic["reserved_mb"],
+                    "free_mb": dynamic["free_mb"],
+                    "total_mb": static_info["total_mb"],
+                    "usage_percent": dynamic["usage_percent"]
                 },
                 "utilization": {
-                    "gpu_percent": current_metrics.utilization_percent,
-                    "temperature_celsius": current_metrics.temperature_celsius,
-                    "power_watts": current_metrics.power_draw_watts
+                    "gpu_percent": dynamic["gpu_percent"],
+                    "temperature_celsius": dynamic["temperature_celsius"],
+                    "power_watts": dynamic["power_watts"]
                 },
-                "timestamp": current_metrics.timestamp
-            }
+                "timestamp": dynamic["timestamp"]
+            })
         else:
-            return {
+            return ORJSONResponse({
                 "status": "no_gpu",
                 "message": "No GPU available, running on CPU",
                 "gpu_present": False
-            }
+            })
             
     except Exception as e:
         raise internal_error(logger, "Error getting GPU status", e)
@@ -97,77 +126,44 @@ async def get_gpu_summary() -> Dict[str, Any]:
         raise internal_error(logger, "Error getting GPU summary", e)
 
 @router.get("/gpu/batch-metrics")
-async def get_batch_metrics(limit: int = 50) -> Dict[str, Any]:
+async def get_batch_metrics(limit: int = Query(50, ge=1, le=_BATCH_METRICS_MAX_LIMIT)) -> ORJSONResponse:
     """
     Get recent batch processing metrics
     
     Args:
-        limit: Maximum number of metrics to return (default 50)
+        limit: Maximum number of metrics to return (default 50, at most
+            _BATCH_METRICS_MAX_LIMIT; the monitor clamps it to what it holds)
     
     Returns:
-        Dictionary containing batch processing metrics
+        Batch processing metrics, serialized straight to orjson
     """
     if not gpu_monitor_available:
-        return {
+        return ORJSONResponse({
             "status": "unavailable",
             "message": "GPU monitoring not available",
             "metrics": []
-        }
+        })
     
     try:
         monitor = get_gpu_monitor()
         
         # Get recent batch metrics
-        batch_metrics = monitor.batch_metrics[-limit:] if monitor.batch_metrics else []
+        batch_metrics = monitor.recent_batch_metrics(limit)
         
-        # Calculate statistics
-        if batch_metrics:
-            successful = [m for m in batch_metrics if m.success]
-            failed = [m for m in batch_metrics if not m.success]
-            
-            avg_throughput = (sum(m.throughput_imgs_sec for m in successful) / 
-                            len(successful)) if successful else 0
-            
-            avg_inference_time = (sum(m.inference_time_ms for m in successful) / 
-                                len(successful)) if successful else 0
-            
-            stats = {
-                "total_batches": len(batch_metrics),
-                "successful": len(successful),
-                "failed": len(failed),
-                "success_rate": len(successful) / len(batch_metrics) * 100,
-                "avg_throughput_imgs_sec": round(avg_throughput, 2),
-                "avg_inference_time_ms": round(avg_inference_time, 2)
-            }
-        else:
-            stats = {
-                "total_batches": 0,
-                "successful": 0,
-                "failed": 0,
-                "success_rate": 100.0,
-                "avg_throughput_imgs_sec": 0,
-                "avg_inference_time_ms": 0
-            }
+        # Statistics come from running totals kept by the monitor
+        stats = monitor.get_batch_stats(limit)
         
         # Format metrics for response
-        formatted_metrics = []
-        for m in batch_metrics:
-            formatted_metrics.append({
-                "model": m.model_name,
-                "batch_size": m.batch_size,
-                "inference_time_ms": m.inference_time_ms,
-                "throughput_imgs_sec": m.throughput_imgs_sec,
-                "memory_delta_mb": m.memory_delta_mb,
-                "gpu_utilization": m.gpu_utilization,
-                "success": m.success,
-                "error": m.error_message
-            })
+        formatted_metrics = [
+            dict(zip(_BATCH_METRIC_KEYS, _batch_metric_fields(m)))
+            for m in batch_metrics
+        ]
         
-        return {
+        return ORJSONResponse({
             "status": "active",
             "statistics": stats,
             "metrics": formatted_metrics
-        }
+        })
         
     except Exception as e:
         raise internal_error(logger, "Error getting batch metrics", e)
@@ -234,10 +230,13 @@ async def check_memory_pressure() -> Dict[str, Any]:
         raise internal_error(logger, "Error checking memory pressure", e)
 
 @router.post("/gpu/clear-cache")
-async def clear_gpu_cache() -> Dict[str, Any]:
+async def clear_gpu_cache(force: bool = False) -> Dict[str, Any]:
     """
     Clear GPU cache to free up memory
-    
+
+    empty_cache() synchronizes the device and stalls in-flight inference, so
+    it only runs under memory pressure unless ``force`` is set.
+
     Returns:
         Dictionary with operation status
     """
@@ -248,24 +247,30 @@ async def clear_gpu_cache() -> Dict[str, Any]:
         }
     
     try:
-        import torch
-        if torch.cuda.is_available():
-            before = torch.cuda.memory_allocated() / (1024 ** 2)
-            torch.cuda.empty_cache()
-            after = torch.cuda.memory_allocated() / (1024 ** 2)
-            
-            return {
-                "status": "success",
-                "message": "GPU cache cleared",
-                "memory_freed_mb": round(before - after, 2),
-                "memory_before_mb": round(before, 2),
-                "memory_after_mb": round(after, 2)
-            }
-        else:
+        if not torch.cuda.is_available():
             return {
                 "status": "no_gpu",
                 "message": "No GPU available"
             }
-            
+
+        if not force and not get_gpu_monitor().should_reduce_batch_size():
+            return {"status": "skipped", "reason": "no pressure"}
+
+        # empty_cache() releases reserved-but-unused blocks; memory_allocated()
+        # is unaffected by it, so the delta is measured on reserved memory.
+        before = torch.cuda.memory_reserved() / (1024 ** 2)
+        torch.cuda.synchronize()
+        torch.cuda.empty_cache()
+        after = torch.cuda.memory_reserved() / (1024 ** 2)
+        freed = before - after
+
+        return {
+            "status": "success",
+            "message": "GPU cache cleared",
+            "memory_freed_mb": round(freed, 2),
+            "memory_before_mb": round(before, 2),
+            "memory_after_mb": round(after, 2)
+        }
+
     except Exception as e:
-        raise internal_error(logger, "Error clearing GPU cache", e)
\ No newline at end of file
+        raise internal_error(logger, "Error clearing GPU cache", e)
@@ -1,12 +1,21 @@
 """API routes for segmentation microservice"""
 
+import asyncio
+import hashlib
+import mmap
+import os
 import time
 import logging
 import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 from typing import Optional
 from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, Query, Form
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+import numpy as np
+import orjson
 import torch
 
 from ._errors import internal_error
@@ -17,18 +26,15 @@ from .models import (
 from PIL import Image
 import io
 
-# Import new inference exception types
-try:
-    from ml.inference_executor import InferenceTimeoutError, InferenceError
-except ImportError:
-    # Fallback for backward compatibility
-    InferenceTimeoutError = TimeoutError
-    InferenceError = Exception
+from ml.inference_executor import InferenceTimeoutError, InferenceError
+
+from ml.inference_scheduler import SchedulerFullError
 
 logger = logging.getLogger(__name__)
 
-# Initialize router
-router = APIRouter()
+# Initialize router; orjson on the router itself, not only app-wide, so the polygon-heavy
+# segmentation payloads stay on it wherever this router is mounted
+router = APIRouter(default_response_class=ORJSONResponse)
 
 # Microtubule v7 (DINOv3-L + DPT + PySOAX) holds ~7 GB of GPU activations
 # during a single 1024x1024 forward pass.  The per-process memory limit is
@@ -48,52 +54,394 @@ def get_model_loader(request: Request):
         raise HTTPException(status_code=503, detail="Model loader not initialized")
     return request.app.state.model_loader
 
+def get_inference_scheduler(request: Request):
+    """Dependency to get the micro-batching scheduler, if one is running"""
+    return getattr(request.app.state, 'inference_scheduler', None)
+
+_VALID_IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.tiff', '.tif', '.bmp'})
+
 def validate_image(file: UploadFile) -> bool:
     """Validate if the uploaded file is a valid image"""
-    valid_extensions = {'.jpg', '.jpeg', '.png', '.tiff', '.tif', '.bmp'}
     if not file.filename:
         return False
+    return os.path.splitext(file.filename)[1].lower() in _VALID_IMAGE_EXTENSIONS
+
+# Leading bytes of every format validate_image() admits (TIFF: little/big
+# endian, classic and BigTIFF). Checked before PIL ever sees the payload.
+_IMAGE_SIGNATURES = (
+    b'\x89PNG\r\n\x1a\n',
+    b'\xff\xd8\xff',
+    b'II*\x00', b'MM\x00*', b'II+\x00', b'MM\x00+',
+    b'BM',
+)
+
+class InvalidImageError(ValueError):
+    """Upload content is not one of the supported image formats"""
+
+def has_image_signature(image_data: bytes) -> bool:
+    """Check the upload's magic number against the supported formats"""
+    return image_data.startswith(_IMAGE_SIGNATURES)
+
+def _decode_image(image_data: bytes) -> Image.Image:
+    """Open and fully decode an uploaded image (blocking; run off the event loop)"""
+    image = Image.open(io.BytesIO(image_data))
+    image.load()
+    return image
+
+def _decode_mapped(fileobj, filename: str) -> Image.Image:
+    """Decode straight from a spooled upload's file via mmap (blocking)"""
+    with mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if not has_image_signature(mapped[:8]):
+            raise InvalidImageError(f"Unrecognised image content: {filename}")
+        image = Image.open(mapped)
+        image.load()
+    image.fp = None
+    return image
+
+def _decode_image_raw(image_data: bytes) -> tuple:
+    """Decode in a worker process; returns what _rebuild_image() needs"""
+    image = _decode_image(image_data)
+    palette = image.getpalette() if image.mode in ('P', 'PA') else None
+    return image.mode, image.size, image.tobytes(), palette
+
+def _rebuild_image(mode: str, size: tuple, raw: bytes, palette) -> Image.Image:
+    """Reassemble a process-decoded image in the request process"""
+    image = Image.frombytes(mode, size, raw)
+    if palette is not None:
+        image.putpalette(palette)
+    return image
+
+# Caps uploads held in memory and being decoded at once, across requests, so a
+# batch of large TIFFs cannot balloon RSS or monopolise the thread pool. The
+# semaphore is created per event loop on first use: asyncio primitives bind
+# to the loop they are first awaited on.
+_MAX_PARALLEL_DECODES = int(os.getenv("ML_MAX_PARALLEL_DECODES", "8"))
+_decode_slots = weakref.WeakKeyDictionary()  # event loop -> asyncio.Semaphore
 
-    # Extract file extension more safely
-    filename_parts = file.filename.split('.')
-    if len(filename_parts) < 2:
+def _get_decode_slots() -> asyncio.Semaphore:
+    """The running loop's decode semaphore"""
+    loop = asyncio.get_running_loop()
+    slots = _decode_slots.get(loop)
+    if slots is None:
+        slots = _decode_slots[loop] = asyncio.Semaphore(_MAX_PARALLEL_DECODES)
+    return slots
+
+# Uploads at least this large (20 MP TIFFs, big PNGs) decode in a process pool:
+# not every PIL codec drops the GIL, and for these the cost of shipping raw
+# pixels back is small next to the decode. 0 keeps every decode on threads.
+_PROCESS_DECODE_MIN_BYTES = int(os.getenv("ML_PROCESS_DECODE_MIN_BYTES", str(8 << 20)))
+_decode_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_decode_pool() -> ProcessPoolExecutor:
+    """Create the decode process pool on first use"""
+    global _decode_pool
+    if _decode_pool is None:
+        workers = int(os.getenv("ML_DECODE_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+        _decode_pool = ProcessPoolExecutor(max_workers=workers)
+    return _decode_pool
+
+def shutdown_decode_pool() -> None:
+    """Stop the decode worker processes (called from the app lifespan)"""
+    global _decode_pool
+    if _decode_pool is not None:
+        _decode_pool.shutdown(wait=False, cancel_futures=True)
+        _decode_pool = None
+
+async def _decode_async(image_data: bytes) -> Image.Image:
+    """Decode on a thread, or in the process pool for large uploads"""
+    if _PROCESS_DECODE_MIN_BYTES and len(image_data) >= _PROCESS_DECODE_MIN_BYTES:
+        loop = asyncio.get_running_loop()
+        try:
+            return _rebuild_image(*await loop.run_in_executor(
+                _get_decode_pool(), _decode_image_raw, image_data
+            ))
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); start a fresh pool next time
+            logger.warning("Decode process pool broke; decoding on a thread instead")
+            shutdown_decode_pool()
+    return await asyncio.to_thread(_decode_image, image_data)
+
+# Upload ceilings (the Node backend caps files at 20 MB; these only stop
+# pathological payloads from pinning RSS)
+_MAX_FILE_BYTES = int(os.getenv("ML_MAX_UPLOAD_MB", "256")) << 20
+_MAX_BATCH_BYTES = int(os.getenv("ML_MAX_BATCH_UPLOAD_MB", "2048")) << 20
+
+def _payload_too_large(detail: str) -> HTTPException:
+    return HTTPException(status_code=413, detail=detail)
+
+async def _read_capped(file: UploadFile, cap: int) -> bytes:
+    """Read an upload, refusing with 413 once it exceeds cap bytes"""
+    if file.size is not None:
+        # Size is known from the parsed multipart body: refuse without reading
+        if file.size > cap:
+            raise _payload_too_large(f"File {file.filename} exceeds {cap >> 20} MB")
+        return await file.read()
+    buf = bytearray()
+    while chunk := await file.read(1 << 20):
+        buf += chunk
+        if len(buf) > cap:
+            raise _payload_too_large(f"File {file.filename} exceeds {cap >> 20} MB")
+    return bytes(buf)
+
+# Uploads at least this large are already spooled to disk by Starlette; below
+# the process-pool threshold PIL decodes them from an mmap of that file rather
+# than from a full-size bytes copy. 0 always reads into memory.
+_MMAP_DECODE_MIN_BYTES = int(os.getenv("ML_MMAP_DECODE_MIN_BYTES", str(4 << 20)))
+
+def _mappable(file: UploadFile) -> bool:
+    """Whether the upload can be decoded in place from its spool file"""
+    if not (_MMAP_DECODE_MIN_BYTES and file.size and file.size >= _MMAP_DECODE_MIN_BYTES):
+        return False
+    if file.size > _MAX_FILE_BYTES:
         return False
+    if _PROCESS_DECODE_MIN_BYTES and file.size >= _PROCESS_DECODE_MIN_BYTES:
+        # The process pool needs the bytes to ship to the worker anyway
+        return False
+    try:
+        file.file.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return False
+    return True
+
+async def _read_and_decode(file: UploadFile) -> Image.Image:
+    """Read an upload and decode it off the event loop"""
+    async with _get_decode_slots():
+        try:
+            if _mappable(file):
+                return await asyncio.to_thread(_decode_mapped, file.file, file.filename)
+            image_data = await _read_capped(file, _MAX_FILE_BYTES)
+            if not has_image_signature(image_data):
+                raise InvalidImageError(f"Unrecognised image content: {file.filename}")
+            return await _decode_async(image_data)
+        finally:
+            # Release the spool file once decoded, not when the response is sent
+            await file.close()
+
+def _failed_result(filename: str, index: int, model: str, threshold: float,
+                   error: str, error_detail=None) -> dict:
+    """Per-file failure entry for /batch-segment results"""
+    result = {
+        "filename": filename,
+        "batch_index": index,
+        "success": False,
+        "error": error,
+        "polygons": [],
+        "model_used": model,
+        "threshold_used": threshold
+    }
+    if error_detail is not None:
+        result["error_detail"] = error_detail
+    return result
+
+def _timeout_detail(e: InferenceTimeoutError, processing_time: float) -> dict:
+    """504 detail for an executor timeout on /segment"""
+    return {
+        "error": "Model inference timeout",
+        "message": str(e),
+        "model": e.model_name,
+        "timeout": e.timeout,
+        "image_size": e.image_size,
+        "suggestion": f"Model '{e.model_name}' timed out after {e.timeout}s. Try: 1) Use 'hrnet' model instead, 2) Reduce image size, 3) Increase ML_INFERENCE_TIMEOUT environment variable",
+        "processing_time": processing_time
+    }
+
+def _inference_error_detail(e: InferenceError, model: str, processing_time: float) -> dict:
+    """500 detail for an inference failure on /segment"""
+    return {
+        "error": "Inference failed",
+        "message": str(e),
+        "model": model,
+        "processing_time": processing_time
+    }
+
+def _batch_failure(e: Exception) -> tuple:
+    """Log a whole-batch failure; returns the (error, error_detail) for each file"""
+    if isinstance(e, InferenceTimeoutError):
+        logger.error(f"Timeout processing batch: {e}")
+        return f"Batch timeout after {e.timeout}s for model '{e.model_name}'", {
+            "type": "timeout",
+            "message": str(e),
+            "model": e.model_name,
+            "timeout": e.timeout,
+            "image_size": e.image_size
+        }
+    if isinstance(e, TimeoutError):
+        logger.error(f"Timeout processing batch: {e}")
+        return "Batch inference timeout", str(e)
+
+    # Log the full exception (its message may reference internal paths) but
+    # return only a generic error to the caller (CodeQL py/stack-trace-exposure)
+    if isinstance(e, InferenceError):
+        logger.error(f"Inference error processing batch: {e}", exc_info=True)
+        return "Batch inference failed", "Inference error — see server logs"
+    logger.error(f"Failed to process batch: {e}", exc_info=True)
+    return "Batch processing failed — see server logs", None
+
+def _npz_batch_response(batch_result: dict) -> Response:
+    """
+    Pack a /batch-segment result as an .npz archive (?format=npz)
+
+    Arrays (load with numpy.load; no pickling involved):
+        vertices: (V, 2) float32 x/y of every polygon, concatenated
+        polygon_offsets: (P + 1,) int64; polygon k is vertices[o[k]:o[k + 1]]
+        result_offsets: (R + 1,) int64; result r owns polygons o[r]:o[r + 1]
+        metadata: uint8 JSON of the usual response with polygon points removed
+    """
+    coords = []
+    polygon_offsets = [0]
+    result_offsets = [0]
+    meta_results = []
+    for entry in batch_result["results"]:
+        polygons = []
+        for polygon in entry.get("polygons", ()):
+            points = polygon.get("points", ())
+            coords.extend(v for point in points for v in (point["x"], point["y"]))
+            polygon_offsets.append(polygon_offsets[-1] + len(points))
+            polygons.append({k: v for k, v in polygon.items() if k != "points"})
+        result_offsets.append(result_offsets[-1] + len(polygons))
+        meta_results.append({**entry, "polygons": polygons})
+
+    metadata = orjson.dumps(
+        {**batch_result, "results": meta_results}, option=orjson.OPT_SERIALIZE_NUMPY
+    )
+    buf = io.BytesIO()
+    np.savez(
+        buf,
+        vertices=np.asarray(coords, dtype=np.float32).reshape(-1, 2),
+        polygon_offsets=np.asarray(polygon_offsets, dtype=np.int64),
+        result_offsets=np.asarray(result_offsets, dtype=np.int64),
+        metadata=np.frombuffer(metadata, dtype=np.uint8),
+    )
+    return Response(buf.getvalue(), media_type="application/x-npz")
+
+def _elapsed_since(start_ns: int) -> float:
+    """Seconds since a time.monotonic_ns() reading (immune to wall-clock steps)"""
+    return (time.monotonic_ns() - start_ns) / 1e9
+
+def probe_device_info() -> dict:
+    """Probe CUDA / MPS availability once; the result never changes at runtime."""
+    # Detect CUDA
+    cuda_available = torch.cuda.is_available()
+
+    # Detect MPS (Apple Silicon)
+    mps_available = torch.backends.mps.is_available() if hasattr(torch.backends, 'mps') else False
+
+    if cuda_available:
+        device_count = torch.cuda.device_count()
+        try:
+            device_name = torch.cuda.get_device_name(0)
+        except Exception:
+            device_name = "CUDA (unknown)"
+    elif mps_available:
+        device_count = 1
+        device_name = "Apple MPS"
+    else:
+        device_count = 0
+        device_name = "CPU"
+
+    return {
+        "gpu_available": cuda_available or mps_available,
+        "device_count": device_count,
+        "device_name": device_name,
+    }
+
+def device_info(app) -> dict:
+    """The app's device summary: probed by the lifespan, else on first use"""
+    info = getattr(app.state, 'device_info', None)
+    if info is None:
+        info = app.state.device_info = probe_device_info()
+    return info
+
+# (second, ISO string) of the last formatted wall-clock second
+_iso_cache = (0, "")
 
-    ext = '.' + filename_parts[-1].lower()
-    return ext in valid_extensions
+def iso_now() -> str:
+    """Wall-clock ISO timestamp at second resolution, formatted once per second.
+
+    For the polled /health and /status probes, which have no use for
+    sub-second precision.
+    """
+    global _iso_cache
+    second = int(time.time())
+    cached_second, text = _iso_cache
+    if second != cached_second:
+        text = datetime.fromtimestamp(second).isoformat()
+        _iso_cache = (second, text)
+    return text
+
+class JSONBodyCache:
+    """Serialized JSON body, rebuilt only when its key changes.
+
+    Keyed on iso_now() (plus whatever else the body shows), high-rate probes
+    get the same bytes for a whole second instead of a fresh dict + dump.
+    """
+    __slots__ = ("_key", "_body")
+
+    def __init__(self):
+        self._key = None
+        self._body = b""
+
+    def get(self, key, build) -> bytes:
+        if key != self._key:
+            self._body = orjson.dumps(build())
+            self._key = key
+        return self._body
+
+# Constant part of every /health response
+_SERVICE_META = {"service": "cell-segmentation", "version": "1.0.0"}
+_health_body = JSONBodyCache()
+_status_body = JSONBodyCache()
+
+# /models is re-read from the loader at most this often; in between, pollers
+# get the cached body, or a 304 when their If-None-Match still matches
+_MODELS_INFO_TTL_S = float(os.getenv("ML_MODELS_INFO_TTL_S", "60"))
+# (loader, expiry on time.monotonic(), ETag, body)
+_models_cache: tuple = (None, 0.0, "", b"")
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header covers etag"""
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in tags or "*" in tags
 
 @router.get("/health")
 async def health_check(request: Request):
     """Health check endpoint"""
     try:
-        device_info = {
-            "gpu_available": torch.cuda.is_available(),
-            "device_count": torch.cuda.device_count() if torch.cuda.is_available() else 0,
-            "device_name": torch.cuda.get_device_name() if torch.cuda.is_available() else "CPU"
-        }
+        info = device_info(request.app)
 
         # Surface models that failed to pre-load so deploy monitoring can detect
         # missing weights or HF_TOKEN issues without reading log files.
         models_failed = getattr(request.app.state, "models_failed", [])
+        timestamp = iso_now()
 
-        return {
+        body = _health_body.get((timestamp, info, models_failed), lambda: {
+            **_SERVICE_META,
             "status": "healthy",
-            "timestamp": datetime.now().isoformat(),
-            "service": "cell-segmentation",
-            "version": "1.0.0",
-            "device": device_info,
+            "timestamp": timestamp,
+            "device": info,
             "models_failed": models_failed,
-        }
+        })
+        return Response(body, media_type="application/json")
     except Exception as e:
         logger.error(f"Health check failed: {e}")
         raise HTTPException(status_code=500, detail="Health check failed")
 
 @router.get("/models")
-async def get_models(loader = Depends(get_model_loader)):
+async def get_models(request: Request, loader = Depends(get_model_loader)):
     """Get available models information"""
+    global _models_cache
     try:
-        models_info = loader.get_model_info()
-        return {"models": models_info}
+        cached_loader, expires, etag, body = _models_cache
+        if cached_loader is not loader or time.monotonic() >= expires:
+            body = orjson.dumps({"models": loader.get_model_info()})
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            _models_cache = (loader, time.monotonic() + _MODELS_INFO_TTL_S, etag, body)
+
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(body, media_type="application/json", headers={"ETag": etag})
         
     except Exception as e:
         logger.error(f"Failed to get models info: {e}")
@@ -103,19 +451,19 @@ async def get_models(loader = Depends(get_model_loader)):
 async def get_status(loader = Depends(get_model_loader)):
     """Get current service status including processing state"""
     try:
-        # Check if any model is currently processing
-        is_processing = hasattr(loader, 'is_processing') and loader.is_processing
-        current_model = getattr(loader, 'current_model', None)
-        queue_length = getattr(loader, 'queue_length', 0)
-        
-        return {
+        snapshot = loader.snapshot_status()
+        is_processing, current_model, queue_length = snapshot
+        timestamp = iso_now()
+
+        body = _status_body.get((timestamp, snapshot), lambda: {
             "status": "processing" if is_processing else "idle",
             "is_processing": is_processing,
             "current_model": current_model,
             "queue_length": queue_length,
             "available": not is_processing,
-            "timestamp": datetime.now().isoformat()
-        }
+            "timestamp": timestamp
+        })
+        return Response(body, media_type="application/json")
         
     except Exception as e:
         logger.error(f"Failed to get status: {e}")
@@ -123,14 +471,16 @@ async def get_status(loader = Depends(get_model_loader)):
 
 @router.post("/segment")
 async def segment_image(
+    request: Request,
     file: UploadFile = File(...),
     model: str = Form("hrnet", description="Model to use for segmentation"),
     threshold: float = Form(0.5, ge=0.1, le=0.9, description="Segmentation threshold"),
     detect_holes: bool = Form(True, description="Whether to detect holes in segmentation"),
-    loader = Depends(get_model_loader)
+    loader = Depends(get_model_loader),
+    scheduler = Depends(get_inference_scheduler)
 ):
     """Main segmentation endpoint"""
-    start_time = time.time()
+    start_ns = time.monotonic_ns()
     
     try:
         # Validate uploaded file
@@ -140,14 +490,19 @@ async def segment_image(
                 detail="Invalid image file. Supported formats: PNG, JPG, JPEG, TIFF, TIF, BMP"
             )
         
-        # Read image data and convert to PIL Image
-        image_data = await file.read()
-        image = Image.open(io.BytesIO(image_data))
+        # Read image data and decode it off the event loop
+        try:
+            image = await _read_and_decode(file)
+        except InvalidImageError:
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid image file. Supported formats: PNG, JPG, JPEG, TIFF, TIF, BMP"
+            )
         
-        logger.info(f"Processing image: {file.filename}, Model: {model}, Threshold: {threshold}, Detect holes: {detect_holes}")
+        logger.info("Processing image: %s, Model: %s, Threshold: %s, Detect holes: %s", file.filename, model, threshold, detect_holes)
         
         # Perform segmentation with timing
-        inference_start = time.time()
+        inference_start_ns = time.monotonic_ns()
         if model == 'sperm':
             # Sperm model uses its own mask_threshold (0.3) and score_threshold (0.95)
             # Don't override with the user's segmentation threshold — it's calibrated differently
@@ -179,18 +534,22 @@ async def segment_image(
             # CLAHE preprocessing and emits foreground + core polygons directly,
             # so it can't flow through the generic single-channel predict path.
             result = loader.predict_disintegration(image, threshold, detect_holes)
+        elif scheduler is not None:
+            # Generic single-head models: coalesced with concurrent requests
+            # into one predict_batch() call by the scheduler
+            result = await scheduler.submit(image, model, threshold, detect_holes)
         else:
             result = loader.predict(image, model, threshold, detect_holes)
-        inference_time = time.time() - inference_start
+        inference_time = _elapsed_since(inference_start_ns)
         
-        processing_time = time.time() - start_time
+        processing_time = _elapsed_since(start_ns)
         
         # Add detailed timing and performance metrics
         result["processing_time"] = processing_time
         result["inference_time"] = inference_time
         result["preprocessing_time"] = processing_time - inference_time
         result["device"] = str(loader.device)
-        result["gpu_enabled"] = torch.cuda.is_available()
+        result["gpu_enabled"] = device_info(request.app)["gpu_available"]
         result["batch_size_used"] = getattr(loader, 'last_batch_size', 1)
         result["success"] = True
         
@@ -200,57 +559,40 @@ async def segment_image(
         total_detected = polygon_count + polyline_count
         if total_detected == 0:
             result["warning"] = "No polygons or polylines detected - image may not contain detectable structures or threshold may need adjustment"
-            logger.warning(f"Segmentation completed in {processing_time:.2f}s, but found 0 detections - potential detection issue")
+            logger.warning("Segmentation completed in %.2fs, but found 0 detections - potential detection issue", processing_time)
         else:
-            logger.info(f"Segmentation completed in {processing_time:.2f}s, found {polygon_count} polygons, {polyline_count} polylines")
+            logger.info("Segmentation completed in %.2fs, found %d polygons, %d polylines", processing_time, polygon_count, polyline_count)
         
-        return result
+        # Returned as a response so FastAPI skips its jsonable_encoder walk
+        # over every polygon vertex; orjson serializes the dict directly
+        return ORJSONResponse(result)
         
     except HTTPException:
         raise
-    except (InferenceTimeoutError, TimeoutError) as e:
-        # Handle timeout errors with detailed information
-        processing_time = time.time() - start_time
+    except SchedulerFullError as e:
+        logger.warning("Rejecting segmentation request: %s", e)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except InferenceTimeoutError as e:
+        processing_time = _elapsed_since(start_ns)
         logger.error(f"Segmentation timeout after {processing_time:.2f}s for model {model}: {e}")
-        
-        # Extract details from InferenceTimeoutError if available
-        if isinstance(e, InferenceTimeoutError):
-            error_detail = {
-                "error": "Model inference timeout",
-                "message": str(e),
-                "model": e.model_name,
-                "timeout": e.timeout,
-                "image_size": e.image_size,
-                "suggestion": f"Model '{e.model_name}' timed out after {e.timeout}s. Try: 1) Use 'hrnet' model instead, 2) Reduce image size, 3) Increase ML_INFERENCE_TIMEOUT environment variable",
-                "processing_time": processing_time
-            }
-        else:
-            # Legacy TimeoutError
-            error_detail = {
-                "error": "Model inference timeout",
-                "message": str(e),
-                "model": model,
-                "suggestion": "Try using a simpler model (hrnet) or reducing image size",
-                "processing_time": processing_time
-            }
-        
-        raise HTTPException(status_code=504, detail=error_detail)
-        
+        raise HTTPException(status_code=504, detail=_timeout_detail(e, processing_time))
+    except TimeoutError as e:
+        # Timeouts raised outside the executor carry no model details
+        processing_time = _elapsed_since(start_ns)
+        logger.error(f"Segmentation timeout after {processing_time:.2f}s for model {model}: {e}")
+        raise HTTPException(status_code=504, detail={
+            "error": "Model inference timeout",
+            "message": str(e),
+            "model": model,
+            "suggestion": "Try using a simpler model (hrnet) or reducing image size",
+            "processing_time": processing_time
+        })
     except InferenceError as e:
-        # Handle inference errors with context
-        processing_time = time.time() - start_time
+        processing_time = _elapsed_since(start_ns)
         logger.error(f"Inference error after {processing_time:.2f}s: {e}")
-        raise HTTPException(
-            status_code=500,
-            detail={
-                "error": "Inference failed",
-                "message": str(e),
-                "model": model,
-                "processing_time": processing_time
-            }
-        )
+        raise HTTPException(status_code=500, detail=_inference_error_detail(e, model, processing_time))
     except Exception as e:
-        processing_time = time.time() - start_time
+        processing_time = _elapsed_since(start_ns)
         raise internal_error(
             logger, f"Segmentation failed after {processing_time:.2f}s", e
         )
@@ -261,17 +603,22 @@ async def batch_segment_images(
     model: str = Form("hrnet", description="Model to use for segmentation"),
     threshold: float = Form(0.5, ge=0.1, le=0.9, description="Segmentation threshold"),
     detect_holes: bool = Form(True, description="Whether to detect holes in segmentation"),
+    response_format: str = Query(
+        "json", alias="format", pattern="^(json|npz)$",
+        description="json, or npz for float32 vertex arrays plus JSON metadata"
+    ),
     loader = Depends(get_model_loader)
 ):
     """Batch segmentation endpoint for processing multiple images using optimized batch processing"""
-    start_time = time.time()
+    start_ns = time.monotonic_ns()
 
     # Debug logging for request details (limit to first 10 files to avoid log spam)
-    logger.info(f"Batch segment request received: {len(files)} files, model={model}, threshold={threshold}")
-    for i, f in enumerate(files[:10]):
-        logger.debug(f"  File {i}: {f.filename}, content_type={f.content_type}")
-    if len(files) > 10:
-        logger.debug(f"  ... and {len(files) - 10} more files")
+    logger.info("Batch segment request received: %d files, model=%s, threshold=%s", len(files), model, threshold)
+    if logger.isEnabledFor(logging.DEBUG):
+        for i, f in enumerate(files[:10]):
+            logger.debug("  File %d: %s, content_type=%s", i, f.filename, f.content_type)
+        if len(files) > 10:
+            logger.debug("  ... and %d more files", len(files) - 10)
 
     try:
         # Get batch size limits from loader configuration
@@ -282,36 +629,46 @@ async def batch_segment_images(
                 detail=f"Batch size for {model} model cannot exceed {max_batch_size} images"
             )
         
-        # Validate all files
-        for file in files:
-            if not validate_image(file):
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Invalid image file: {file.filename}. Supported formats: PNG, JPG, JPEG, TIFF, TIF, BMP"
-                )
+        # Reject the batch on the first bad extension, before any upload is read
+        bad = next((f.filename for f in files if not validate_image(f)), None)
+        if bad is not None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid image file: {bad}. Supported formats: PNG, JPG, JPEG, TIFF, TIF, BMP"
+            )
         
-        # Read all images into memory first
-        images = []
+        # Refuse oversize batches from the declared sizes, before any read
+        total_bytes = sum(f.size or 0 for f in files)
+        if total_bytes > _MAX_BATCH_BYTES:
+            raise _payload_too_large(f"Batch exceeds {_MAX_BATCH_BYTES >> 20} MB in total")
+
+        # Read and decode all uploads concurrently: spooled-to-disk reads and
+        # the PIL decodes run on the thread pool, so they overlap each other
+        # and never stall the event loop
+        decoded = await asyncio.gather(
+            *(_read_and_decode(file) for file in files), return_exceptions=True
+        )
+        # Keep only one list referencing the decoded images (valid_images), so
+        # dropping it after inference frees them before results are serialized
+        loaded = []
+        valid_images = []
         filenames = []
-        for i, file in enumerate(files):
-            try:
-                image_data = await file.read()
-                image = Image.open(io.BytesIO(image_data))
-                images.append(image)
-                filenames.append(file.filename)
-            except Exception as e:
-                logger.error(f"Failed to read image {file.filename}: {e}")
+        for file, image in zip(files, decoded):
+            if isinstance(image, HTTPException):
+                # An upload over the per-file cap fails the whole request
+                raise image
+            if isinstance(image, Exception):
+                logger.error(f"Failed to read image {file.filename}: {image}")
                 # Add placeholder for failed image to maintain index alignment
-                images.append(None)
-                filenames.append(file.filename)
-        
-        # Filter out None values but keep track of indices
-        valid_images = []
-        valid_indices = []
-        for i, img in enumerate(images):
-            if img is not None:
-                valid_images.append(img)
-                valid_indices.append(i)
+                image = None
+            elif isinstance(image, BaseException):
+                raise image
+            else:
+                valid_images.append(image)
+            # Failed images keep their slot so results are re-aligned below
+            loaded.append(image is not None)
+            filenames.append(file.filename)
+        del decoded
         
         if not valid_images:
             raise HTTPException(
@@ -319,7 +676,11 @@ async def batch_segment_images(
                 detail="No valid images could be processed"
             )
         
-        logger.info(f"Processing batch of {len(valid_images)} images using predict_batch, Model: {model}, Threshold: {threshold}, Detect holes: {detect_holes}")
+        logger.debug("Processing batch of %d images using predict_batch, Model: %s, Threshold: %s, Detect holes: %s", len(valid_images), model, threshold, detect_holes)
+        
+        # Batch statistics, accumulated while results are filled in
+        successful_count = 0
+        total_polygons = 0
         
         # Use the optimized batch processing method
         try:
@@ -334,121 +695,51 @@ async def batch_segment_images(
                 threshold=threshold,
                 detect_holes=detect_holes
             )
+            del valid_images
             
-            # Create results array with proper index alignment
-            results = []
-            result_index = 0
+            # Fill a preallocated results array with proper index alignment,
+            # counting successes and polygons as we go
+            results = [None] * len(files)
+            batch_results_iter = iter(batch_results)
+            log_debug = logger.isEnabledFor(logging.DEBUG)
             
-            for i in range(len(files)):
-                if i in valid_indices:
-                    # This image was processed
-                    batch_result = batch_results[result_index] if result_index < len(batch_results) else None
-                    result_index += 1
+            for i, ok in enumerate(loaded):
+                if ok:
+                    # This image was processed; results follow valid_images order
+                    batch_result = next(batch_results_iter, None)
                     
                     if batch_result:
                         # Add file information to result
                         batch_result["filename"] = filenames[i]
                         batch_result["batch_index"] = i
                         batch_result["success"] = True
-                        results.append(batch_result)
-                        logger.info(f"Batch image {i+1} completed, found {len(batch_result.get('polygons', []))} polygons")
+                        results[i] = batch_result
+                        polygon_count = len(batch_result.get("polygons", []))
+                        successful_count += 1
+                        total_polygons += polygon_count
+                        if log_debug:
+                            logger.debug("Batch image %d completed, found %d polygons", i + 1, polygon_count)
                     else:
                         # No result for this image
-                        results.append({
-                            "filename": filenames[i],
-                            "batch_index": i,
-                            "success": False,
-                            "error": "No result from batch processing",
-                            "polygons": [],
-                            "model_used": model,
-                            "threshold_used": threshold
-                        })
+                        results[i] = _failed_result(
+                            filenames[i], i, model, threshold, "No result from batch processing"
+                        )
                 else:
                     # This image failed to load
-                    results.append({
-                        "filename": filenames[i],
-                        "batch_index": i,
-                        "success": False,
-                        "error": "Failed to load image",
-                        "polygons": [],
-                        "model_used": model,
-                        "threshold_used": threshold
-                    })
-            
-            logger.info(f"Batch processing completed using predict_batch, processed {len(valid_images)} images")
+                    results[i] = _failed_result(
+                        filenames[i], i, model, threshold, "Failed to load image"
+                    )
             
-        except (InferenceTimeoutError, TimeoutError) as e:
-            logger.error(f"Timeout processing batch: {e}")
-            
-            # Extract timeout details
-            if isinstance(e, InferenceTimeoutError):
-                error_msg = f"Batch timeout after {e.timeout}s for model '{e.model_name}'"
-                error_detail = {
-                    "type": "timeout",
-                    "message": str(e),
-                    "model": e.model_name,
-                    "timeout": e.timeout,
-                    "image_size": e.image_size
-                }
-            else:
-                error_msg = "Batch inference timeout"
-                error_detail = str(e)
-            
-            # Return error for all images in batch
-            results = []
-            for i, filename in enumerate(filenames):
-                results.append({
-                    "filename": filename,
-                    "batch_index": i,
-                    "success": False,
-                    "error": error_msg,
-                    "error_detail": error_detail,
-                    "polygons": [],
-                    "model_used": model,
-                    "threshold_used": threshold
-                })
-                
-        except InferenceError as e:
-            # Log the full exception details (including the message that
-            # may reference internal paths) but return only a generic
-            # error to the API caller to avoid leaking stack trace / path
-            # information (CodeQL py/stack-trace-exposure).
-            logger.error(f"Inference error processing batch: {e}", exc_info=True)
-
-            results = []
-            for i, filename in enumerate(filenames):
-                results.append({
-                    "filename": filename,
-                    "batch_index": i,
-                    "success": False,
-                    "error": "Batch inference failed",
-                    "error_detail": "Inference error — see server logs",
-                    "polygons": [],
-                    "model_used": model,
-                    "threshold_used": threshold
-                })
         except Exception as e:
-            logger.error(f"Failed to process batch: {e}", exc_info=True)
-
-            # Same rationale as above — do not echo str(e) back to the
-            # external caller.
-            results = []
-            for i, filename in enumerate(filenames):
-                results.append({
-                    "filename": filename,
-                    "batch_index": i,
-                    "success": False,
-                    "error": "Batch processing failed — see server logs",
-                    "polygons": [],
-                    "model_used": model,
-                    "threshold_used": threshold
-                })
+            # The whole batch failed: every file gets the same failure entry
+            error_msg, error_detail = _batch_failure(e)
+            successful_count = total_polygons = 0
+            results = [
+                _failed_result(filename, i, model, threshold, error_msg, error_detail)
+                for i, filename in enumerate(filenames)
+            ]
         
-        processing_time = time.time() - start_time
-        
-        # Calculate batch statistics
-        successful_count = sum(1 for r in results if r["success"])
-        total_polygons = sum(len(r["polygons"]) for r in results if r["success"])
+        processing_time = _elapsed_since(start_ns)
         
         batch_result = {
             "success": True,
@@ -462,14 +753,19 @@ async def batch_segment_images(
             "results": results
         }
         
-        logger.info(f"Batch segmentation completed in {processing_time:.2f}s, {successful_count}/{len(files)} successful")
+        logger.info(
+            "Batch segmentation completed: model=%s, %d/%d successful, %d polygons, %.3fs",
+            model, successful_count, len(files), total_polygons, processing_time
+        )
         
-        return batch_result
+        if response_format == "npz":
+            return _npz_batch_response(batch_result)
+        return ORJSONResponse(batch_result)
         
     except HTTPException:
         raise
     except Exception as e:
-        processing_time = time.time() - start_time
+        processing_time = _elapsed_since(start_ns)
         logger.error(f"Batch segmentation failed after {processing_time:.2f}s: {e}")
         raise HTTPException(
             status_code=500,
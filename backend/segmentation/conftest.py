@@ -53,92 +53,77 @@ async def async_client() -> AsyncGenerator[AsyncClient, None]:
             yield ac
 
 
-@pytest.fixture
+# The sample_* fixtures are deterministic and built once per session: tests
+# that modify them must work on a .copy() / .clone().
+
+# Squared distance of every pixel of the 256x256 samples from their centre
+_yy, _xx = np.ogrid[:256, :256]
+_DIST2 = (_xx - 128) ** 2 + (_yy - 128) ** 2
+del _yy, _xx
+
+
+@pytest.fixture(scope="session")
 def sample_image() -> Image.Image:
     """Create a sample PIL Image for testing."""
-    # Create a simple test image (RGB, 256x256)
-    image = Image.new('RGB', (256, 256), color='white')
-    
-    # Add some patterns to make it more realistic
-    # Set seed for deterministic test images
-    np.random.seed(42)
-    pixels = image.load()
-    for i in range(256):
-        for j in range(256):
-            # Create some circular patterns to simulate cells
-            center_x, center_y = 128, 128
-            distance = ((i - center_x) ** 2 + (j - center_y) ** 2) ** 0.5
-            if 50 < distance < 70:
-                pixels[i, j] = (100, 100, 100)  # Gray circle
-            elif distance < 30:
-                pixels[i, j] = (50, 50, 50)     # Dark center
-    
-    return image
+    # White 256x256 RGB image with circular patterns to simulate cells
+    pixels = np.full((256, 256, 3), 255, dtype=np.uint8)
+    pixels[(_DIST2 > 50 ** 2) & (_DIST2 < 70 ** 2)] = 100  # Gray circle
+    pixels[_DIST2 < 30 ** 2] = 50                          # Dark center
 
+    return Image.fromarray(pixels, 'RGB')
 
-@pytest.fixture
+
+@pytest.fixture(scope="session")
 def sample_image_bytes(sample_image: Image.Image) -> bytes:
-    """Convert sample image to bytes."""
+    """Convert sample image to bytes.
+
+    BMP (header + raw pixels) rather than JPEG: no codec work on either side,
+    and the server decodes exactly the pixels of sample_image.
+    """
     import io
     buffer = io.BytesIO()
-    sample_image.save(buffer, format='JPEG')
+    sample_image.save(buffer, format='BMP')
     return buffer.getvalue()
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_tensor() -> torch.Tensor:
     """Create a sample tensor for testing."""
-    # Set seed for deterministic tensors
-    torch.manual_seed(42)
-    return torch.randn(1, 3, 256, 256)
+    # Private generator: deterministic without reseeding the global RNG
+    g = torch.Generator().manual_seed(42)
+    return torch.randn(1, 3, 256, 256, generator=g)
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_mask() -> torch.Tensor:
     """Create a sample mask tensor for testing."""
-    mask = torch.zeros(1, 1, 256, 256)
-    # Add some circular masks to simulate cell segmentation
-    center_x, center_y = 128, 128
-    radius = 50
-    
-    for i in range(256):
-        for j in range(256):
-            distance = ((i - center_x) ** 2 + (j - center_y) ** 2) ** 0.5
-            if distance < radius:
-                mask[0, 0, i, j] = 1.0
-    
-    return mask
+    # Circular mask to simulate cell segmentation
+    disk = _DIST2 < 50 ** 2
+    return torch.from_numpy(disk.astype(np.float32))[None, None]
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def mock_model_weights() -> dict:
     """Create mock model weights for testing."""
-    # Set seed for deterministic weights
-    torch.manual_seed(42)
+    # Private generator: deterministic without reseeding the global RNG
+    g = torch.Generator().manual_seed(42)
     return {
-        'conv1.weight': torch.randn(64, 3, 7, 7),
-        'conv1.bias': torch.randn(64),
-        'bn1.weight': torch.randn(64),
-        'bn1.bias': torch.randn(64),
+        'conv1.weight': torch.randn(64, 3, 7, 7, generator=g),
+        'conv1.bias': torch.randn(64, generator=g),
+        'bn1.weight': torch.randn(64, generator=g),
+        'bn1.bias': torch.randn(64, generator=g),
     }
 
 
-@pytest.fixture(autouse=True)
-def setup_test_environment():
-    """Setup test environment variables."""
-    os.environ['ENVIRONMENT'] = 'test'
-    os.environ['LOG_LEVEL'] = 'DEBUG'
-    os.environ['MODEL_PATH'] = '/tmp/test_models'
-    
-    # Ensure model directory exists
-    os.makedirs('/tmp/test_models', exist_ok=True)
-    
-    yield
-    
-    # Cleanup after tests
-    import shutil
-    if os.path.exists('/tmp/test_models'):
-        shutil.rmtree('/tmp/test_models')
+@pytest.fixture(scope="session", autouse=True)
+def setup_test_environment(tmp_path_factory):
+    """Setup test environment variables (restored when the session ends)."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('ENVIRONMENT', 'test')
+        mp.setenv('LOG_LEVEL', 'DEBUG')
+        # Per-session (and per xdist worker) directory; pytest prunes old ones
+        mp.setenv('MODEL_PATH', str(tmp_path_factory.mktemp("models")))
+        yield
 
 
 @pytest.fixture
@@ -8,6 +8,7 @@ This module provides a production-ready inference execution system with:
 - Comprehensive error handling and recovery
 """
 
+import itertools
 import logging
 import time
 import threading
@@ -15,7 +16,7 @@ from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from contextlib import contextmanager
 from dataclasses import dataclass
 from enum import Enum
-from typing import Any, Dict, Optional, Callable, List
+from typing import Any, Dict, Optional, Callable, List, Tuple
 import torch
 import psutil
 import os
@@ -23,6 +24,20 @@ import gc
 
 logger = logging.getLogger(__name__)
 
+# Minimum seconds between host CPU-usage samples in _check_resources
+_CPU_SAMPLE_INTERVAL_S = 5.0
+
+# torch.compile modes that capture CUDA graphs: a graph replay overwrites the
+# previous outputs, but ours are read after the model lock is released
+_CUDAGRAPH_COMPILE_MODES = {
+    "reduce-overhead": "default",
+    "max-autotune": "max-autotune-no-cudagraphs",
+}
+
+# Eager passes run on a new input shape before its CUDA graph is captured
+# (lets cuDNN pick algorithms and the allocator settle)
+_GRAPH_WARMUP_ITERS = 3
+
 
 class InferenceStatus(Enum):
     """Status of an inference request"""
@@ -61,7 +76,7 @@ class ModelStateError(InferenceError):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class InferenceMetrics:
     """Metrics for an inference request"""
     start_time: float
@@ -84,24 +99,38 @@ class InferenceMetrics:
         return None
 
 
+_FINAL_STATUSES = frozenset({
+    InferenceStatus.COMPLETED, InferenceStatus.FAILED,
+    InferenceStatus.TIMEOUT, InferenceStatus.CANCELLED,
+})
+
+
 class InferenceSession:
     """Context for a single inference session"""
+    __slots__ = ('session_id', 'model_name', 'metrics', '_future')
     
     def __init__(self, session_id: str, model_name: str):
         self.session_id = session_id
         self.model_name = model_name
         self.metrics = InferenceMetrics(start_time=time.time())
-        self._lock = threading.RLock()
         
     def update_status(self, status: InferenceStatus, error: Optional[str] = None):
-        """Thread-safe status update"""
-        with self._lock:
-            self.metrics.status = status
-            if error:
-                self.metrics.error = error
-            if status in [InferenceStatus.COMPLETED, InferenceStatus.FAILED, 
-                         InferenceStatus.TIMEOUT, InferenceStatus.CANCELLED]:
-                self.metrics.end_time = time.time()
+        """Record a status change (each write is a single attribute store)"""
+        self.metrics.status = status
+        if error:
+            self.metrics.error = error
+        if status in _FINAL_STATUSES:
+            self.metrics.end_time = time.time()
+
+
+def _ensure_eval(model: torch.nn.Module) -> None:
+    """Switch a model to eval mode unless it already is.
+
+    Loaders call eval() once after loading; re-running it per request walks
+    every submodule, so only the root flag is checked here.
+    """
+    if model.training:
+        model.eval()
 
 
 class InferenceExecutor:
@@ -114,7 +143,12 @@ class InferenceExecutor:
                  default_timeout: float = 60.0,
                  memory_limit_gb: float = 20.0,
                  enable_monitoring: bool = True,
-                 enable_cuda_streams: bool = True):
+                 enable_cuda_streams: bool = True,
+                 compile_mode: Optional[str] = None,
+                 compile_fullgraph: bool = False,
+                 cuda_graphs: bool = False,
+                 cudnn_benchmark: bool = False,
+                 allow_tf32: bool = False):
         """
         Initialize the inference executor
 
@@ -124,6 +158,17 @@ class InferenceExecutor:
             memory_limit_gb: Maximum memory usage in GB
             enable_monitoring: Enable resource monitoring
             enable_cuda_streams: Enable CUDA streams for parallel GPU execution
+            compile_mode: torch.compile mode for model forwards (None: eager)
+            compile_fullgraph: Fail compilation on graph breaks (the model
+                then runs eagerly) instead of compiling around them
+            cuda_graphs: Capture a CUDA graph per model and input shape and
+                replay it on the CUDA-stream path (ignored with compile_mode)
+            cudnn_benchmark: Let cuDNN time its algorithms per input shape
+                (process-wide setting; re-tunes on every new shape, so it
+                only pays off when all models see fixed shapes)
+            allow_tf32: Allow TF32 tensor-core math for convolutions and
+                matmuls on Ampere+ GPUs (process-wide setting; changes the
+                numerics, and so the masks, of every model)
         """
         self.executor = ThreadPoolExecutor(
             max_workers=max_workers,
@@ -144,8 +189,22 @@ class InferenceExecutor:
             self.cuda_streams = [torch.cuda.Stream() for _ in range(max_workers)]
             logger.info(f"Created {len(self.cuda_streams)} CUDA streams for parallel inference")
 
-        # Thread safety - model locks restored for CUDA safety
+        if torch.cuda.is_available():
+            # Opt-in: both flags affect every model in the process, including
+            # the variable-shape disintegration and microtubule pipelines
+            if cudnn_benchmark:
+                torch.backends.cudnn.benchmark = True
+            if allow_tf32:
+                torch.backends.cuda.matmul.allow_tf32 = True
+                torch.backends.cudnn.allow_tf32 = True
+            logger.info(f"cuDNN benchmark: {torch.backends.cudnn.benchmark}, "
+                        f"TF32: {torch.backends.cuda.matmul.allow_tf32}")
+
+        # Thread safety - model locks restored for CUDA safety. Sessions are
+        # inserted/popped under their own unique ids without a lock (single
+        # dict setitem/pop are atomic under the GIL); readers take a snapshot.
         self._sessions: Dict[str, InferenceSession] = {}
+        self._session_ids = itertools.count(1)
         self._global_lock = threading.RLock()
 
         # Proactive memory monitoring
@@ -153,6 +212,42 @@ class InferenceExecutor:
         self._memory_critical_threshold = 0.9  # 90% of limit
         self._model_locks: Dict[str, threading.RLock] = {}
 
+        # Per-model event recorded after the last streamed forward; a CUDA
+        # graph replay waits on it before overwriting its static input
+        self._forward_done: Dict[str, torch.cuda.Event] = {}
+
+        # Per-model torch.compile'd forwards as (model, forward): a reloaded
+        # model object is recompiled. Only touched under that model's lock.
+        if compile_mode in _CUDAGRAPH_COMPILE_MODES:
+            replacement = _CUDAGRAPH_COMPILE_MODES[compile_mode]
+            logger.warning(f"torch.compile mode '{compile_mode}' captures CUDA graphs; "
+                           f"using '{replacement}' instead")
+            compile_mode = replacement
+        self.compile_mode = compile_mode
+        self.compile_fullgraph = compile_fullgraph
+        self._compiled: Dict[str, Tuple[torch.nn.Module, Callable]] = {}
+
+        # Captured CUDA graphs keyed by (model name, input shape, dtype), as
+        # (model, graph, static input, static output); graph is None for
+        # shapes that could not be captured. Only touched under the model's lock.
+        if cuda_graphs and compile_mode:
+            logger.warning("CUDA graph capture is disabled while torch.compile is enabled")
+            cuda_graphs = False
+        self.cuda_graphs = cuda_graphs
+        self._graphs: Dict[tuple, Tuple[torch.nn.Module, Optional[torch.cuda.CUDAGraph],
+                                        Optional[torch.Tensor], Optional[torch.Tensor]]] = {}
+
+        # Host-side resource sampling: one Process handle, and a non-blocking
+        # CPU reading taken at most every _CPU_SAMPLE_INTERVAL_S (primed here
+        # so the first reading covers the time since construction)
+        self._process = psutil.Process(os.getpid())
+        self._next_cpu_sample = 0.0
+        psutil.cpu_percent(interval=None)
+
+        # Static device properties, read from the driver on first use
+        self._gpu_total_memory: Optional[int] = None
+        self._gpu_device_name: Optional[str] = None
+
         # Memory pressure monitoring
         self._memory_pressure_threshold = 0.9  # 90% of GPU memory
         self._emergency_cleanup_threshold = 0.95  # 95% triggers emergency cleanup
@@ -179,9 +274,7 @@ class InferenceExecutor:
     def inference_context(self, session_id: str, model_name: str):
         """Context manager for inference session"""
         session = InferenceSession(session_id, model_name)
-        
-        with self._global_lock:
-            self._sessions[session_id] = session
+        self._sessions[session_id] = session
         
         try:
             # Record initial memory
@@ -203,8 +296,7 @@ class InferenceExecutor:
         
         finally:
             # Cleanup session
-            with self._global_lock:
-                self._sessions.pop(session_id, None)
+            self._sessions.pop(session_id, None)
             
             # Log metrics
             if session.metrics.duration:
@@ -236,7 +328,7 @@ class InferenceExecutor:
             InferenceError: For other inference failures
         """
         timeout = timeout or self.default_timeout
-        session_id = f"{model_name}_{time.time()}_{threading.get_ident()}"
+        session_id = f"{model_name}_{next(self._session_ids)}"
         
         # Check resources before starting
         if self.enable_monitoring:
@@ -254,41 +346,58 @@ class InferenceExecutor:
             """Inner function to run inference with CUDA streams and model locks for safety"""
             # Get model lock for CUDA thread safety
             model_lock = self.get_model_lock(model_name)
+            # Grad mode is thread-local, so it is switched off here on the
+            # worker thread; inference_mode also skips view/version tracking.
+            # The NVTX range labels the forward pass in Nsight traces.
+            nvtx_label = f"predict/{model_name}"
 
             try:
                 with model_lock:  # Serialize access to model instance
                     if cuda_stream is not None:
+                        # Inputs arrive via non_blocking copies queued on the
+                        # default stream; don't read them before they land
+                        cuda_stream.wait_stream(torch.cuda.current_stream())
                         # Use dedicated CUDA stream for true parallel execution
                         with torch.cuda.stream(cuda_stream):
-                            with torch.no_grad():
-                                # Ensure model is in eval mode
-                                model.eval()
+                            with torch.inference_mode(), torch.cuda.nvtx.range(nvtx_label):
+                                _ensure_eval(model)
 
                                 # Run inference on dedicated stream
-                                output = model(input_tensor)
-
-                                # Synchronize stream to ensure completion
-                                cuda_stream.synchronize()
+                                output = None
+                                if self.cuda_graphs:
+                                    output = self._replay_graph(model_name, model, input_tensor, cuda_stream)
+                                if output is None:
+                                    output = self._forward(model_name, model, input_tensor)
 
                                 # Handle different output formats
                                 if isinstance(output, tuple):
                                     output = output[0]
 
-                                return output
+                                # Mark completion with an event so the model
+                                # lock can be released while the GPU is busy
+                                done = torch.cuda.Event(blocking=True)
+                                done.record(cuda_stream)
+                                self._forward_done[model_name] = done
                     else:
                         # Fallback to default stream
-                        with torch.no_grad():
-                            # Ensure model is in eval mode
-                            model.eval()
+                        with torch.inference_mode(), torch.cuda.nvtx.range(nvtx_label):
+                            _ensure_eval(model)
 
                             # Run inference
-                            output = model(input_tensor)
+                            output = self._forward(model_name, model, input_tensor)
 
                             # Handle different output formats
                             if isinstance(output, tuple):
                                 output = output[0]
 
-                        return output
+                        done = None
+
+                # Wait for the GPU outside the model lock (the next request
+                # can already queue its forward on another stream) but
+                # inside the future, so the inference timeout covers it
+                if done is not None:
+                    done.synchronize()
+                return output, done
 
             except RuntimeError as e:
                 if "out of memory" in str(e).lower():
@@ -302,22 +411,21 @@ class InferenceExecutor:
                 # Submit inference task to executor
                 future = self.executor.submit(_run_inference)
                 
-                # Store future on session for shutdown handling
+                # Store future on session for shutdown handling; the session
+                # (and with it this reference) is dropped when the call returns
                 session._future = future
                 
-                # Add callback to clear future reference when done
-                def clear_future_ref(f):
-                    try:
-                        if hasattr(session, '_future'):
-                            session._future = None
-                    except Exception as e:
-                        logger.debug(f"Failed to clear future reference: {e}")
-                
-                future.add_done_callback(clear_future_ref)
-                
                 # Wait for result with timeout
                 try:
-                    result = future.result(timeout=timeout)
+                    result, done = future.result(timeout=timeout)
+                    if done is not None:
+                        # Already complete; orders the caller's stream after
+                        # the forward for the allocator's stream tracking
+                        consumer = torch.cuda.current_stream(done.device)
+                        consumer.wait_event(done)
+                        if isinstance(result, torch.Tensor) and result.is_cuda:
+                            # Allocated on the inference stream, freed by the caller
+                            result.record_stream(consumer)
                     self.total_inferences += 1
                     return result
                     
@@ -329,9 +437,10 @@ class InferenceExecutor:
                     session.update_status(InferenceStatus.TIMEOUT)
                     self.timeout_count += 1
                     
-                    # Clean up CUDA memory if applicable
-                    if torch.cuda.is_available():
-                        torch.cuda.empty_cache()
+                    # No empty_cache() on failure paths: it synchronizes the
+                    # device, stalling every other stream, and hands cached
+                    # blocks back to the driver only for the next request to
+                    # re-allocate them. GPU OOM is cleaned up in _run_inference.
                     
                     # Raise timeout error with details
                     raise InferenceTimeoutError(
@@ -346,8 +455,6 @@ class InferenceExecutor:
                     # OOM from generic failures.
                     session.update_status(InferenceStatus.FAILED, str(e))
                     self.failure_count += 1
-                    if torch.cuda.is_available():
-                        torch.cuda.empty_cache()
                     raise
 
                 except Exception as e:
@@ -355,10 +462,6 @@ class InferenceExecutor:
                     session.update_status(InferenceStatus.FAILED, str(e))
                     self.failure_count += 1
 
-                    # Clean up on failure
-                    if torch.cuda.is_available():
-                        torch.cuda.empty_cache()
-
                     logger.error(f"Inference failed for {model_name}: {e}")
                     raise InferenceError(f"Inference failed: {str(e)}") from e
         
@@ -376,6 +479,12 @@ class InferenceExecutor:
         Returns:
             RLock for the model
         """
+        # Fast path without _global_lock: locks are never replaced or removed,
+        # and a dict read is atomic under the GIL
+        lock = self._model_locks.get(model_name)
+        if lock is not None:
+            return lock
+
         with self._global_lock:
             if model_name not in self._model_locks:
                 self._model_locks[model_name] = threading.RLock()
@@ -392,17 +501,28 @@ class InferenceExecutor:
                 f"({self.memory_limit_bytes / 1024**3:.2f}GB)"
             )
 
-        # Check CPU usage
-        cpu_percent = psutil.cpu_percent(interval=0.1)
-        if cpu_percent > 95:
-            logger.warning(f"High CPU usage detected: {cpu_percent}%")
+        # Check CPU usage (average since the previous sample; never sleeps)
+        now = time.monotonic()
+        if now >= self._next_cpu_sample:
+            self._next_cpu_sample = now + _CPU_SAMPLE_INTERVAL_S
+            cpu_percent = psutil.cpu_percent(interval=None)
+            if cpu_percent > 95:
+                logger.warning(f"High CPU usage detected: {cpu_percent}%")
+
+    def _total_gpu_memory(self) -> int:
+        """Total memory of device 0; queried once, it never changes"""
+        if self._gpu_total_memory is None:
+            properties = torch.cuda.get_device_properties(0)
+            self._gpu_device_name = properties.name
+            self._gpu_total_memory = properties.total_memory
+        return self._gpu_total_memory
 
     def _check_gpu_memory_pressure(self):
         """Check GPU memory pressure and trigger cleanup if needed"""
         if not torch.cuda.is_available():
             return
 
-        total_memory = torch.cuda.get_device_properties(0).total_memory
+        total_memory = self._total_gpu_memory()
         allocated_memory = torch.cuda.memory_allocated()
         memory_utilization = allocated_memory / total_memory
 
@@ -422,8 +542,101 @@ class InferenceExecutor:
         elif memory_utilization > self._memory_pressure_threshold:
             logger.warning(f"High GPU memory pressure detected: {memory_utilization:.1%} utilized")
 
+    def _forward(self, model_name: str, model: torch.nn.Module,
+                 inputs: torch.Tensor) -> Any:
+        """
+        Run the forward pass, through torch.compile when compile_mode is set
+
+        Compilation happens on a model's first call (and again per new input
+        shape). If the compiled forward fails where the eager one succeeds,
+        the model stays eager from then on.
+        """
+        if not self.compile_mode or not isinstance(model, torch.nn.Module):
+            return model(inputs)
+
+        cached = self._compiled.get(model_name)
+        if cached is None or cached[0] is not model:
+            cached = (model, torch.compile(model, mode=self.compile_mode, dynamic=False,
+                                           fullgraph=self.compile_fullgraph))
+            self._compiled[model_name] = cached
+        forward = cached[1]
+        if forward is model:
+            return model(inputs)
+
+        try:
+            return forward(inputs)
+        except Exception as e:
+            if "out of memory" in str(e).lower():
+                raise
+            # Re-raises if the input itself is the problem
+            output = model(inputs)
+            logger.warning(f"torch.compile failed for {model_name}, running it eagerly: {e}")
+            self._compiled[model_name] = (model, model)
+            return output
+
+    def _replay_graph(self, model_name: str, model: torch.nn.Module,
+                      inputs: torch.Tensor, stream: torch.cuda.Stream) -> Optional[torch.Tensor]:
+        """
+        Run the forward as a replay of the model's CUDA graph for this shape
+
+        The graph is captured on first use, after a few eager warm-up passes.
+        Returns a copy of the graph's static output, or None when the forward
+        could not be captured (the caller then runs it eagerly).
+        """
+        if not isinstance(model, torch.nn.Module):
+            return None
+
+        key = (model_name, tuple(inputs.shape), inputs.dtype)
+        entry = self._graphs.get(key)
+        if entry is not None and entry[0] is not model:
+            # Reloaded model: release every graph (and pool) of the old one
+            for stale in [k for k in self._graphs if k[0] == model_name]:
+                del self._graphs[stale]
+            entry = None
+        if entry is None:
+            entry = self._capture_graph(model_name, model, inputs, stream)
+            self._graphs[key] = entry
+        _, graph, static_in, static_out = entry
+        if graph is None:
+            return None
+
+        # The previous replay may still be reading static_in on another stream
+        previous = self._forward_done.get(model_name)
+        if previous is not None:
+            stream.wait_event(previous)
+        static_in.copy_(inputs, non_blocking=True)
+        graph.replay()
+        # The next replay overwrites static_out
+        return static_out.clone()
+
+    def _capture_graph(self, model_name: str, model: torch.nn.Module,
+                       inputs: torch.Tensor, stream: torch.cuda.Stream) -> tuple:
+        """Capture the forward for one input shape as (model, graph, in, out)"""
+        try:
+            static_in = inputs.clone()
+            for _ in range(_GRAPH_WARMUP_ITERS):
+                model(static_in)
+            graph = torch.cuda.CUDAGraph()
+            with torch.cuda.graph(graph, stream=stream):
+                static_out = model(static_in)
+            if isinstance(static_out, tuple):
+                static_out = static_out[0]
+            if not isinstance(static_out, torch.Tensor):
+                raise TypeError(f"unsupported output type {type(static_out).__name__}")
+        except Exception as e:
+            if "out of memory" in str(e).lower():
+                raise
+            logger.warning(f"CUDA graph capture failed for {model_name} "
+                           f"{tuple(inputs.shape)}, running it eagerly: {e}")
+            return (model, None, None, None)
+
+        logger.info(f"Captured CUDA graph for {model_name} {tuple(inputs.shape)}")
+        return (model, graph, static_in, static_out)
+
     def _emergency_memory_cleanup(self):
         """Emergency GPU memory cleanup procedure"""
+        self._forward_done.clear()
+        self._graphs.clear()
         if torch.cuda.is_available():
             # Clear CUDA cache
             torch.cuda.empty_cache()
@@ -443,7 +656,7 @@ class InferenceExecutor:
         if not torch.cuda.is_available():
             return
 
-        total_memory = torch.cuda.get_device_properties(0).total_memory
+        total_memory = self._total_gpu_memory()
         allocated_memory = torch.cuda.memory_allocated()
         memory_utilization = allocated_memory / total_memory
 
@@ -475,8 +688,7 @@ class InferenceExecutor:
         if torch.cuda.is_available():
             return torch.cuda.memory_allocated()
         else:
-            process = psutil.Process(os.getpid())
-            return process.memory_info().rss
+            return self._process.memory_info().rss
     
     def get_metrics(self) -> Dict[str, Any]:
         """Get executor metrics"""
@@ -498,13 +710,13 @@ class InferenceExecutor:
 
         # Add GPU-specific metrics if available
         if torch.cuda.is_available():
-            total_memory = torch.cuda.get_device_properties(0).total_memory
+            total_memory = self._total_gpu_memory()
             allocated_memory = torch.cuda.memory_allocated()
             metrics["gpu_metrics"] = {
                 "total_memory_gb": total_memory / 1024**3,
                 "allocated_memory_gb": allocated_memory / 1024**3,
                 "memory_utilization": allocated_memory / total_memory,
-                "device_name": torch.cuda.get_device_name(0),
+                "device_name": self._gpu_device_name,
                 "memory_pressure_threshold": self._memory_pressure_threshold,
                 "emergency_cleanup_threshold": self._emergency_cleanup_threshold
             }
@@ -516,18 +728,17 @@ class InferenceExecutor:
         logger.info("Shutting down InferenceExecutor...")
         
         # Cancel any pending sessions
-        with self._global_lock:
-            for session in self._sessions.values():
-                session.update_status(InferenceStatus.CANCELLED)
+        sessions = list(self._sessions.values())
+        for session in sessions:
+            session.update_status(InferenceStatus.CANCELLED)
         
         # Shutdown executor with timeout handling
         if wait and timeout:
             # Get pending futures before shutdown
             pending_futures = []
-            with self._global_lock:
-                for session in self._sessions.values():
-                    if hasattr(session, '_future') and session._future:
-                        pending_futures.append(session._future)
+            for session in sessions:
+                if hasattr(session, '_future') and session._future:
+                    pending_futures.append(session._future)
             
             if pending_futures:
                 # Wait for futures with timeout
@@ -548,6 +759,9 @@ class InferenceExecutor:
             # Regular shutdown without timeout
             self.executor.shutdown(wait=wait)
         
+        self._compiled.clear()
+        self._graphs.clear()
+
         # Synchronize and cleanup CUDA streams
         if torch.cuda.is_available():
             if self.cuda_streams:
@@ -587,6 +801,22 @@ def get_global_executor(**kwargs) -> InferenceExecutor:
             memory_limit = float(os.getenv("ML_MEMORY_LIMIT_GB", "20"))
             enable_cuda_streams = os.getenv("ML_ENABLE_CUDA_STREAMS", "true").lower() == "true"
             enable_monitoring = os.getenv("ML_ENABLE_MONITORING", "true").lower() == "true"
+            # torch.compile mode for model forwards, e.g. "default" ("1"/"true"
+            # mean "default"); unset or "0"/"false" = eager
+            compile_mode = os.getenv("ML_TORCH_COMPILE", "").strip()
+            if compile_mode.lower() in ("1", "true"):
+                compile_mode = "default"
+            elif compile_mode.lower() in ("", "0", "false"):
+                compile_mode = None
+            kwargs.setdefault("compile_mode", compile_mode)
+            kwargs.setdefault("compile_fullgraph",
+                              os.getenv("ML_TORCH_COMPILE_FULLGRAPH", "false").lower() == "true")
+            kwargs.setdefault("cuda_graphs",
+                              os.getenv("ML_CUDA_GRAPHS", "false").lower() == "true")
+            kwargs.setdefault("cudnn_benchmark",
+                              os.getenv("ML_CUDNN_BENCHMARK", "false").lower() == "true")
+            kwargs.setdefault("allow_tf32",
+                              os.getenv("ML_ALLOW_TF32", "false").lower() == "true")
 
             _global_executor = InferenceExecutor(
                 max_workers=max_workers,
@@ -0,0 +1,209 @@
+"""
+Micro-batching Scheduler for Single-Image Segmentation Requests
+
+Concurrent /segment requests are queued and drained by one background task,
+which coalesces whatever arrives within a short window into a single
+ModelLoader.predict_batch() call per (model, threshold, detect_holes) group:
+- Bounded request queue (callers get SchedulerFullError instead of piling up)
+- One consumer, so GPU work for these requests is never interleaved
+- Per-request futures, so each caller still receives its own result or error
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from ml.inference_executor import InferenceError
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulerFullError(Exception):
+    """Raised when the request queue is at capacity"""
+    pass
+
+
+@dataclass(slots=True)
+class _PendingRequest:
+    """A queued request and the future its caller is awaiting"""
+    image: Image.Image
+    model_name: str
+    threshold: float
+    detect_holes: bool
+    future: asyncio.Future
+
+
+class InferenceScheduler:
+    """Coalesces concurrent single-image predictions into batched calls"""
+
+    def __init__(self,
+                 loader: Any,
+                 max_batch_size: int = 8,
+                 max_delay_s: float = 0.005,
+                 queue_max: int = 64):
+        """
+        Initialize the scheduler
+
+        Args:
+            loader: ModelLoader providing predict() and predict_batch()
+            max_batch_size: Most requests coalesced into one dispatch round
+            max_delay_s: How long the first request waits for company
+            queue_max: Queued requests beyond which submit() is refused
+        """
+        self.loader = loader
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_delay_s = max(0.0, max_delay_s)
+        self.queue_max = queue_max
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    def start(self) -> None:
+        """Start the consumer task on the running event loop"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_max)
+        self._start_worker()
+        logger.info(
+            "Inference scheduler started (max batch %d, window %.1f ms, queue %d)",
+            self.max_batch_size, self.max_delay_s * 1000, self.queue_max
+        )
+
+    def _start_worker(self) -> None:
+        """Create the consumer task, supervised by _on_worker_done"""
+        self._worker = asyncio.create_task(self._run(), name="inference-scheduler")
+        self._worker.add_done_callback(self._on_worker_done)
+
+    def _on_worker_done(self, worker: asyncio.Task) -> None:
+        """Restart the consumer if it died; queued requests would otherwise hang"""
+        if worker.cancelled() or worker is not self._worker:
+            return
+        logger.error("Inference scheduler consumer died, restarting",
+                     exc_info=worker.exception())
+        self._start_worker()
+
+    async def stop(self) -> None:
+        """Stop the consumer and fail any requests still queued"""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+        while not self._queue.empty():
+            request = self._queue.get_nowait()
+            if not request.future.done():
+                request.future.set_exception(InferenceError("Inference scheduler stopped"))
+        logger.info("Inference scheduler stopped")
+
+    async def submit(self, image: Image.Image, model_name: str,
+                     threshold: float = 0.5, detect_holes: bool = True) -> Dict[str, Any]:
+        """
+        Queue one image and wait for its segmentation result
+
+        Raises:
+            SchedulerFullError: If the queue is at capacity
+            InferenceError: If the scheduler is not running or the image
+                produced no result
+        """
+        if not self.running:
+            raise InferenceError("Inference scheduler is not running")
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait(
+                _PendingRequest(image, model_name, threshold, detect_holes, future)
+            )
+        except asyncio.QueueFull:
+            raise SchedulerFullError(
+                f"Inference queue is full ({self.queue_max} pending requests)"
+            ) from None
+        return await future
+
+    async def _collect(self) -> List[_PendingRequest]:
+        """Wait for one request, then gather more until the window closes"""
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_delay_s
+
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self) -> None:
+        """Consumer loop: collect a window of requests and dispatch it"""
+        while True:
+            batch = await self._collect()
+            try:
+                await self._process(batch)
+            except Exception as e:
+                # One bad batch must not take the consumer down with it
+                logger.exception("Inference scheduler failed to process a batch")
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(
+                            InferenceError(f"Inference scheduling failed: {e}")
+                        )
+
+    async def _process(self, batch: List[_PendingRequest]) -> None:
+        """Group a window of requests and dispatch each group"""
+        groups: Dict[Tuple[str, float, bool], List[_PendingRequest]] = {}
+        for request in batch:
+            # Callers that went away (client disconnect) cancel their future
+            if request.future.done():
+                continue
+            key = (request.model_name, request.threshold, request.detect_holes)
+            groups.setdefault(key, []).append(request)
+
+        for (model_name, threshold, detect_holes), requests in groups.items():
+            await self._dispatch(model_name, threshold, detect_holes, requests)
+
+    async def _dispatch(self, model_name: str, threshold: float, detect_holes: bool,
+                        requests: List[_PendingRequest]) -> None:
+        """Run one group on the thread pool and resolve its futures"""
+        try:
+            if len(requests) == 1:
+                results = [await asyncio.to_thread(
+                    self.loader.predict, requests[0].image, model_name,
+                    threshold, detect_holes
+                )]
+            else:
+                logger.debug("Coalesced %d %s requests into one batch", len(requests), model_name)
+                results = await asyncio.to_thread(
+                    self.loader.predict_batch, [r.image for r in requests], model_name,
+                    threshold=threshold, detect_holes=detect_holes
+                )
+        except Exception as e:
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+
+        for request, result in zip(requests, results):
+            if request.future.done():
+                continue
+            if result is None:
+                request.future.set_exception(InferenceError("No result from batch processing"))
+            else:
+                request.future.set_result(result)
@@ -302,6 +302,27 @@ class ModelLoader:
         logger.info(f"ModelLoader initialized with device: {self.device}")
         logger.info(f"Batch processing enabled with config: {batch_config_path.exists()}")
     
+    @property
+    def loaded_count(self) -> int:
+        """Number of models currently loaded.
+
+        loaded_models only ever holds real modules (eviction deletes the key),
+        so this is an O(1) len() rather than a scan.
+        """
+        return len(self.loaded_models)
+
+    def snapshot_status(self) -> Tuple[bool, Optional[str], int]:
+        """Return ``(is_processing, current_model, queue_length)`` in one call.
+
+        Lock-free on purpose: _model_lock is held across model loads, and
+        /status must not block behind one. Every predict path sets
+        current_model together with is_processing (a name while running,
+        None when idle), so both are derived from one attribute read and
+        can never be seen half-updated.
+        """
+        current_model = self.current_model
+        return current_model is not None, current_model, self.queue_length
+
     def load_model(self, model_name: str, use_finetuned: bool = True) -> torch.nn.Module:
         """Load a specific model with pretrained weights"""
         
@@ -503,7 +524,10 @@ class ModelLoader:
                 )
 
             model.to(self.device)
+            # Once, here: the executor only re-checks the root training flag.
+            # Frozen parameters also keep autograd out of any forward pass.
             model.eval()
+            model.requires_grad_(False)
             
             self.loaded_models[model_name] = model
             
@@ -594,6 +618,51 @@ class ModelLoader:
                 free_bytes, total_bytes = torch.cuda.mem_get_info()
                 used_gb = (total_bytes - free_bytes) / (1024 ** 3)
     
+    def _preprocess_on_device(self, images: List[Image.Image],
+                              target_size: Tuple[int, int]) -> torch.Tensor:
+        """Resize and normalize RGB images on self.device.
+
+        Ships the raw uint8 pixels (a quarter of the float32 bytes) and runs
+        resize + normalize as a few batched kernels per distinct source size.
+        Antialiased bilinear matches the PIL Resize of the CPU pipeline to
+        within one uint8 step. The result is already on the device, so the
+        executor runs it without staging a copy.
+        """
+        if not hasattr(self, '_norm_constants'):
+            self._norm_constants = (
+                torch.tensor([0.485, 0.456, 0.406], device=self.device).view(1, 3, 1, 1),
+                torch.tensor([0.229, 0.224, 0.225], device=self.device).view(1, 3, 1, 1),
+            )
+        mean, std = self._norm_constants
+
+        # Bucket by source size so each group uploads and resizes as one batch
+        buckets: Dict[Tuple[int, int], List[int]] = {}
+        for i, image in enumerate(images):
+            buckets.setdefault(image.size, []).append(i)
+
+        pinned = self.device.type == 'cuda'
+        # A single bucket is returned as resized; only mixed sizes are
+        # gathered into one batch tensor
+        batch = None
+        if len(buckets) > 1:
+            batch = torch.empty((len(images), 3, *target_size), device=self.device)
+        for (width, height), indices in buckets.items():
+            host = torch.empty((len(indices), height, width, 3), dtype=torch.uint8,
+                               pin_memory=pinned)
+            host_np = host.numpy()
+            for j, i in enumerate(indices):
+                host_np[j] = np.asarray(images[i])
+
+            x = host.to(self.device, non_blocking=True).permute(0, 3, 1, 2).float().div_(255.0)
+            x = F.interpolate(x, size=target_size, mode='bilinear',
+                              align_corners=False, antialias=True)
+            x.sub_(mean).div_(std)
+            if batch is None:
+                return x
+            batch.index_copy_(0, torch.tensor(indices, device=self.device), x)
+
+        return batch
+
     def preprocess_image(self, image: Image.Image, target_size: Tuple[int, int] = (1024, 1024)) -> torch.Tensor:
         """Preprocess single image for model inference - OPTIMIZED VERSION"""
         
@@ -602,6 +671,9 @@ class ModelLoader:
             logger.info(f"Converting image from {image.mode} to RGB")
             image = image.convert('RGB')
         
+        if self.device.type == 'cuda':
+            return self._preprocess_on_device([image], target_size)
+        
         # Initialize transform pipeline if not already done
         if not hasattr(self, '_transform'):
             self._transform = transforms.Compose([
@@ -630,6 +702,9 @@ class ModelLoader:
             else:
                 rgb_images.append(img)
         
+        if self.device.type == 'cuda':
+            return self._preprocess_on_device(rgb_images, target_size)
+        
         # Initialize transform pipeline if not already done
         if not hasattr(self, '_transform'):
             self._transform = transforms.Compose([
@@ -641,14 +716,13 @@ class ModelLoader:
                 )
             ])
         
-        # Process all images with optimized pipeline
-        batch_tensors = []
-        for image in rgb_images:  # Use the RGB-converted images
-            tensor = self._transform(image)
-            batch_tensors.append(tensor)
-        
-        # Stack into batch tensor
-        batch_tensor = torch.stack(batch_tensors, dim=0)
+        # Transform straight into one preallocated batch tensor: no per-image
+        # list and no torch.stack copy
+        first = self._transform(rgb_images[0])
+        batch_tensor = torch.empty((len(rgb_images), *first.shape), dtype=first.dtype)
+        batch_tensor[0] = first
+        for i, image in enumerate(rgb_images[1:], start=1):
+            batch_tensor[i] = self._transform(image)
         
         return batch_tensor.to(self.device)
     
@@ -1500,7 +1574,8 @@ class ModelLoader:
             timeout: Optional timeout override per batch
         
         Returns:
-            List of dictionaries containing segmentation results
+            List of dictionaries containing segmentation results, aligned with
+            images; an entry is None if that image's postprocessing failed
             
         Raises:
             InferenceTimeoutError: If inference exceeds timeout
@@ -1562,6 +1637,10 @@ class ModelLoader:
                 start_time = time.time()
                 memory_before = torch.cuda.memory_allocated() if self.device.type == 'cuda' else 0
                 
+                # Images split off this window under memory pressure (CUDA only)
+                _dropped_images = []
+                _dropped_sizes = []
+                
                 # Log resource usage before inference
                 if self.device.type == 'cuda':
                     logger.info(f"GPU memory before batch inference: {memory_before / 1024**2:.1f} MB")
@@ -1582,12 +1661,6 @@ class ModelLoader:
                             batch_images = batch_images[:current_batch_size]
                             batch_original_sizes = batch_original_sizes[:current_batch_size]
                             batch_tensor = self.preprocess_image_batch(batch_images)
-                        else:
-                            _dropped_images = []
-                            _dropped_sizes = []
-                    else:
-                        _dropped_images = []
-                        _dropped_sizes = []
                 
                 # Perform batch inference with GPU OOM handling
                 try:
@@ -1669,99 +1742,110 @@ class ModelLoader:
                 # Postprocess batch
                 batch_masks = self.postprocess_mask_batch(batch_output, batch_original_sizes, threshold)
                 
-                # Process each mask in the batch to extract polygons
+                # Confidence is the peak sigmoid of each image's logits. sigmoid is
+                # monotonic, so take the max first and sync to the host once per
+                # batch rather than once per polygon.
+                if batch_output.dim() > 3:
+                    confidences = torch.sigmoid(
+                        batch_output.flatten(1).amax(dim=1)
+                    ).tolist()
+                else:
+                    confidences = [float(torch.sigmoid(batch_output.max()).item())] * current_batch_size
+                
+                # Process each mask in the batch to extract polygons. A failure
+                # here only affects that image: it gets a None result and the
+                # rest of the batch is kept.
                 for i, (mask, original_size, image) in enumerate(zip(batch_masks, batch_original_sizes, batch_images)):
-                    
-                    # If detect_holes is False, fill all holes
-                    if not detect_holes:
-                        filled_mask = mask.copy()
-                        temp_contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                        for contour in temp_contours:
-                            cv2.fillPoly(filled_mask, [contour], 255)
-                        mask = filled_mask
-                    
-                    # Find contours
-                    if detect_holes:
-                        contours, hierarchy = cv2.findContours(mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-                    else:
-                        contours, hierarchy = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                    
-                    # Convert contours to polygons
-                    polygons = []
-                    filtered_count = 0
-                    polygon_id_counter = 1
-                    
-                    if hierarchy is not None:
-                        hierarchy = hierarchy[0]
-                    
-                    for j, contour in enumerate(contours):
-                        if cv2.contourArea(contour) < 50:
-                            filtered_count += 1
-                            continue
-                        
-                        original_points = len(contour)
-                        polygon_points = []
-                        
-                        for point in contour:
-                            x, y = point[0]
-                            polygon_points.append({"x": float(x), "y": float(y)})
-                        
-                        if len(polygon_points) >= 3:
-                            polygon_type = "external"
-                            parent_id = None
-                            
-                            if detect_holes and hierarchy is not None:
-                                parent_idx = hierarchy[j][3]
-                                if parent_idx != -1:
-                                    polygon_type = "internal"
-                                    # Find parent polygon ID
-                                    for k, existing_polygon in enumerate(polygons):
-                                        if existing_polygon.get("contour_index") == parent_idx:
-                                            parent_id = existing_polygon["id"]
-                                            break
-                            
-                            # Get confidence from the specific mask output
-                            mask_output = batch_output[i] if batch_output.dim() > 3 else batch_output
-                            confidence = float(torch.sigmoid(mask_output).max().item())
-                            
-                            polygon_data = {
-                                "id": f"polygon_{polygon_id_counter}",
-                                "points": polygon_points,
-                                "type": polygon_type,
-                                "class": "spheroid",
-                                "confidence": confidence,
-                                "vertices_count": original_points,
-                                "contour_index": j
+                    try:
+                        # If detect_holes is False, fill all holes
+                        if not detect_holes:
+                            filled_mask = mask.copy()
+                            temp_contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+                            for contour in temp_contours:
+                                cv2.fillPoly(filled_mask, [contour], 255)
+                            mask = filled_mask
+
+                        # Find contours
+                        if detect_holes:
+                            contours, hierarchy = cv2.findContours(mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+                        else:
+                            contours, hierarchy = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+                        # Convert contours to polygons
+                        polygons = []
+                        filtered_count = 0
+                        polygon_id_counter = 1
+
+                        if hierarchy is not None:
+                            hierarchy = hierarchy[0]
+
+                        for j, contour in enumerate(contours):
+                            if cv2.contourArea(contour) < 50:
+                                filtered_count += 1
+                                continue
+
+                            original_points = len(contour)
+                            polygon_points = []
+
+                            for point in contour:
+                                x, y = point[0]
+                                polygon_points.append({"x": float(x), "y": float(y)})
+
+                            if len(polygon_points) >= 3:
+                                polygon_type = "external"
+                                parent_id = None
+
+                                if detect_holes and hierarchy is not None:
+                                    parent_idx = hierarchy[j][3]
+                                    if parent_idx != -1:
+                                        polygon_type = "internal"
+                                        # Find parent polygon ID
+                                        for k, existing_polygon in enumerate(polygons):
+                                            if existing_polygon.get("contour_index") == parent_idx:
+                                                parent_id = existing_polygon["id"]
+                                                break
+
+                                polygon_data = {
+                                    "id": f"polygon_{polygon_id_counter}",
+                                    "points": polygon_points,
+                                    "type": polygon_type,
+                                    "class": "spheroid",
+                                    "confidence": confidences[i],
+                                    "vertices_count": original_points,
+                                    "contour_index": j
+                                }
+
+                                if parent_id:
+                                    polygon_data["parent_id"] = parent_id
+
+                                polygons.append(polygon_data)
+                                polygon_id_counter += 1
+
+                        # Remove temporary contour_index field
+                        for polygon in polygons:
+                            polygon.pop("contour_index", None)
+
+                        # Create result for this image
+                        result = {
+                            "model_used": model_name,
+                            "threshold_used": threshold,
+                            "image_size": {"width": original_size[0], "height": original_size[1]},
+                            "polygons": polygons,
+                            "processing_info": {
+                                "device": str(self.device),
+                                "num_polygons": len(polygons),
+                                "confidence_scores": [p["confidence"] for p in polygons],
+                                "batch_size": current_batch_size,
+                                "batch_position": i + 1
                             }
-                            
-                            if parent_id:
-                                polygon_data["parent_id"] = parent_id
-                            
-                            polygons.append(polygon_data)
-                            polygon_id_counter += 1
-                    
-                    # Remove temporary contour_index field
-                    for polygon in polygons:
-                        polygon.pop("contour_index", None)
-                    
-                    # Create result for this image
-                    result = {
-                        "model_used": model_name,
-                        "threshold_used": threshold,
-                        "image_size": {"width": original_size[0], "height": original_size[1]},
-                        "polygons": polygons,
-                        "processing_info": {
-                            "device": str(self.device),
-                            "num_polygons": len(polygons),
-                            "confidence_scores": [p["confidence"] for p in polygons],
-                            "batch_size": current_batch_size,
-                            "batch_position": i + 1
                         }
-                    }
-                    
-                    all_results.append(result)
 
-                    logger.info(f"  Image {batch_start + i + 1}: {len(polygons)} polygons extracted")
+                        logger.debug("  Image %d: %d polygons extracted", batch_start + i + 1, len(polygons))
+                    except Exception as e:
+                        logger.error(f"  Image {batch_start + i + 1}: postprocessing failed: {e}", exc_info=True)
+                        result = None
+
+                    all_results.append(result)
 
                 # Process any images that were dropped when the batch was halved
                 # under memory pressure.  Run each one individually (batch-size 1)
@@ -109,7 +109,7 @@ class DisintegrationModel:
             # width — reflect requires pad < dim and would raise on tiny images.
             x = torch.nn.functional.pad(x, (0, pad_w, 0, pad_h), mode="replicate")
         x = x.to(self._device)
-        with torch.no_grad():
+        with torch.inference_mode():
             logits = self._model(x)
         mask = logits.argmax(dim=1)[0].to("cpu").numpy().astype(np.uint8)
         return mask[:h, :w]
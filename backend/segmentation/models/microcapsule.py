@@ -133,7 +133,7 @@ class MicrocapsuleModel:
         lb, x0, y0, nw, nh = _letterbox(rgb, SIZE, cv2.INTER_AREA)
         x = (lb.astype(np.float32) / 255.0 - _IMEAN) / _ISTD
         x = torch.from_numpy(x).permute(2, 0, 1)[None].to(self._device)
-        with torch.no_grad():
+        with torch.inference_mode():
             out = self._model(x)[0].cpu().numpy()
 
         fg = 1.0 / (1.0 + np.exp(-out[0]))      # foreground probability (896x896)
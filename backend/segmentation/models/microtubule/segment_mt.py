@@ -135,7 +135,7 @@ def predict_seed_embed(model, image_norm: np.ndarray, device: str = "cuda"):
         .repeat(1, 3, 1, 1)
         .to(device)
     )
-    with torch.no_grad():
+    with torch.inference_mode():
         out = model(x)
     seed_prob = torch.sigmoid(out["seed_logit"])[0, 0].cpu().numpy()[:H, :W]
     embed = out["embedding"][0].cpu().numpy()[:, :H, :W]
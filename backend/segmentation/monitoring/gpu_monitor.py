@@ -7,7 +7,9 @@ import torch
 import time
 import threading
 import logging
-from typing import Dict, List, Optional, Tuple
+from collections import deque
+from itertools import islice
+from typing import Deque, Dict, List, Optional, Tuple
 from dataclasses import dataclass, asdict
 from datetime import datetime
 import json
@@ -15,6 +17,10 @@ import os
 
 logger = logging.getLogger(__name__)
 
+# Batch records kept for /gpu/batch-metrics; older entries are dropped so a
+# long-running worker does not grow without bound.
+_BATCH_HISTORY_SIZE = 10_000
+
 @dataclass
 class GPUMetrics:
     """GPU metrics snapshot"""
@@ -33,7 +39,7 @@ class GPUMetrics:
     def to_dict(self) -> Dict:
         return asdict(self)
 
-@dataclass
+@dataclass(slots=True)
 class BatchProcessingMetrics:
     """Metrics for batch processing performance"""
     model_name: str
@@ -65,12 +71,27 @@ class GPUMonitor:
         self.sampling_interval = sampling_interval
         self.history_size = history_size
         
-        # Metrics storage
-        self.metrics_history: List[GPUMetrics] = []
-        self.batch_metrics: List[BatchProcessingMetrics] = []
+        # Metrics storage (ring buffers)
+        self.metrics_history: Deque[GPUMetrics] = deque(maxlen=history_size)
+        self.batch_metrics: Deque[BatchProcessingMetrics] = deque(
+            maxlen=_BATCH_HISTORY_SIZE
+        )
+
+        # Running (successful, throughput sum, inference-time sum) over all
+        # recorded batches, plus the running value *before* each entry of
+        # batch_metrics, so stats over the last N batches are a subtraction
+        # instead of a scan. Guarded by _batch_lock with batch_metrics.
+        self._batch_lock = threading.Lock()
+        self._batch_totals: Tuple[int, float, float] = (0, 0.0, 0.0)
+        self._batch_prefix: Deque[Tuple[int, float, float]] = deque(
+            maxlen=_BATCH_HISTORY_SIZE
+        )
         
-        # Monitoring thread
+        # Monitoring thread. It also publishes its most recent dynamic reading
+        # here so request handlers never block on NVML; the dict is replaced
+        # wholesale per sample, never mutated, so readers see a whole sample.
         self.monitoring_thread: Optional[threading.Thread] = None
+        self.latest_dynamic: Optional[Dict] = None
         # Event used by `_monitoring_loop` to know when to exit. Renamed
         # from `self.stop_monitoring` to avoid shadowing the
         # `stop_monitoring()` method below — the previous name made
@@ -90,8 +111,18 @@ class GPUMonitor:
         else:
             logger.warning("No GPU available, running in CPU mode")
     
-    def get_current_metrics(self) -> Optional[GPUMetrics]:
-        """Get current GPU metrics"""
+    def get_static_info(self) -> Optional[Dict]:
+        """Device fields that never change for the lifetime of the process"""
+        if not self.is_cuda:
+            return None
+        return {
+            "id": 0,
+            "name": self.device_properties.name,
+            "total_mb": round(self.total_memory_mb, 2)
+        }
+    
+    def get_dynamic_metrics(self) -> Optional[Dict]:
+        """Get the fast-changing GPU readings (memory, utilization, sensors)"""
         if not self.is_cuda:
             return None
         
@@ -137,29 +168,53 @@ class GPUMonitor:
             except Exception as e:
                 logger.debug(f"Could not get GPU utilization: {e}")
             
-            metrics = GPUMetrics(
-                timestamp=datetime.utcnow().isoformat(),
-                device_id=0,
-                device_name=self.device_properties.name,
-                memory_allocated_mb=round(allocated, 2),
-                memory_reserved_mb=round(reserved, 2),
-                memory_free_mb=round(free, 2),
-                memory_total_mb=round(total, 2),
-                memory_usage_percent=round(usage_percent, 2),
-                utilization_percent=utilization,
-                temperature_celsius=temperature,
-                power_draw_watts=power_draw
-            )
-            
             # Update peak memory
             self.peak_memory_mb = max(self.peak_memory_mb, allocated)
             
-            return metrics
+            return {
+                "allocated_mb": round(allocated, 2),
+                "reserved_mb": round(reserved, 2),
+                "free_mb": round(free, 2),
+                "usage_percent": round(usage_percent, 2),
+                "gpu_percent": utilization,
+                "temperature_celsius": temperature,
+                "power_watts": power_draw,
+                "timestamp": datetime.utcnow().isoformat()
+            }
             
         except Exception as e:
             logger.error(f"Error getting GPU metrics: {e}")
             return None
     
+    def get_latest_dynamic_metrics(self) -> Optional[Dict]:
+        """Latest background sample, or a fresh reading if the sampler is idle"""
+        latest = self.latest_dynamic
+        if latest is not None and self.monitoring_thread and self.monitoring_thread.is_alive():
+            return latest
+        return self.get_dynamic_metrics()
+    
+    def get_current_metrics(self) -> Optional[GPUMetrics]:
+        """Get current GPU metrics"""
+        dynamic = self.get_dynamic_metrics()
+        if dynamic is None:
+            return None
+        return self._to_gpu_metrics(dynamic)
+    
+    def _to_gpu_metrics(self, dynamic: Dict) -> GPUMetrics:
+        return GPUMetrics(
+            timestamp=dynamic["timestamp"],
+            device_id=0,
+            device_name=self.device_properties.name,
+            memory_allocated_mb=dynamic["allocated_mb"],
+            memory_reserved_mb=dynamic["reserved_mb"],
+            memory_free_mb=dynamic["free_mb"],
+            memory_total_mb=round(self.total_memory_mb, 2),
+            memory_usage_percent=dynamic["usage_percent"],
+            utilization_percent=dynamic["gpu_percent"],
+            temperature_celsius=dynamic["temperature_celsius"],
+            power_draw_watts=dynamic["power_watts"]
+        )
+    
     def start_monitoring(self):
         """Start background monitoring thread"""
         if self.monitoring_thread and self.monitoring_thread.is_alive():
@@ -182,14 +237,12 @@ class GPUMonitor:
     def _monitoring_loop(self):
         """Background monitoring loop"""
         while not self._stop_event.is_set():
-            metrics = self.get_current_metrics()
-            if metrics:
-                self.metrics_history.append(metrics)
-                # Keep history size limited
-                if len(self.metrics_history) > self.history_size:
-                    self.metrics_history.pop(0)
+            dynamic = self.get_dynamic_metrics()
+            if dynamic:
+                self.latest_dynamic = dynamic
+                self.metrics_history.append(self._to_gpu_metrics(dynamic))
             
-            time.sleep(self.sampling_interval)
+            self._stop_event.wait(self.sampling_interval)
     
     def record_batch_processing(
         self, 
@@ -237,7 +290,16 @@ class GPUMonitor:
             error_message=error_message
         )
         
-        self.batch_metrics.append(metrics)
+        with self._batch_lock:
+            self._batch_prefix.append(self._batch_totals)
+            self.batch_metrics.append(metrics)
+            if success:
+                succ, thr, inf = self._batch_totals
+                self._batch_totals = (
+                    succ + 1,
+                    thr + metrics.throughput_imgs_sec,
+                    inf + metrics.inference_time_ms
+                )
         
         # Update totals
         if success:
@@ -250,6 +312,46 @@ class GPUMonitor:
         
         return metrics
     
+    def recent_batch_metrics(self, limit: int) -> List[BatchProcessingMetrics]:
+        """Return the most recent batch records, oldest first (<= 0 means all)"""
+        with self._batch_lock:
+            count = len(self.batch_metrics)
+            start = 0 if limit <= 0 else max(0, count - limit)
+            return list(islice(self.batch_metrics, start, count))
+    
+    def get_batch_stats(self, limit: int) -> Dict:
+        """
+        Aggregate statistics over the most recent batches in O(1)
+        
+        Args:
+            limit: Number of most recent batches to aggregate (<= 0 means all)
+        """
+        with self._batch_lock:
+            count = len(self.batch_metrics)
+            window = count if limit <= 0 else min(limit, count)
+            if not window:
+                return {
+                    "total_batches": 0,
+                    "successful": 0,
+                    "failed": 0,
+                    "success_rate": 100.0,
+                    "avg_throughput_imgs_sec": 0,
+                    "avg_inference_time_ms": 0
+                }
+            succ, thr, inf = self._batch_totals
+            succ0, thr0, inf0 = self._batch_prefix[count - window]
+        
+        succ -= succ0
+        inv_succ = 1.0 / succ if succ else 0.0
+        return {
+            "total_batches": window,
+            "successful": succ,
+            "failed": window - succ,
+            "success_rate": succ * (100.0 / window),
+            "avg_throughput_imgs_sec": round((thr - thr0) * inv_succ, 2),
+            "avg_inference_time_ms": round((inf - inf0) * inv_succ, 2)
+        }
+    
     def get_summary_stats(self) -> Dict:
         """Get summary statistics"""
         if not self.metrics_history:
@@ -258,29 +360,29 @@ class GPUMonitor:
                 "gpu_available": self.is_cuda
             }
         
-        # Calculate averages from history
-        avg_memory = sum(m.memory_allocated_mb for m in self.metrics_history) / len(self.metrics_history)
-        avg_utilization = sum(m.utilization_percent for m in self.metrics_history) / len(self.metrics_history)
+        # Calculate averages from history (bounded by history_size)
+        history = list(self.metrics_history)
+        inv_samples = 1.0 / len(history)
+        avg_memory = sum(m.memory_allocated_mb for m in history) * inv_samples
+        avg_utilization = sum(m.utilization_percent for m in history) * inv_samples
         
-        # Calculate batch processing stats
-        successful_batches = [m for m in self.batch_metrics if m.success]
-        avg_throughput = (sum(m.throughput_imgs_sec for m in successful_batches) / 
-                         len(successful_batches)) if successful_batches else 0
+        # Batch processing stats come from the running totals
+        batch_stats = self.get_batch_stats(0)
         
         return {
             "status": "monitoring",
             "gpu_available": self.is_cuda,
             "device_name": self.device_properties.name if self.is_cuda else "CPU",
             "total_memory_mb": self.total_memory_mb if self.is_cuda else 0,
-            "current_memory_mb": self.metrics_history[-1].memory_allocated_mb if self.metrics_history else 0,
+            "current_memory_mb": history[-1].memory_allocated_mb,
             "peak_memory_mb": round(self.peak_memory_mb, 2),
             "avg_memory_mb": round(avg_memory, 2),
             "avg_utilization_percent": round(avg_utilization, 2),
             "total_images_processed": self.total_images_processed,
             "total_inference_time_ms": round(self.total_inference_time_ms, 2),
-            "avg_throughput_imgs_sec": round(avg_throughput, 2),
-            "batch_success_rate": len(successful_batches) / len(self.batch_metrics) * 100 if self.batch_metrics else 100,
-            "monitoring_duration_seconds": len(self.metrics_history) * self.sampling_interval
+            "avg_throughput_imgs_sec": batch_stats["avg_throughput_imgs_sec"],
+            "batch_success_rate": batch_stats["success_rate"] if batch_stats["total_batches"] else 100,
+            "monitoring_duration_seconds": len(history) * self.sampling_interval
         }
     
     def export_metrics(self, filepath: Optional[str] = None) -> str:
@@ -299,8 +401,10 @@ class GPUMonitor:
         
         data = {
             "summary": self.get_summary_stats(),
-            "metrics_history": [m.to_dict() for m in self.metrics_history[-50:]],  # Last 50 samples
-            "batch_metrics": [asdict(m) for m in self.batch_metrics[-50:]]  # Last 50 batches
+            "metrics_history": [
+                m.to_dict() for m in list(self.metrics_history)[-50:]
+            ],  # Last 50 samples
+            "batch_metrics": [asdict(m) for m in self.recent_batch_metrics(50)]  # Last 50 batches
         }
         
         with open(filepath, 'w') as f:
@@ -328,7 +432,7 @@ class GPUMonitor:
             return True
         
         # Also check if recent batches have failed
-        recent_failures = sum(1 for m in self.batch_metrics[-5:] if not m.success)
+        recent_failures = sum(1 for m in self.recent_batch_metrics(5) if not m.success)
         if recent_failures >= 2:
             logger.warning(f"Multiple recent batch failures: {recent_failures}/5")
             return True
@@ -8,6 +8,8 @@ Tests the thread-safe ML model inference execution system with:
 - Comprehensive error handling and recovery
 """
 
+import sys
+
 import pytest
 import torch
 import time
@@ -28,6 +30,7 @@ from ml.inference_executor import (
     InferenceMetrics,
     get_global_executor
 )
+import ml.inference_executor as _executor_module
 
 
 class TestInferenceExecutor:
@@ -92,6 +95,237 @@ class TestInferenceExecutor:
         assert isinstance(result, torch.Tensor)
         mock_model.assert_called_once_with(sample_input)
 
+    @pytest.mark.skipif(
+        sys.modules.get("torch") is not _executor_module.torch,
+        reason="sys.modules['torch'] replaced by another test module",
+    )
+    def test_eval_only_runs_for_models_left_in_training_mode(self, executor, sample_input):
+        real_torch = _executor_module.torch
+        model = real_torch.nn.Sequential(real_torch.nn.Identity())
+        model.eval = Mock(wraps=model.eval)
+
+        executor.execute_inference(model=model, input_tensor=sample_input,
+                                   model_name="fresh", timeout=5.0)
+        executor.execute_inference(model=model, input_tensor=sample_input,
+                                   model_name="fresh", timeout=5.0)
+
+        model.eval.assert_called_once()
+        assert not model.training
+
+    @pytest.mark.skipif(
+        sys.modules.get("torch") is not _executor_module.torch,
+        reason="sys.modules['torch'] replaced by another test module",
+    )
+    def test_compiled_forward_is_cached_per_model_object(self, sample_input):
+        real_torch = _executor_module.torch
+        executor = InferenceExecutor(max_workers=1, enable_monitoring=False,
+                                     enable_cuda_streams=False, compile_mode="default")
+        compiled_calls = []
+
+        def fake_compile(model, **kwargs):
+            compiled_calls.append((model, kwargs))
+            return model
+
+        first = real_torch.nn.Identity()
+        reloaded = real_torch.nn.Identity()
+        try:
+            with patch.object(_executor_module.torch, "compile", side_effect=fake_compile):
+                for model in (first, first, reloaded):
+                    executor.execute_inference(model=model, input_tensor=sample_input,
+                                               model_name="m", timeout=5.0)
+        finally:
+            executor.shutdown(wait=False)
+
+        assert [m for m, _ in compiled_calls] == [first, reloaded]
+        assert compiled_calls[0][1] == {"mode": "default", "dynamic": False, "fullgraph": False}
+
+    @pytest.mark.skipif(
+        sys.modules.get("torch") is not _executor_module.torch,
+        reason="sys.modules['torch'] replaced by another test module",
+    )
+    def test_failing_compiled_forward_falls_back_to_eager(self, sample_input):
+        real_torch = _executor_module.torch
+        executor = InferenceExecutor(max_workers=1, enable_monitoring=False,
+                                     enable_cuda_streams=False, compile_mode="reduce-overhead")
+        broken = Mock(side_effect=RuntimeError("backend compiler failed"))
+        model = real_torch.nn.Identity()
+        try:
+            assert executor.compile_mode == "default"  # no CUDA graphs
+            with patch.object(_executor_module.torch, "compile", return_value=broken):
+                for _ in range(2):
+                    output = executor.execute_inference(model=model, input_tensor=sample_input,
+                                                        model_name="m", timeout=5.0)
+        finally:
+            executor.shutdown(wait=False)
+
+        assert real_torch.equal(output, sample_input)
+        broken.assert_called_once()
+
+    def test_model_lock_lookup_skips_global_lock_once_created(self, executor):
+        lock = executor.get_model_lock("hrnet")
+
+        executor._global_lock = MagicMock()
+        executor._global_lock.__enter__.side_effect = AssertionError("global lock taken")
+        assert executor.get_model_lock("hrnet") is lock
+
+    def test_session_bookkeeping_skips_global_lock(self, executor, mock_model, sample_input):
+        executor.get_model_lock("test_model")
+        executor._global_lock = MagicMock()
+        executor._global_lock.__enter__.side_effect = AssertionError("global lock taken")
+
+        seen = []
+        real_context = executor.inference_context
+
+        def recording_context(session_id, model_name):
+            seen.append(session_id)
+            return real_context(session_id, model_name)
+
+        with patch.object(executor, "inference_context", side_effect=recording_context):
+            for _ in range(2):
+                executor.execute_inference(model=mock_model, input_tensor=sample_input,
+                                           model_name="test_model", timeout=5.0)
+
+        assert len(set(seen)) == 2
+        assert executor._sessions == {}
+
+    def test_failures_do_not_empty_the_cuda_cache(self, sample_input):
+        """A failed forward must not force a device-wide empty_cache()."""
+        executor = InferenceExecutor(max_workers=1, enable_monitoring=False,
+                                     enable_cuda_streams=False)
+        model = Mock(side_effect=ValueError("bad input"))
+        cuda = _executor_module.torch.cuda
+        try:
+            with patch.object(cuda, "is_available", return_value=True), \
+                    patch.object(cuda, "empty_cache") as empty_cache:
+                with pytest.raises(InferenceError):
+                    executor.execute_inference(
+                        model=model, input_tensor=sample_input,
+                        model_name="test_model", timeout=5.0,
+                    )
+            empty_cache.assert_not_called()
+        finally:
+            executor.shutdown(wait=False)
+
+    def test_resource_check_samples_cpu_without_blocking(self, executor):
+        """cpu_percent is read non-blocking, at most once per sample interval."""
+        with patch.object(_executor_module.psutil, "cpu_percent", return_value=10.0) as cpu:
+            executor._check_resources()
+            executor._check_resources()
+
+        cpu.assert_called_once_with(interval=None)
+
+    @pytest.mark.skipif(
+        sys.modules.get("torch") is not _executor_module.torch,
+        reason="sys.modules['torch'] replaced by another test module",
+    )
+    def test_forward_runs_in_inference_mode(self, executor, sample_input):
+        """Grad mode is thread-local; the worker thread must disable it itself."""
+        real_torch = _executor_module.torch
+        seen = {}
+
+        def forward(tensor):
+            seen["inference_mode"] = real_torch.is_inference_mode_enabled()
+            seen["grad"] = real_torch.is_grad_enabled()
+            return real_torch.zeros(1, 1, 4, 4)
+
+        model = Mock(side_effect=forward)
+        output = executor.execute_inference(
+            model=model,
+            input_tensor=sample_input,
+            model_name="test_model",
+            timeout=5.0,
+        )
+
+        assert seen == {"inference_mode": True, "grad": False}
+        assert output.is_inference()
+
+    @pytest.mark.skipif(
+        sys.modules.get("torch") is not _executor_module.torch,
+        reason="sys.modules['torch'] replaced by another test module",
+    )
+    def test_streamed_forward_waits_on_an_event_outside_the_model_lock(
+            self, executor, mock_model, sample_input):
+        """The worker syncs on an event, not the stream; the caller's stream waits on it."""
+        cuda = _executor_module.torch.cuda
+        stream = MagicMock()
+        consumer = MagicMock()
+        with patch.object(executor, "get_next_cuda_stream", return_value=stream), \
+                patch.object(cuda, "stream", MagicMock()), \
+                patch.object(cuda, "current_stream", return_value=consumer), \
+                patch.object(cuda, "Event") as event_cls:
+            executor.execute_inference(model=mock_model, input_tensor=sample_input,
+                                       model_name="test_model", timeout=5.0)
+
+        done = event_cls.return_value
+        stream.synchronize.assert_not_called()
+        done.record.assert_called_once_with(stream)
+        done.synchronize.assert_called_once_with()
+        consumer.wait_event.assert_called_once_with(done)
+        assert executor._forward_done["test_model"] is done
+
+    def test_slow_streamed_forward_still_times_out(self, executor, mock_model, sample_input):
+        """The GPU wait happens inside the future, so the timeout covers it."""
+        cuda = _executor_module.torch.cuda
+        with patch.object(executor, "get_next_cuda_stream", return_value=MagicMock()), \
+                patch.object(cuda, "stream", MagicMock()), \
+                patch.object(cuda, "current_stream", return_value=MagicMock()), \
+                patch.object(cuda, "Event") as event_cls:
+            event_cls.return_value.synchronize.side_effect = lambda: time.sleep(0.5)
+            with pytest.raises(InferenceTimeoutError):
+                executor.execute_inference(model=mock_model, input_tensor=sample_input,
+                                           model_name="test_model", timeout=0.1)
+
+    @pytest.mark.skipif(
+        sys.modules.get("torch") is not _executor_module.torch,
+        reason="sys.modules['torch'] replaced by another test module",
+    )
+    def test_cuda_graph_captured_once_per_model_and_shape(self, executor):
+        real_torch = _executor_module.torch
+        cuda = real_torch.cuda
+        stream = MagicMock()
+        model = real_torch.nn.Identity()
+        with patch.object(cuda, "CUDAGraph") as graph_cls, \
+                patch.object(cuda, "graph", MagicMock()):
+            first = executor._replay_graph("m", model, real_torch.ones(1, 3, 4, 4), stream)
+            executor._replay_graph("m", model, real_torch.ones(1, 3, 4, 4), stream)
+            assert graph_cls.call_count == 1
+            executor._replay_graph("m", model, real_torch.ones(2, 3, 4, 4), stream)
+            assert graph_cls.call_count == 2
+
+            reloaded = real_torch.nn.Identity()
+            executor._replay_graph("m", reloaded, real_torch.ones(1, 3, 4, 4), stream)
+            assert graph_cls.call_count == 3
+
+        assert real_torch.equal(first, real_torch.ones(1, 3, 4, 4))
+        assert graph_cls.return_value.replay.call_count == 4
+        assert [k[1] for k in executor._graphs] == [(1, 3, 4, 4)]
+
+    @pytest.mark.skipif(
+        sys.modules.get("torch") is not _executor_module.torch,
+        reason="sys.modules['torch'] replaced by another test module",
+    )
+    def test_uncapturable_forward_runs_eagerly(self, executor):
+        real_torch = _executor_module.torch
+        cuda = real_torch.cuda
+        inputs = real_torch.ones(1, 3, 4, 4)
+        with patch.object(cuda, "CUDAGraph"), \
+                patch.object(cuda, "graph", side_effect=RuntimeError("capture failed")) as graph:
+            for _ in range(2):
+                assert executor._replay_graph("m", real_torch.nn.Identity(), inputs,
+                                              MagicMock()) is None
+            assert executor._replay_graph("m", Mock(), inputs, MagicMock()) is None
+        # Each new model object gets one attempt; a non-Module gets none
+        assert graph.call_count == 2
+
+    def test_cuda_graphs_are_off_with_torch_compile(self):
+        executor = InferenceExecutor(max_workers=1, enable_monitoring=False,
+                                     enable_cuda_streams=False, compile_mode="default",
+                                     cuda_graphs=True)
+        try:
+            assert executor.cuda_graphs is False
+        finally:
+            executor.shutdown(wait=False)
+
     def test_inference_timeout(self, executor, sample_input):
         """Test inference timeout handling"""
         import threading
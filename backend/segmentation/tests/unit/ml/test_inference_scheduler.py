@@ -0,0 +1,170 @@
+"""
+Unit tests for the micro-batching InferenceScheduler
+
+A fake loader records predict()/predict_batch() calls, so coalescing, grouping
+and error propagation are checked without any model weights.
+"""
+
+import asyncio
+
+import pytest
+import pytest_asyncio
+from PIL import Image
+
+from ml.inference_executor import InferenceError
+from ml.inference_scheduler import InferenceScheduler, SchedulerFullError
+
+
+class _FakeLoader:
+    """Records calls and echoes each image's width back as its result"""
+
+    def __init__(self):
+        self.single_calls = []
+        self.batch_calls = []
+        self.fail_with = None
+        self.drop_index = None
+
+    def predict(self, image, model_name, threshold=0.5, detect_holes=True):
+        self.single_calls.append((image.width, model_name))
+        if self.fail_with:
+            raise self.fail_with
+        return {"width": image.width, "model_used": model_name}
+
+    def predict_batch(self, images, model_name, batch_size=None,
+                      threshold=0.5, detect_holes=True):
+        self.batch_calls.append(([img.width for img in images], model_name, threshold))
+        if self.fail_with:
+            raise self.fail_with
+        results = [{"width": img.width, "model_used": model_name} for img in images]
+        if self.drop_index is not None:
+            results[self.drop_index] = None
+        return results
+
+
+def _image(width: int) -> Image.Image:
+    return Image.new("RGB", (width, 4))
+
+
+@pytest_asyncio.fixture
+async def scheduler():
+    sched = InferenceScheduler(_FakeLoader(), max_batch_size=8, max_delay_s=0.05)
+    sched.start()
+    yield sched
+    await sched.stop()
+
+
+@pytest.mark.unit
+class TestInferenceScheduler:
+    """Coalescing and result routing"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_share_one_batch(self, scheduler):
+        results = await asyncio.gather(
+            *(scheduler.submit(_image(w), "hrnet") for w in (8, 16, 24))
+        )
+        assert [r["width"] for r in results] == [8, 16, 24]
+        assert scheduler.loader.batch_calls == [([8, 16, 24], "hrnet", 0.5)]
+        assert scheduler.loader.single_calls == []
+
+    @pytest.mark.asyncio
+    async def test_lone_request_uses_single_image_predict(self, scheduler):
+        result = await scheduler.submit(_image(8), "hrnet")
+        assert result["width"] == 8
+        assert scheduler.loader.single_calls == [(8, "hrnet")]
+        assert scheduler.loader.batch_calls == []
+
+    @pytest.mark.asyncio
+    async def test_requests_are_grouped_by_model_and_threshold(self, scheduler):
+        await asyncio.gather(
+            scheduler.submit(_image(8), "hrnet"),
+            scheduler.submit(_image(16), "cbam_resunet"),
+            scheduler.submit(_image(24), "hrnet"),
+            scheduler.submit(_image(32), "hrnet", threshold=0.7),
+        )
+        assert scheduler.loader.batch_calls == [([8, 24], "hrnet", 0.5)]
+        assert sorted(scheduler.loader.single_calls) == [(16, "cbam_resunet"), (32, "hrnet")]
+
+    @pytest.mark.asyncio
+    async def test_missing_batch_result_fails_only_that_request(self, scheduler):
+        scheduler.loader.drop_index = 1
+        results = await asyncio.gather(
+            *(scheduler.submit(_image(w), "hrnet") for w in (8, 16)),
+            return_exceptions=True
+        )
+        assert results[0]["width"] == 8
+        assert isinstance(results[1], InferenceError)
+
+    @pytest.mark.asyncio
+    async def test_loader_errors_reach_every_caller(self, scheduler):
+        scheduler.loader.fail_with = InferenceError("boom")
+        results = await asyncio.gather(
+            *(scheduler.submit(_image(w), "hrnet") for w in (8, 16)),
+            return_exceptions=True
+        )
+        assert all(isinstance(r, InferenceError) for r in results)
+
+    @pytest.mark.asyncio
+    async def test_unexpected_batch_error_fails_only_that_batch(self, scheduler, monkeypatch):
+        real_process = scheduler._process
+        calls = []
+
+        async def flaky_process(batch):
+            calls.append(len(batch))
+            if len(calls) == 1:
+                raise RuntimeError("grouping bug")
+            await real_process(batch)
+
+        monkeypatch.setattr(scheduler, "_process", flaky_process)
+        with pytest.raises(InferenceError):
+            await scheduler.submit(_image(8), "hrnet")
+        assert (await scheduler.submit(_image(16), "hrnet"))["width"] == 16
+
+    @pytest.mark.asyncio
+    async def test_dead_consumer_is_restarted(self, scheduler, monkeypatch):
+        real_collect = scheduler._collect
+        crashed = []
+
+        async def crashing_collect():
+            if not crashed:
+                crashed.append(True)
+                raise RuntimeError("consumer crash")
+            return await real_collect()
+
+        monkeypatch.setattr(scheduler, "_collect", crashing_collect)
+        # Restart the consumer so it picks up the patched _collect
+        scheduler._worker.cancel()
+        await asyncio.sleep(0)
+        scheduler._start_worker()
+        crashing_worker = scheduler._worker
+        # Let it crash and the done-callback replace it
+        for _ in range(3):
+            await asyncio.sleep(0)
+        assert crashing_worker.done() and scheduler._worker is not crashing_worker
+        assert scheduler.running
+
+        result = await asyncio.wait_for(scheduler.submit(_image(8), "hrnet"), 5)
+        assert result["width"] == 8
+        assert crashed == [True]
+
+    @pytest.mark.asyncio
+    async def test_full_queue_rejects_new_requests(self):
+        sched = InferenceScheduler(_FakeLoader(), queue_max=1)
+        sched.start()
+        # Stop the consumer from draining so the queue stays full
+        sched._worker.cancel()
+        await asyncio.sleep(0)
+        sched._worker = asyncio.create_task(asyncio.sleep(60))
+        try:
+            pending = asyncio.create_task(sched.submit(_image(8), "hrnet"))
+            await asyncio.sleep(0)
+            with pytest.raises(SchedulerFullError):
+                await sched.submit(_image(16), "hrnet")
+        finally:
+            await sched.stop()
+        with pytest.raises(InferenceError):
+            await pending
+
+    @pytest.mark.asyncio
+    async def test_submit_requires_a_running_scheduler(self):
+        with pytest.raises(InferenceError):
+            await InferenceScheduler(_FakeLoader()).submit(_image(8), "hrnet")
@@ -5,12 +5,14 @@ Tests the enhanced InferenceExecutor with CUDA streams and concurrent execution
 
 import pytest
 import torch
+import os
 import threading
 import time
 import concurrent.futures
 from unittest.mock import Mock, patch, MagicMock
 import numpy as np
 
+import ml.inference_executor as _executor_module
 from ml.inference_executor import (
     InferenceExecutor,
     InferenceError,
@@ -151,6 +153,22 @@ class TestParallelInferenceExecutor:
             executor._check_gpu_memory_pressure()
             mock_cleanup.assert_called_once()
 
+    @patch('torch.cuda.is_available', return_value=True)
+    @patch('torch.cuda.get_device_properties')
+    @patch('torch.cuda.memory_allocated', return_value=1024**3)
+    def test_device_properties_queried_once(self, mock_allocated, mock_properties, mock_available, executor):
+        """Total memory and device name are static and read from the driver once"""
+        mock_properties.return_value = Mock(total_memory=24 * 1024**3)
+        mock_properties.return_value.name = "Test GPU"
+
+        executor._check_gpu_memory_pressure()
+        executor._proactive_memory_check()
+        metrics = executor.get_metrics()
+
+        mock_properties.assert_called_once_with(0)
+        assert metrics["gpu_metrics"]["total_memory_gb"] == 24
+        assert metrics["gpu_metrics"]["device_name"] == "Test GPU"
+
     @patch('torch.cuda.is_available', return_value=True)
     @patch('torch.cuda.empty_cache')
     def test_emergency_memory_cleanup(self, mock_empty_cache, mock_available, executor):
@@ -275,28 +293,73 @@ class TestParallelInferenceExecutor:
             assert executor.enable_cuda_streams is False
             assert executor.enable_monitoring is False
 
+    @pytest.mark.parametrize("value,mode", [
+        ("1", "default"), ("true", "default"), ("0", None), ("", None),
+        ("max-autotune-no-cudagraphs", "max-autotune-no-cudagraphs"),
+    ])
+    def test_torch_compile_environment_flag(self, value, mode):
+        """ML_TORCH_COMPILE takes a mode name or a boolean flag"""
+        with patch.dict('os.environ', {'ML_TORCH_COMPILE': value,
+                                       'ML_TORCH_COMPILE_FULLGRAPH': 'true'}):
+            executor = get_global_executor()
+
+            assert executor.compile_mode == mode
+            assert executor.compile_fullgraph is True
+
+    @pytest.mark.parametrize("flag,enabled", [("true", True), ("false", False), (None, False)])
+    def test_cudnn_benchmark_and_tf32_flags(self, flag, enabled):
+        """ML_CUDNN_BENCHMARK / ML_ALLOW_TF32 opt in to the backend flags on GPU hosts"""
+        # The executor module's torch (sys.modules['torch'] may be mocked)
+        cuda = _executor_module.torch.cuda
+        backends = _executor_module.torch.backends
+        # Backend flags are process-wide: restore them afterwards
+        saved = (backends.cudnn.benchmark, backends.cudnn.allow_tf32,
+                 backends.cuda.matmul.allow_tf32)
+        backends.cudnn.benchmark = backends.cudnn.allow_tf32 = False
+        backends.cuda.matmul.allow_tf32 = False
+        env = {'ML_ENABLE_MONITORING': 'false'}
+        if flag is not None:
+            env.update(ML_CUDNN_BENCHMARK=flag, ML_ALLOW_TF32=flag)
+        try:
+            with patch.object(cuda, 'is_available', return_value=True), \
+                    patch.object(cuda, 'Stream'), \
+                    patch.dict('os.environ', env):
+                if flag is None:
+                    os.environ.pop('ML_CUDNN_BENCHMARK', None)
+                    os.environ.pop('ML_ALLOW_TF32', None)
+                get_global_executor()
+
+                assert backends.cudnn.benchmark is enabled
+                assert backends.cudnn.allow_tf32 is enabled
+                assert backends.cuda.matmul.allow_tf32 is enabled
+        finally:
+            (backends.cudnn.benchmark, backends.cudnn.allow_tf32,
+             backends.cuda.matmul.allow_tf32) = saved
+
     def test_concurrent_inference_performance_benchmark(self, executor, mock_model):
         """Benchmark test for concurrent inference performance"""
         input_tensor = torch.randn(4, 3, 256, 256)  # Batch of 4
 
-        def run_single_inference():
+        # One model name per worker: calls on the same model share its lock and
+        # are serialized by design, so only distinct models can overlap
+        def run_single_inference(i):
             return executor.execute_inference(
                 model=mock_model,
                 input_tensor=input_tensor,
-                model_name="benchmark_model",
+                model_name=f"benchmark_model_{i}",
                 timeout=10.0
             )
 
         # Sequential execution
         start_time = time.time()
-        for _ in range(4):
-            run_single_inference()
+        for i in range(4):
+            run_single_inference(i)
         sequential_time = time.time() - start_time
 
         # Concurrent execution
         with concurrent.futures.ThreadPoolExecutor(max_workers=4) as thread_executor:
             start_time = time.time()
-            futures = [thread_executor.submit(run_single_inference) for _ in range(4)]
+            futures = [thread_executor.submit(run_single_inference, i) for i in range(4)]
             [future.result() for future in futures]
             concurrent_time = time.time() - start_time
 
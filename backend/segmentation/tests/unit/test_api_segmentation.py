@@ -44,6 +44,8 @@ class TestSegmentationEndpoints:
         data = response.json()
         assert data["status"] == "healthy"
         assert "timestamp" in data
+        loaded_models = app.state.model_loader.loaded_models
+        assert data["models_loaded"] == len(loaded_models)
 
     def test_status_endpoint(self, client: TestClient):
         """Test status endpoint returns the expected shape.
@@ -85,7 +87,7 @@ class TestSegmentationEndpoints:
         (not ``model_name``).  Response contains ``polygons`` (list) at the top
         level, not inside a ``metadata`` key.
         """
-        files = {"file": ("test.jpg", io.BytesIO(sample_image_bytes), "image/jpeg")}
+        files = {"file": ("test.bmp", io.BytesIO(sample_image_bytes), "image/bmp")}
         data = {"model": "hrnet"}
 
         response = await async_client.post("/api/v1/segment", files=files, data=data)
@@ -100,7 +102,7 @@ class TestSegmentationEndpoints:
     @pytest.mark.asyncio
     async def test_segment_image_invalid_model(self, async_client: AsyncClient, sample_image_bytes: bytes):
         """Test segmentation with invalid model name returns an error response."""
-        files = {"file": ("test.jpg", io.BytesIO(sample_image_bytes), "image/jpeg")}
+        files = {"file": ("test.bmp", io.BytesIO(sample_image_bytes), "image/bmp")}
         data = {"model": "invalid_model"}
 
         response = await async_client.post("/api/v1/segment", files=files, data=data)
@@ -158,7 +160,7 @@ class TestSegmentationEndpoints:
         The ``model`` form field has a default value of "hrnet", so omitting it
         is not a validation error — the request succeeds with the default.
         """
-        files = {"file": ("test.jpg", io.BytesIO(sample_image_bytes), "image/jpeg")}
+        files = {"file": ("test.bmp", io.BytesIO(sample_image_bytes), "image/bmp")}
 
         response = client.post("/api/v1/segment", files=files)
         # Default model "hrnet" is used when model param is omitted
@@ -176,8 +178,8 @@ class TestSegmentationEndpoints:
         ``/api/v1/batch-segment``, not ``/api/v1/segment/batch``.
         """
         files = [
-            ("files", ("test1.jpg", io.BytesIO(sample_image_bytes), "image/jpeg")),
-            ("files", ("test2.jpg", io.BytesIO(sample_image_bytes), "image/jpeg")),
+            ("files", ("test1.bmp", io.BytesIO(sample_image_bytes), "image/bmp")),
+            ("files", ("test2.bmp", io.BytesIO(sample_image_bytes), "image/bmp")),
         ]
         data = {"model": "hrnet"}
 
@@ -208,7 +210,7 @@ class TestSegmentationEndpoints:
     @pytest.mark.asyncio
     async def test_segment_with_postprocessing_options(self, async_client: AsyncClient, sample_image_bytes: bytes):
         """Test segmentation with optional threshold parameter."""
-        files = {"file": ("test.jpg", io.BytesIO(sample_image_bytes), "image/jpeg")}
+        files = {"file": ("test.bmp", io.BytesIO(sample_image_bytes), "image/bmp")}
         data = {
             "model": "hrnet",
             "threshold": 0.5,
@@ -223,7 +225,7 @@ class TestSegmentationEndpoints:
     @pytest.mark.asyncio
     async def test_segment_with_custom_parameters(self, async_client: AsyncClient, sample_image_bytes: bytes):
         """Test segmentation with a non-default model selection."""
-        files = {"file": ("test.jpg", io.BytesIO(sample_image_bytes), "image/jpeg")}
+        files = {"file": ("test.bmp", io.BytesIO(sample_image_bytes), "image/bmp")}
         data = {"model": "hrnet"}
 
         response = await async_client.post("/api/v1/segment", files=files, data=data)
@@ -265,7 +267,7 @@ class TestSegmentationEndpoints:
         import asyncio
 
         async def make_request():
-            files = {"file": ("test.jpg", io.BytesIO(sample_image_bytes), "image/jpeg")}
+            files = {"file": ("test.bmp", io.BytesIO(sample_image_bytes), "image/bmp")}
             data = {"model": "hrnet"}
             response = await async_client.post("/api/v1/segment", files=files, data=data)
             return response.status_code
@@ -286,7 +288,7 @@ class TestSegmentationEndpoints:
 
         start_time = time.time()
 
-        files = {"file": ("test.jpg", io.BytesIO(sample_image_bytes), "image/jpeg")}
+        files = {"file": ("test.bmp", io.BytesIO(sample_image_bytes), "image/bmp")}
         data = {"model": "hrnet"}
 
         response = await async_client.post("/api/v1/segment", files=files, data=data)
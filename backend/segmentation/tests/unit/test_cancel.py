@@ -0,0 +1,175 @@
+"""Unit tests for the cancel-path helpers in api.cancel.
+
+CUDA is faked via patches on ``torch.cuda`` so the throttling policy of
+``cleanup_gpu_resources`` can be exercised on the CPU-only CI runner.
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+import pytest
+
+sys.path.insert(
+    0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+)
+
+from api import cancel  # noqa: E402
+
+
+@pytest.fixture
+def fake_cuda(monkeypatch):
+    """Pretend a GPU is present and record allocator calls."""
+    monkeypatch.setattr(cancel, "_pending_cancellations", 0)
+    monkeypatch.setattr(cancel, "_last_empty_cache_ts", float("-inf"))
+    # Patch through the module's own torch reference: other test modules swap
+    # sys.modules["torch"] at collection time, so "torch.cuda.*" targets drift.
+    cuda = cancel.torch.cuda
+    empty_cache = MagicMock()
+    monkeypatch.setattr(cancel, "_CUDA_AVAILABLE", True)
+    monkeypatch.setattr(cuda, "current_device", lambda: 0)
+    monkeypatch.setattr(cuda, "device", MagicMock())
+    monkeypatch.setattr(cuda, "synchronize", MagicMock())
+    monkeypatch.setattr(cuda, "empty_cache", empty_cache)
+    return empty_cache
+
+
+@pytest.mark.asyncio
+async def test_single_cancel_does_not_empty_cache(fake_cuda):
+    """One cancellation stays below the threshold — no allocator trim."""
+    await cancel.cleanup_gpu_resources()
+    fake_cuda.assert_not_called()
+    assert cancel._pending_cancellations == 1
+
+
+@pytest.mark.asyncio
+async def test_threshold_triggers_single_empty_cache(fake_cuda):
+    """Crossing the threshold trims once and resets the pending counter."""
+    await cancel.cleanup_gpu_resources(cancel._EMPTY_CACHE_CANCEL_THRESHOLD)
+    fake_cuda.assert_called_once()
+    assert cancel._pending_cancellations == 0
+
+
+@pytest.mark.asyncio
+async def test_empty_cache_targets_job_device(fake_cuda):
+    """The trim runs under the device the cancelled job was registered on."""
+    await cancel.cleanup_gpu_resources(
+        cancel._EMPTY_CACHE_CANCEL_THRESHOLD, devices=(1,)
+    )
+    cancel.torch.cuda.device.assert_called_once_with(1)
+
+
+@pytest.mark.asyncio
+async def test_min_interval_throttles_repeat_calls(fake_cuda):
+    """A second burst inside the minimum interval is deferred."""
+    threshold = cancel._EMPTY_CACHE_CANCEL_THRESHOLD
+    await cancel.cleanup_gpu_resources(threshold)
+    await cancel.cleanup_gpu_resources(threshold)
+    fake_cuda.assert_called_once()
+    assert cancel._pending_cancellations == threshold
+
+
+@pytest.mark.asyncio
+async def test_cpu_only_is_noop(monkeypatch):
+    """Without CUDA nothing is counted or called."""
+    monkeypatch.setattr(cancel, "_pending_cancellations", 0)
+    empty_cache = MagicMock()
+    monkeypatch.setattr(cancel, "_CUDA_AVAILABLE", False)
+    monkeypatch.setattr(cancel.torch.cuda, "empty_cache", empty_cache)
+    await cancel.cleanup_gpu_resources(10)
+    empty_cache.assert_not_called()
+    assert cancel._pending_cancellations == 0
+
+
+@pytest.mark.asyncio
+async def test_job_context_registers_and_cleans_up():
+    """job_context yields a Job that is visible until the block exits."""
+    async with cancel.job_context("job-ctx", "segmentation") as job:
+        assert isinstance(job, cancel.Job)
+        assert cancel.lookup_job("job-ctx") is job
+        assert cancel.is_job_cancelled("job-ctx") is False
+    assert cancel.lookup_job("job-ctx") is None
+    assert cancel.is_job_cancelled("job-ctx") is False
+
+
+@pytest.mark.asyncio
+async def test_cancel_all_marks_jobs_and_sets_events(fake_cuda):
+    """cancel-all flags every active job and wakes its cancel event."""
+    from fastapi import BackgroundTasks
+
+    async with cancel.job_context("job-a") as job_a, \
+               cancel.job_context("job-b") as job_b:
+        response = await cancel.cancel_all_jobs(BackgroundTasks())
+        assert sorted(response["cancelled_jobs"]) == ["job-a", "job-b"]
+        for job in (job_a, job_b):
+            assert job.cancelled is True
+            assert job.cancel_event.is_set()
+            assert job.cancel_reason == "Emergency stop - all jobs cancelled"
+        assert cancel.is_job_cancelled("job-a") is True
+
+
+@pytest.mark.asyncio
+async def test_cancel_all_trims_each_job_device(fake_cuda, monkeypatch):
+    """cancel-all trims the cache on the devices its jobs ran on."""
+    from fastapi import BackgroundTasks
+
+    monkeypatch.setattr(
+        cancel, "_pending_cancellations", cancel._EMPTY_CACHE_CANCEL_THRESHOLD
+    )
+    background_tasks = BackgroundTasks()
+    async with cancel.job_context("job-gpu1", device_idx=1), \
+               cancel.job_context("job-gpu2", device_idx=2), \
+               cancel.job_context("job-gpu1b", device_idx=1):
+        await cancel.cancel_all_jobs(background_tasks)
+    await background_tasks()
+
+    calls = cancel.torch.cuda.device.call_args_list
+    assert sorted(call.args[0] for call in calls) == [1, 2]
+    assert fake_cuda.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_get_cancel_event_returns_none_for_unknown_job():
+    """A miss returns None rather than a fresh Event nobody can set."""
+    assert cancel.get_cancel_event("no-such-job") is None
+    async with cancel.job_context("job-evt") as job:
+        assert cancel.get_cancel_event("job-evt") is job.cancel_event
+
+
+@pytest.mark.asyncio
+async def test_snapshot_is_detached_from_live_jobs():
+    """snapshot_active returns frozen copies, not the live Job objects."""
+    async with cancel.job_context("job-snap") as job:
+        (view,) = [v for v in cancel.snapshot_active() if v.job_id == "job-snap"]
+        job.cancelled = True
+        assert view.cancelled is False
+        with pytest.raises(AttributeError):
+            view.cancelled = True
+    assert all(v.job_id != "job-snap" for v in cancel.snapshot_active())
+
+
+@pytest.mark.asyncio
+async def test_active_jobs_reports_monotonic_duration():
+    """Job start times use the monotonic clock; durations are non-negative."""
+    async with cancel.job_context("job-dur"):
+        listing = await cancel.get_active_jobs()
+    assert listing["total_count"] == 1
+    info = listing["active_jobs"]["job-dur"]
+    assert 0.0 <= info["duration"] < 60.0
+    assert datetime.fromisoformat(info["started_at"]).tzinfo is not None
+
+
+@pytest.mark.asyncio
+async def test_cancel_reports_wall_clock_timestamp(fake_cuda):
+    """cancelled_at is an ISO-8601 UTC timestamp, not a monotonic float."""
+    from fastapi import BackgroundTasks
+
+    before = datetime.now(timezone.utc)
+    async with cancel.job_context("job-ts"):
+        response = await cancel.cancel_segmentation(
+            "job-ts", cancel.CancelRequest(job_id="job-ts"), BackgroundTasks()
+        )
+    cancelled_at = datetime.fromisoformat(response.cancelled_at)
+    assert before - timedelta(seconds=1) <= cancelled_at
+    assert cancelled_at <= datetime.now(timezone.utc)
@@ -214,6 +214,14 @@ class TestCalculateAll:
             "PerimeterWithHoles should be larger when holes are provided"
         )
 
+    def test_calculate_all_returns_hull_area_on_request(self, square_contour):
+        """return_hull_area=True yields (data, hull_area) with the same data."""
+        data, hull_area = calculate_all(square_contour, return_hull_area=True)
+        assert data == calculate_all(square_contour)
+        # Square is convex: hull area equals polygon area, Solidity is 1.
+        assert hull_area == pytest.approx(data["Area"])
+        assert data["Solidity"] == pytest.approx(1.0)
+
     def test_compactness_never_below_one_for_tiny_contour(self):
         """Regression: de-staircasing the perimeter with a 2px tolerance can
         over-shorten a TINY few-point contour's boundary (approxPolyDP cuts
@@ -117,3 +117,152 @@ def test_summary_stats_with_populated_history(cpu_monitor):
     assert stats["avg_utilization_percent"] == pytest.approx(50.0)
     # No batches recorded → success rate defaults to 100.
     assert stats["batch_success_rate"] == 100
+
+
+def test_batch_stats_match_a_scan_of_the_window(cpu_monitor, monkeypatch):
+    """Running-total stats over the last N batches equal a direct scan."""
+    clock = iter(range(1, 100))
+    monkeypatch.setattr("monitoring.gpu_monitor.time.time", lambda: next(clock))
+    for i in range(6):
+        cpu_monitor.record_batch_processing(
+            model_name="hrnet",
+            batch_size=i + 1,
+            start_time=0.0,
+            memory_before=0,
+            success=i % 3 != 0,
+        )
+
+    for limit in (1, 4, 6, 50):
+        window = list(cpu_monitor.batch_metrics)[-limit:]
+        successful = [m for m in window if m.success]
+        stats = cpu_monitor.get_batch_stats(limit)
+        assert stats["total_batches"] == len(window)
+        assert stats["successful"] == len(successful)
+        assert stats["failed"] == len(window) - len(successful)
+        if successful:
+            assert stats["avg_throughput_imgs_sec"] == pytest.approx(
+                sum(m.throughput_imgs_sec for m in successful) / len(successful),
+                abs=0.01,
+            )
+            assert stats["avg_inference_time_ms"] == pytest.approx(
+                sum(m.inference_time_ms for m in successful) / len(successful),
+                abs=0.01,
+            )
+
+
+def test_batch_stats_empty(cpu_monitor):
+    """No batches recorded → zeroed stats with a 100% success rate."""
+    stats = cpu_monitor.get_batch_stats(50)
+    assert stats["total_batches"] == 0
+    assert stats["success_rate"] == 100.0
+
+
+def test_batch_history_is_bounded(cpu_monitor, monkeypatch):
+    """Old batches fall off the ring buffer; stats cover what is retained."""
+    import monitoring.gpu_monitor as gpu_monitor
+    from collections import deque
+
+    monkeypatch.setattr(cpu_monitor, "batch_metrics", deque(maxlen=3))
+    monkeypatch.setattr(cpu_monitor, "_batch_prefix", deque(maxlen=3))
+    monkeypatch.setattr(gpu_monitor.time, "time", lambda: 1.0)
+    for size in range(1, 6):
+        cpu_monitor.record_batch_processing(
+            model_name="hrnet", batch_size=size, start_time=0.0, memory_before=0
+        )
+
+    recent = cpu_monitor.recent_batch_metrics(50)
+    assert [m.batch_size for m in recent] == [3, 4, 5]
+    assert [m.batch_size for m in cpu_monitor.recent_batch_metrics(2)] == [4, 5]
+    stats = cpu_monitor.get_batch_stats(50)
+    assert stats["total_batches"] == 3
+    assert stats["avg_throughput_imgs_sec"] == pytest.approx(4.0)
+
+
+def test_static_and_dynamic_info_without_gpu(cpu_monitor):
+    """On CPU neither the static nor the dynamic reader reports anything."""
+    assert cpu_monitor.get_static_info() is None
+    assert cpu_monitor.get_dynamic_metrics() is None
+
+
+def test_current_metrics_combine_static_and_dynamic(cpu_monitor, monkeypatch):
+    """get_current_metrics is the static device info plus a dynamic reading."""
+    import monitoring.gpu_monitor as gpu_monitor
+    from types import SimpleNamespace
+
+    cuda = gpu_monitor.torch.cuda
+    monkeypatch.setattr(cpu_monitor, "is_cuda", True)
+    monkeypatch.setattr(
+        cpu_monitor, "device_properties", SimpleNamespace(name="Fake GPU"),
+        raising=False,
+    )
+    monkeypatch.setattr(cpu_monitor, "total_memory_mb", 1000.0, raising=False)
+    monkeypatch.setattr(cuda, "memory_allocated", lambda: 250 * 1024 ** 2)
+    monkeypatch.setattr(cuda, "memory_reserved", lambda: 300 * 1024 ** 2)
+
+    assert cpu_monitor.get_static_info() == {
+        "id": 0, "name": "Fake GPU", "total_mb": 1000.0
+    }
+    metrics = cpu_monitor.get_current_metrics()
+    assert metrics.device_name == "Fake GPU"
+    assert metrics.memory_total_mb == 1000.0
+    assert metrics.memory_allocated_mb == 250.0
+    assert metrics.memory_free_mb == 750.0
+    assert metrics.memory_usage_percent == 25.0
+
+
+def test_latest_dynamic_metrics_served_from_running_sampler(cpu_monitor, monkeypatch):
+    """While the sampler thread runs, its last sample is returned as-is."""
+    from types import SimpleNamespace
+
+    def reading(allocated_mb):
+        return {
+            "allocated_mb": allocated_mb, "reserved_mb": 0.0, "free_mb": 0.0,
+            "usage_percent": 0.0, "gpu_percent": 0.0,
+            "temperature_celsius": None, "power_watts": None,
+            "timestamp": "2026-04-26T00:00:00",
+        }
+
+    sample, fresh = reading(1.0), reading(2.0)
+    monkeypatch.setattr(
+        cpu_monitor, "device_properties", SimpleNamespace(name="Fake GPU"),
+        raising=False,
+    )
+    monkeypatch.setattr(cpu_monitor, "total_memory_mb", 1000.0, raising=False)
+    monkeypatch.setattr(cpu_monitor, "get_dynamic_metrics", lambda: sample)
+    # One immediate sample, then the loop parks until stop_monitoring().
+    monkeypatch.setattr(cpu_monitor, "sampling_interval", 60)
+
+    cpu_monitor.start_monitoring()
+    try:
+        deadline = time.time() + 2
+        while cpu_monitor.latest_dynamic is None and time.time() < deadline:
+            time.sleep(0.01)
+        monkeypatch.setattr(cpu_monitor, "get_dynamic_metrics", lambda: fresh)
+        assert cpu_monitor.get_latest_dynamic_metrics() is sample
+    finally:
+        cpu_monitor.stop_monitoring()
+    assert not cpu_monitor.monitoring_thread.is_alive()
+    # Sampler stopped → falls back to a fresh reading.
+    assert cpu_monitor.get_latest_dynamic_metrics() is fresh
+    assert cpu_monitor.metrics_history[-1].memory_allocated_mb == 1.0
+
+
+def test_summary_stats_batch_fields_use_running_totals(cpu_monitor, monkeypatch):
+    """Summary throughput / success rate agree with the recorded batches."""
+    from monitoring.gpu_monitor import GPUMetrics
+
+    monkeypatch.setattr("monitoring.gpu_monitor.time.time", lambda: 1.0)
+    cpu_monitor.metrics_history.append(GPUMetrics(
+        timestamp="2026-04-26T00:00:00", device_id=0, device_name="mock",
+        memory_allocated_mb=10.0, memory_reserved_mb=10.0, memory_free_mb=0.0,
+        memory_total_mb=10.0, memory_usage_percent=100.0, utilization_percent=0.0,
+    ))
+    for size, ok in ((2, True), (6, True), (4, False), (1, True)):
+        cpu_monitor.record_batch_processing(
+            model_name="hrnet", batch_size=size, start_time=0.0,
+            memory_before=0, success=ok,
+        )
+
+    stats = cpu_monitor.get_summary_stats()
+    assert stats["avg_throughput_imgs_sec"] == pytest.approx(3.0)
+    assert stats["batch_success_rate"] == pytest.approx(75.0)
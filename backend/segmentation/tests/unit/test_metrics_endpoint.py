@@ -0,0 +1,116 @@
+"""Unit tests for the /api/calculate-metrics and batch metrics endpoints."""
+
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from api.metrics_endpoint import (  # noqa: E402
+    _polygon_areas,
+    router as metrics_router,
+    warm_up_metrics,
+)
+
+SQUARE = [[10.0, 10.0], [90.0, 10.0], [90.0, 90.0], [10.0, 90.0]]
+HOLE = [[40.0, 40.0], [60.0, 40.0], [60.0, 60.0], [40.0, 60.0]]
+
+
+@pytest.fixture(scope="module")
+def client() -> TestClient:
+    _app = FastAPI()
+    _app.include_router(metrics_router)
+    return TestClient(_app)
+
+
+@pytest.mark.unit
+class TestCalculateMetrics:
+    """Tests for POST /api/calculate-metrics and /api/batch-calculate-metrics."""
+
+    def test_square_area(self, client):
+        resp = client.post("/api/calculate-metrics", json={"contour": SQUARE})
+        assert resp.status_code == 200, resp.text
+        assert resp.json()["Area"] == pytest.approx(6400.0)
+
+    def test_hole_area_is_subtracted(self, client):
+        resp = client.post(
+            "/api/calculate-metrics", json={"contour": SQUARE, "holes": [HOLE]}
+        )
+        assert resp.status_code == 200, resp.text
+        data = resp.json()
+        assert data["Area"] == pytest.approx(6400.0 - 400.0)
+        assert data["Solidity"] == pytest.approx(6000.0 / 6400.0)
+
+    def test_batch_matches_single(self, client):
+        bodies = [{"contour": SQUARE}, {"contour": SQUARE, "holes": [HOLE]}]
+        batch = client.post("/api/batch-calculate-metrics", json=bodies)
+        assert batch.status_code == 200, batch.text
+        singles = [
+            client.post("/api/calculate-metrics", json=b).json() for b in bodies
+        ]
+        assert batch.json() == singles
+
+    def test_batch_failed_item_returns_zeros(self, client):
+        """A malformed polygon yields all-zero metrics without failing the batch."""
+        bodies = [{"contour": [[1.0, 2.0, 3.0]]}, {"contour": SQUARE}]
+        resp = client.post("/api/batch-calculate-metrics", json=bodies)
+        assert resp.status_code == 200, resp.text
+        bad, good = resp.json()
+        assert all(value == 0 for value in bad.values())
+        assert good["Area"] == pytest.approx(6400.0)
+
+
+@pytest.mark.unit
+def test_polygon_areas_matches_cv2_contour_area():
+    """The batched shoelace agrees with cv2.contourArea, incl. degenerate holes."""
+    rng = np.random.default_rng(0)
+    contours = [
+        (rng.random((n, 1, 2)) * 100).astype(np.float32) for n in (3, 5, 1, 2, 17)
+    ]
+    expected = [cv2.contourArea(c) for c in contours]
+    assert _polygon_areas(contours) == pytest.approx(expected, abs=1e-3)
+    assert _polygon_areas([]).size == 0
+
+
+@pytest.mark.unit
+class TestMetricsRequestParsing:
+    """Malformed bodies are rejected with 422 like Pydantic validation did."""
+
+    @pytest.mark.parametrize("body", [
+        {"holes": []},
+        {"contour": [["a", "b"]]},
+        {"contour": [[1.0, 2.0], [3.0]]},
+        {"contour": SQUARE, "holes": "nope"},
+    ])
+    def test_single_rejects_malformed_body(self, client, body):
+        resp = client.post("/api/calculate-metrics", json=body)
+        assert resp.status_code == 422, resp.text
+
+    def test_batch_rejects_non_list(self, client):
+        resp = client.post("/api/batch-calculate-metrics", json={"contour": SQUARE})
+        assert resp.status_code == 422, resp.text
+
+    def test_batch_reports_offending_index(self, client):
+        resp = client.post(
+            "/api/batch-calculate-metrics",
+            json=[{"contour": SQUARE}, {"contour": [["x", 1]]}],
+        )
+        assert resp.status_code == 422, resp.text
+        assert resp.json()["detail"][0]["loc"] == ["body", 1]
+
+    def test_openapi_documents_request_body(self, client):
+        paths = client.get("/openapi.json").json()["paths"]
+        body = paths["/api/batch-calculate-metrics"]["post"]["requestBody"]
+        schema = body["content"]["application/json"]["schema"]
+        assert "contour" in schema["items"]["properties"]
+
+
+@pytest.mark.unit
+def test_warm_up_metrics_runs_full_metrics_path():
+    """The startup warm-up exercises the hole-aware metrics path without error."""
+    warm_up_metrics()
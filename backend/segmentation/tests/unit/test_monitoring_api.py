@@ -0,0 +1,107 @@
+"""Unit tests for the /api/v1/monitoring endpoints on a CPU-only runner."""
+
+import os
+import sys
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from api import monitoring  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def client() -> TestClient:
+    _app = FastAPI()
+    _app.include_router(monitoring.router, prefix="/api/v1")
+    return TestClient(_app)
+
+
+@pytest.mark.unit
+def test_router_serialises_with_orjson():
+    """Every monitoring route uses ORJSONResponse, independent of the app."""
+    assert monitoring.router.routes
+    for route in monitoring.router.routes:
+        assert route.response_class is ORJSONResponse
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("path", ["/gpu/status", "/gpu/batch-metrics"])
+def test_hot_routes_skip_response_model(path):
+    """Polled routes return ORJSONResponse directly, bypassing validation."""
+    route = next(r for r in monitoring.router.routes if r.path == f"/monitoring{path}")
+    assert route.response_model is None
+
+
+@pytest.mark.unit
+def test_batch_metrics_without_batches(client):
+    resp = client.get("/api/v1/monitoring/gpu/batch-metrics")
+    assert resp.status_code == 200, resp.text
+    body = resp.json()
+    assert body["statistics"]["total_batches"] == 0
+    assert body["metrics"] == []
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("limit, status", [(0, 422), (1, 200), (1000, 200), (10_000_000, 422)])
+def test_batch_metrics_limit_is_bounded(client, limit, status):
+    resp = client.get("/api/v1/monitoring/gpu/batch-metrics", params={"limit": limit})
+    assert resp.status_code == status, resp.text
+
+
+@pytest.mark.unit
+def test_batch_metrics_entries_keep_their_shape(client, monkeypatch):
+    """Each formatted entry carries the documented keys and values."""
+    from monitoring.gpu_monitor import BatchProcessingMetrics
+
+    record = BatchProcessingMetrics(
+        model_name="hrnet", batch_size=4, inference_time_ms=12.5,
+        throughput_imgs_sec=320.0, memory_before_mb=1.0, memory_after_mb=3.0,
+        memory_delta_mb=2.0, gpu_utilization=55.0, success=False,
+        error_message="OOM",
+    )
+    monitor = monitoring.get_gpu_monitor()
+    monkeypatch.setattr(monitor, "recent_batch_metrics", lambda limit: [record])
+
+    entry = client.get("/api/v1/monitoring/gpu/batch-metrics").json()["metrics"][0]
+    assert entry == {
+        "model": "hrnet",
+        "batch_size": 4,
+        "inference_time_ms": 12.5,
+        "throughput_imgs_sec": 320.0,
+        "memory_delta_mb": 2.0,
+        "gpu_utilization": 55.0,
+        "success": False,
+        "error": "OOM",
+    }
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("force, pressure, cleared", [
+    (False, False, False),
+    (False, True, True),
+    (True, False, True),
+])
+def test_clear_cache_is_gated_on_memory_pressure(client, monkeypatch, force, pressure, cleared):
+    """empty_cache() only runs under pressure or when explicitly forced."""
+    from unittest.mock import MagicMock
+
+    cuda = MagicMock()
+    cuda.is_available.return_value = True
+    cuda.memory_reserved.side_effect = [300 * 1024 ** 2, 100 * 1024 ** 2]
+    monkeypatch.setattr(monitoring.torch, "cuda", cuda)
+    monitor = monitoring.get_gpu_monitor()
+    monkeypatch.setattr(monitor, "should_reduce_batch_size", lambda: pressure)
+
+    resp = client.post("/api/v1/monitoring/gpu/clear-cache", params={"force": force})
+    assert resp.status_code == 200, resp.text
+    body = resp.json()
+    assert cuda.empty_cache.called is cleared
+    if cleared:
+        assert body["status"] == "success"
+        assert body["memory_freed_mb"] == 200.0
+    else:
+        assert body == {"status": "skipped", "reason": "no pressure"}
@@ -0,0 +1,143 @@
+"""Contract test for ``ModelLoader.predict_batch`` on the CPU path.
+
+A tiny torch module that turns a centred disk of each input image into logits
+is injected in place of a trained network, so the batch path — one forward
+pass for the whole window, per-image postprocessing, result alignment — runs
+without any checkpoint.
+"""
+import sys
+
+import numpy as np
+import pytest
+
+_ml = pytest.importorskip("ml.model_loader")
+from PIL import Image  # noqa: E402
+
+# Use the loader's own torch: other test modules swap sys.modules["torch"] for
+# a MagicMock at collection time. torchvision's transforms resolve torch
+# lazily, so the preprocessing path cannot run at all once that has happened.
+torch = _ml.torch
+pytestmark = pytest.mark.skipif(
+    sys.modules.get("torch") is not torch,
+    reason="sys.modules['torch'] replaced by another test module",
+)
+
+ModelLoader = _ml.ModelLoader
+
+
+class _DiskLogits(torch.nn.Module):
+    """Positive logits wherever the (normalised) red channel is bright."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def forward(self, x):
+        self.calls += 1
+        return (x[:, :1] * 4.0).float()
+
+
+def _disk_image(size=128, radius=30, value=255):
+    yy, xx = np.ogrid[:size, :size]
+    disk = (yy - size // 2) ** 2 + (xx - size // 2) ** 2 <= radius ** 2
+    rgb = np.zeros((size, size, 3), np.uint8)
+    rgb[disk] = value
+    return Image.fromarray(rgb)
+
+
+@pytest.fixture
+def loader():
+    loader = ModelLoader(base_path=".")
+    loader.device = torch.device("cpu")
+    # Inject so get_model() short-circuits — no weights needed.
+    loader.loaded_models["hrnet"] = _DiskLogits().eval()
+    return loader
+
+
+def test_predict_batch_runs_one_forward_and_aligns_results(loader):
+    batch_size = loader.get_max_safe_batch_size("hrnet")
+    images = [_disk_image() for _ in range(batch_size + 1)]
+    results = loader.predict_batch(images, "hrnet", batch_size=batch_size)
+
+    # One forward per window, not per image.
+    assert loader.loaded_models["hrnet"].calls == 2
+    assert len(results) == len(images)
+    for result in results:
+        assert result["model_used"] == "hrnet"
+        assert len(result["polygons"]) == 1
+        polygon = result["polygons"][0]
+        assert polygon["type"] == "external"
+        assert 0.5 < polygon["confidence"] <= 1.0
+
+
+def test_predict_batch_postprocess_failure_is_per_image(loader, monkeypatch):
+    calls = {"n": 0}
+    real_find = _ml.cv2.findContours
+
+    def flaky_find(*args, **kwargs):
+        calls["n"] += 1
+        if calls["n"] == 2:
+            raise ValueError("boom")
+        return real_find(*args, **kwargs)
+
+    monkeypatch.setattr(_ml.cv2, "findContours", flaky_find)
+    results = loader.predict_batch(
+        [_disk_image(), _disk_image(), _disk_image()], "hrnet",
+        batch_size=4, detect_holes=True,
+    )
+    assert results[1] is None
+    assert results[0] is not None and results[2] is not None
+
+
+def test_preprocess_image_batch_matches_single_image_path(loader):
+    images = [_disk_image(size=96), _disk_image(size=64, radius=10).convert("L")]
+
+    batch = loader.preprocess_image_batch(images)
+
+    assert batch.shape == (2, 3, 1024, 1024)
+    for i, image in enumerate(images):
+        assert torch.equal(batch[i], loader.preprocess_image(image)[0])
+
+
+def test_device_preprocessing_matches_pil_pipeline(loader):
+    """The uint8 upload + on-device resize/normalize path (used on CUDA)
+    agrees with the PIL transform to within one uint8 step, per image and
+    in upload order across differently sized images."""
+    rng = np.random.default_rng(0)
+    images = [
+        Image.fromarray(rng.integers(0, 256, (h, w, 3), dtype=np.uint8))
+        for h, w in ((96, 128), (1200, 1500), (96, 128))
+    ]
+
+    batch = loader._preprocess_on_device(images, (1024, 1024))
+
+    assert batch.shape == (3, 3, 1024, 1024)
+    for i, image in enumerate(images):
+        expected = loader.preprocess_image(image)[0]
+        # One uint8 step (1/255) divided by the smallest std
+        assert torch.allclose(batch[i], expected, atol=1 / 255 / 0.224 + 1e-4)
+
+
+def test_device_preprocessing_single_size_skips_batch_gather(loader, monkeypatch):
+    """One source size is resized as a batch and returned directly."""
+    images = [_disk_image(size=96), _disk_image(size=96, radius=10)]
+    gathers = []
+    real_empty = torch.empty
+
+    def tracking_empty(*args, **kwargs):
+        if kwargs.get("device") is not None:
+            gathers.append(args)
+        return real_empty(*args, **kwargs)
+
+    monkeypatch.setattr(_ml.torch, "empty", tracking_empty)
+    batch = loader._preprocess_on_device(images, (64, 64))
+
+    assert batch.shape == (2, 3, 64, 64)
+    assert gathers == []
+
+
+def test_status_snapshot_is_derived_from_one_read(loader):
+    assert loader.snapshot_status() == (False, None, 0)
+    # Mid-update (current_model written, is_processing not yet): still consistent
+    loader.current_model = "hrnet"
+    assert loader.snapshot_status() == (True, "hrnet", 0)
@@ -0,0 +1,590 @@
+"""Unit tests for api.routes with a stub model loader.
+
+The real loader needs model weights; the stub records what the endpoints hand
+to it so request handling can be checked on any machine.
+"""
+
+import io
+import os
+import sys
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from api.routes import router  # noqa: E402
+
+
+class _StubLoader:
+    """Minimal stand-in for ModelLoader's batch API."""
+
+    device = "cpu"
+
+    def __init__(self, batch_limit: int = 8):
+        self.batch_limit = batch_limit
+        self.calls = []
+
+    def get_batch_limit(self, model_name: str) -> int:
+        return self.batch_limit
+
+    def snapshot_status(self):
+        return True, "hrnet", 2
+
+    def predict_batch(self, images, model_name, batch_size=None,
+                      threshold=0.5, detect_holes=True):
+        self.calls.append(list(images))
+        return [
+            {"polygons": [{"id": i}], "image_size": {"width": img.width}}
+            for i, img in enumerate(images)
+        ]
+
+
+def _png_bytes(width: int) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (width, 8), color=(128, 128, 128)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def loader() -> _StubLoader:
+    return _StubLoader()
+
+
+@pytest.fixture
+def client(loader) -> TestClient:
+    _app = FastAPI()
+    _app.include_router(router, prefix="/api/v1")
+    _app.state.model_loader = loader
+    return TestClient(_app)
+
+
+@pytest.mark.unit
+class TestBatchSegment:
+    """Ingestion and result alignment of the batch endpoint."""
+
+    def test_images_reach_predict_batch_in_upload_order(self, client, loader):
+        files = [
+            ("files", (f"img{w}.png", _png_bytes(w), "image/png"))
+            for w in (8, 16, 24)
+        ]
+        resp = client.post("/api/v1/batch-segment", files=files)
+        assert resp.status_code == 200, resp.text
+        assert len(loader.calls) == 1
+        assert [img.width for img in loader.calls[0]] == [8, 16, 24]
+        results = resp.json()["results"]
+        assert [r["filename"] for r in results] == ["img8.png", "img16.png", "img24.png"]
+        assert [r["image_size"]["width"] for r in results] == [8, 16, 24]
+        assert resp.json()["total_polygons"] == 3
+
+    def test_undecodable_upload_is_reported_in_place(self, client, loader):
+        files = [
+            ("files", ("good.png", _png_bytes(8), "image/png")),
+            ("files", ("bad.png", b"not an image", "image/png")),
+            ("files", ("good2.png", _png_bytes(16), "image/png")),
+        ]
+        resp = client.post("/api/v1/batch-segment", files=files)
+        assert resp.status_code == 200, resp.text
+        body = resp.json()
+        assert [r["success"] for r in body["results"]] == [True, False, True]
+        assert body["results"][1]["error"] == "Failed to load image"
+        assert body["results"][2]["batch_index"] == 2
+        assert body["successful_count"] == 2
+
+    def test_missing_batch_result_is_a_per_file_failure(self, client, loader):
+        """A None entry from predict_batch fails only that file."""
+        real_predict = loader.predict_batch
+
+        def predict_with_gap(images, *args, **kwargs):
+            results = real_predict(images, *args, **kwargs)
+            results[0] = None
+            return results
+
+        loader.predict_batch = predict_with_gap
+        files = [
+            ("files", (f"img{w}.png", _png_bytes(w), "image/png")) for w in (8, 16)
+        ]
+        body = client.post("/api/v1/batch-segment", files=files).json()
+        assert [r["success"] for r in body["results"]] == [False, True]
+        assert body["results"][0]["error"] == "No result from batch processing"
+        assert body["successful_count"] == 1
+        assert body["failed_count"] == 1
+        assert body["total_polygons"] == 1
+
+    def test_batch_inference_error_fails_every_file(self, client, loader):
+        import api.routes as routes
+
+        # The class the route catches; other test modules may reload
+        # ml.inference_executor, leaving a second InferenceError around
+        def failing_predict(*args, **kwargs):
+            raise routes.InferenceError("/internal/path exploded")
+
+        loader.predict_batch = failing_predict
+        files = [
+            ("files", (f"img{w}.png", _png_bytes(w), "image/png")) for w in (8, 16)
+        ]
+        body = client.post("/api/v1/batch-segment", files=files).json()
+        assert body["successful_count"] == 0
+        assert [r["batch_index"] for r in body["results"]] == [0, 1]
+        for entry in body["results"]:
+            assert entry["success"] is False
+            assert entry["error"] == "Batch inference failed"
+            assert "/internal/path" not in entry["error_detail"]
+
+    def test_batch_timeout_reports_timeout_detail(self, client, loader):
+        import api.routes as routes
+
+        def timing_out(*args, **kwargs):
+            raise routes.InferenceTimeoutError("hrnet", 30.0, (16, 8))
+
+        loader.predict_batch = timing_out
+        files = [("files", ("img.png", _png_bytes(16), "image/png"))]
+        (entry,) = client.post("/api/v1/batch-segment", files=files).json()["results"]
+        assert entry["error"] == "Batch timeout after 30.0s for model 'hrnet'"
+        assert entry["error_detail"]["type"] == "timeout"
+        assert entry["error_detail"]["timeout"] == 30.0
+
+    def test_truncated_upload_fails_at_decode_not_in_the_batch(self, client, loader):
+        """Images are fully decoded up front; a truncated one is rejected alone."""
+        truncated = _png_bytes(16)[:-40]
+        files = [
+            ("files", ("good.png", _png_bytes(8), "image/png")),
+            ("files", ("cut.png", truncated, "image/png")),
+        ]
+        resp = client.post("/api/v1/batch-segment", files=files)
+        assert resp.status_code == 200, resp.text
+        assert [r["success"] for r in resp.json()["results"]] == [True, False]
+        # Only decoded pixel data reaches the model.
+        assert all(img.im is not None for img in loader.calls[0])
+
+    def test_processing_time_ignores_wall_clock_steps(self, client, monkeypatch):
+        """A wall clock stepped back mid-request (NTP) must not yield a negative time."""
+        import itertools
+        import api.routes as routes
+
+        wall = itertools.count(1_000_000.0, -10.0)
+        monkeypatch.setattr(routes.time, "time", lambda: next(wall))
+        files = [("files", ("img.png", _png_bytes(8), "image/png"))]
+        body = client.post("/api/v1/batch-segment", files=files).json()
+        assert body["processing_time"] >= 0
+
+    def test_parallel_decodes_are_capped(self, client, monkeypatch):
+        import asyncio
+        import threading
+        import time as _time
+        import api.routes as routes
+
+        lock = threading.Lock()
+        active = peak = 0
+        real_decode = routes._decode_image
+
+        def slow_decode(data):
+            nonlocal active, peak
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            _time.sleep(0.02)
+            with lock:
+                active -= 1
+            return real_decode(data)
+
+        monkeypatch.setattr(routes, "_decode_image", slow_decode)
+        monkeypatch.setattr(routes, "_MAX_PARALLEL_DECODES", 2)
+        files = [
+            ("files", (f"img{w}.png", _png_bytes(w), "image/png"))
+            for w in (8, 16, 24, 32, 40, 48)
+        ]
+        resp = client.post("/api/v1/batch-segment", files=files)
+        assert resp.status_code == 200, resp.text
+        assert peak == 2
+
+    def test_npz_format_packs_vertices_with_offsets(self, client, loader):
+        import json
+        import numpy as np
+
+        def predict_with_points(images, *args, **kwargs):
+            return [
+                {"polygons": [
+                    {"id": f"p{i}{k}", "points": [{"x": float(k), "y": float(i)}] * (k + 3)}
+                    for k in range(i + 1)
+                ]}
+                for i, _ in enumerate(images)
+            ]
+
+        loader.predict_batch = predict_with_points
+        files = [
+            ("files", (f"img{w}.png", _png_bytes(w), "image/png")) for w in (8, 16)
+        ]
+        resp = client.post("/api/v1/batch-segment?format=npz", files=files)
+        assert resp.status_code == 200, resp.text
+        assert resp.headers["content-type"] == "application/x-npz"
+
+        archive = np.load(io.BytesIO(resp.content))
+        assert archive["result_offsets"].tolist() == [0, 1, 3]
+        assert archive["polygon_offsets"].tolist() == [0, 3, 6, 10]
+        assert archive["vertices"].dtype == np.float32
+        assert archive["vertices"][6:10].tolist() == [[1.0, 1.0]] * 4
+        meta = json.loads(archive["metadata"].tobytes())
+        assert meta["successful_count"] == 2
+        assert meta["results"][1]["polygons"] == [{"id": "p10"}, {"id": "p11"}]
+
+    def test_bad_extension_rejects_batch_before_any_read(self, client, loader, monkeypatch):
+        import api.routes as routes
+
+        reads = []
+
+        async def _tracking_read(file):
+            reads.append(file.filename)
+
+        monkeypatch.setattr(routes, "_read_and_decode", _tracking_read)
+        files = [
+            ("files", ("good.png", _png_bytes(8), "image/png")),
+            ("files", ("notes.txt", b"hello", "text/plain")),
+            ("files", ("good2.png", _png_bytes(16), "image/png")),
+        ]
+        resp = client.post("/api/v1/batch-segment", files=files)
+        assert resp.status_code == 400
+        assert "notes.txt" in resp.json()["detail"]
+        assert reads == []
+        assert loader.calls == []
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("filename, expected", [
+    ("cells.png", True),
+    ("CELLS.TIF", True),
+    ("scan.v2.jpeg", True),
+    ("archive.tar.gz", False),
+    ("noextension", False),
+    ("", False),
+    (None, False),
+])
+def test_validate_image_extension(filename, expected):
+    from types import SimpleNamespace
+
+    from api.routes import validate_image
+
+    assert validate_image(SimpleNamespace(filename=filename)) is expected
+
+
+@pytest.mark.unit
+def test_decode_semaphore_is_per_event_loop():
+    """Each event loop gets its own decode semaphore, created on first use."""
+    import asyncio
+    from api import routes
+
+    async def slots():
+        return routes._get_decode_slots(), routes._get_decode_slots()
+
+    first, again = asyncio.run(slots())
+    other, _ = asyncio.run(slots())
+    assert first is again
+    assert other is not first
+
+
+@pytest.mark.unit
+def test_health_probes_device_once(client, monkeypatch):
+    """/api/v1/health serves the app's device summary, probed on first use."""
+    from api import routes
+
+    calls = []
+    monkeypatch.setattr(
+        routes.torch.cuda, "is_available", lambda: calls.append(1) or False
+    )
+    for _ in range(3):
+        resp = client.get("/api/v1/health")
+        assert resp.status_code == 200
+        assert resp.json()["device"] == client.app.state.device_info
+    assert len(calls) == 1
+
+
+@pytest.mark.unit
+def test_health_reports_the_lifespan_probe(client):
+    """Routes report the same device summary the app lifespan stored."""
+    client.app.state.device_info = {
+        "gpu_available": True, "device_count": 1, "device_name": "Apple MPS",
+    }
+    assert client.get("/api/v1/health").json()["device"]["device_name"] == "Apple MPS"
+
+
+@pytest.mark.unit
+def test_status_reports_loader_snapshot(client):
+    body = client.get("/api/v1/status").json()
+    assert body["status"] == "processing"
+    assert body["current_model"] == "hrnet"
+    assert body["queue_length"] == 2
+    assert body["available"] is False
+
+
+@pytest.mark.unit
+class TestSegmentScheduling:
+    """/segment hands generic models to the micro-batching scheduler."""
+
+    class _StubScheduler:
+        def __init__(self, error=None):
+            self.error = error
+            self.calls = []
+
+        async def submit(self, image, model_name, threshold=0.5, detect_holes=True):
+            self.calls.append((image.width, model_name))
+            if self.error:
+                raise self.error
+            return {"polygons": [{"id": 0}], "image_size": {"width": image.width}}
+
+    def _post(self, client):
+        files = {"file": ("img.png", _png_bytes(8), "image/png")}
+        return client.post("/api/v1/segment", files=files, data={"model": "hrnet"})
+
+    def test_generic_model_goes_through_scheduler(self, client):
+        scheduler = self._StubScheduler()
+        client.app.state.inference_scheduler = scheduler
+
+        resp = self._post(client)
+        assert resp.status_code == 200, resp.text
+        assert scheduler.calls == [(8, "hrnet")]
+        assert resp.json()["success"] is True
+
+    def test_numpy_values_in_results_serialize(self, client):
+        """/segment responses go straight to orjson, numpy scalars included."""
+        import numpy as np
+
+        class _NumpyScheduler(self._StubScheduler):
+            async def submit(self, image, model_name, threshold=0.5, detect_holes=True):
+                return {"polygons": [{"confidence": np.float32(0.5), "area": np.int64(7)}]}
+
+        client.app.state.inference_scheduler = _NumpyScheduler()
+        resp = self._post(client)
+        assert resp.status_code == 200, resp.text
+        assert resp.json()["polygons"] == [{"confidence": 0.5, "area": 7}]
+
+    def test_segment_does_not_probe_cuda_per_request(self, client, monkeypatch):
+        import api.routes as routes
+
+        client.app.state.inference_scheduler = self._StubScheduler()
+        routes.device_info(client.app)  # probed once, as by the lifespan
+
+        def no_probe():
+            raise AssertionError("CUDA probed on the request path")
+
+        monkeypatch.setattr(routes.torch.cuda, "is_available", no_probe)
+        resp = self._post(client)
+        assert resp.status_code == 200, resp.text
+        assert resp.json()["gpu_enabled"] is client.app.state.device_info["gpu_available"]
+
+    def test_full_queue_is_a_503(self, client):
+        from ml.inference_scheduler import SchedulerFullError
+
+        client.app.state.inference_scheduler = self._StubScheduler(SchedulerFullError("full"))
+        resp = self._post(client)
+        assert resp.status_code == 503
+        assert resp.headers["retry-after"] == "1"
+
+    def test_timeouts_are_a_504_with_detail(self, client):
+        import api.routes as routes
+
+        client.app.state.inference_scheduler = self._StubScheduler(
+            routes.InferenceTimeoutError("hrnet", 30.0, (8, 8))
+        )
+        detail = self._post(client).json()["detail"]
+        assert detail["timeout"] == 30.0
+        assert detail["model"] == "hrnet"
+
+        client.app.state.inference_scheduler = self._StubScheduler(TimeoutError("slow"))
+        resp = self._post(client)
+        assert resp.status_code == 504
+        assert "timeout" not in resp.json()["detail"]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("fmt", ["PNG", "JPEG", "TIFF", "BMP"])
+def test_supported_formats_pass_signature_check(fmt):
+    from api.routes import has_image_signature
+
+    buf = io.BytesIO()
+    Image.new("RGB", (4, 4)).save(buf, format=fmt)
+    assert has_image_signature(buf.getvalue())
+
+
+@pytest.mark.unit
+def test_segment_rejects_non_image_content_with_400(client):
+    files = {"file": ("scan.png", b"GIF89a not what it claims", "image/png")}
+    resp = client.post("/api/v1/segment", files=files)
+    assert resp.status_code == 400
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("mode", ["RGB", "L", "I;16", "P"])
+def test_process_decoded_image_matches_thread_decode(mode):
+    from api.routes import _decode_image, _decode_image_raw, _rebuild_image
+
+    buf = io.BytesIO()
+    Image.new(mode, (6, 4), color=3).save(buf, format="PNG")
+    data = buf.getvalue()
+
+    expected = _decode_image(data)
+    rebuilt = _rebuild_image(*_decode_image_raw(data))
+    assert (rebuilt.mode, rebuilt.size) == (expected.mode, expected.size)
+    assert rebuilt.convert("RGB").tobytes() == expected.convert("RGB").tobytes()
+
+
+@pytest.mark.unit
+def test_large_uploads_decode_in_process_pool(client, loader, monkeypatch):
+    import api.routes as routes
+
+    monkeypatch.setattr(routes, "_PROCESS_DECODE_MIN_BYTES", 1)
+    try:
+        files = [("files", (f"img{w}.png", _png_bytes(w), "image/png")) for w in (8, 16)]
+        resp = client.post("/api/v1/batch-segment", files=files)
+        assert resp.status_code == 200, resp.text
+        assert routes._decode_pool is not None
+        assert [img.width for img in loader.calls[0]] == [8, 16]
+    finally:
+        routes.shutdown_decode_pool()
+
+
+@pytest.mark.unit
+def test_iso_now_formats_each_second_once(monkeypatch):
+    import api.routes as routes
+
+    clock = iter([1_700_000_000.1, 1_700_000_000.9, 1_700_000_001.2])
+    monkeypatch.setattr(routes.time, "time", lambda: next(clock))
+    formatted = []
+    real_datetime = routes.datetime
+
+    class _CountingDatetime:
+        @staticmethod
+        def fromtimestamp(ts):
+            formatted.append(ts)
+            return real_datetime.fromtimestamp(ts)
+
+    monkeypatch.setattr(routes, "datetime", _CountingDatetime)
+    monkeypatch.setattr(routes, "_iso_cache", (0, ""))
+
+    first, second, third = routes.iso_now(), routes.iso_now(), routes.iso_now()
+    assert first == second == real_datetime.fromtimestamp(1_700_000_000).isoformat()
+    assert third == real_datetime.fromtimestamp(1_700_000_001).isoformat()
+    assert formatted == [1_700_000_000, 1_700_000_001]
+
+
+@pytest.mark.unit
+def test_oversize_upload_is_a_413(client, monkeypatch):
+    import api.routes as routes
+
+    monkeypatch.setattr(routes, "_MAX_FILE_BYTES", 64)
+    files = {"file": ("scan.png", _png_bytes(64), "image/png")}
+    resp = client.post("/api/v1/segment", files=files)
+    assert resp.status_code == 413
+
+
+@pytest.mark.unit
+def test_oversize_batch_is_refused_before_any_read(client, loader, monkeypatch):
+    import api.routes as routes
+
+    reads = []
+
+    async def _tracking_read(file):
+        reads.append(file.filename)
+
+    monkeypatch.setattr(routes, "_read_and_decode", _tracking_read)
+    monkeypatch.setattr(routes, "_MAX_BATCH_BYTES", len(_png_bytes(8)) + 1)
+    files = [
+        ("files", ("a.png", _png_bytes(8), "image/png")),
+        ("files", ("b.png", _png_bytes(8), "image/png")),
+    ]
+    resp = client.post("/api/v1/batch-segment", files=files)
+    assert resp.status_code == 413
+    assert reads == []
+    assert loader.calls == []
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_read_capped_stops_unsized_streams_at_the_cap():
+    from fastapi import HTTPException
+    from starlette.datastructures import UploadFile
+
+    import api.routes as routes
+
+    upload = UploadFile(io.BytesIO(b"x" * (3 << 20)), filename="big.png")
+    assert upload.size is None
+    with pytest.raises(HTTPException) as exc:
+        await routes._read_capped(upload, 1 << 20)
+    assert exc.value.status_code == 413
+    assert upload.file.tell() < 3 << 20
+
+    small = UploadFile(io.BytesIO(b"abc"), filename="small.png")
+    assert await routes._read_capped(small, 1 << 20) == b"abc"
+
+
+@pytest.mark.unit
+def test_spooled_uploads_decode_from_mmap_without_a_read(client, loader, monkeypatch):
+    import api.routes as routes
+
+    async def _no_read(file, cap):
+        raise AssertionError("upload was read into memory")
+
+    monkeypatch.setattr(routes, "_MMAP_DECODE_MIN_BYTES", 1)
+    monkeypatch.setattr(routes, "_PROCESS_DECODE_MIN_BYTES", 0)
+    monkeypatch.setattr(routes, "_read_capped", _no_read)
+    files = [
+        ("files", ("a.png", _png_bytes(8), "image/png")),
+        ("files", ("b.png", _png_bytes(16), "image/png")),
+    ]
+    resp = client.post("/api/v1/batch-segment", files=files)
+    assert resp.status_code == 200
+    assert [img.width for img in loader.calls[0]] == [8, 16]
+
+    files = {"file": ("scan.png", b"GIF89a not what it claims", "image/png")}
+    assert client.post("/api/v1/segment", files=files).status_code == 400
+
+
+@pytest.mark.unit
+def test_models_are_cached_and_revalidated_with_etag(client, loader, monkeypatch):
+    import api.routes as routes
+
+    calls = []
+    loader.get_model_info = lambda: calls.append(1) or {"hrnet": {"name": "hrnet"}}
+    monkeypatch.setattr(routes, "_models_cache", (None, 0.0, "", b""))
+
+    first = client.get("/api/v1/models")
+    assert first.status_code == 200
+    assert first.json() == {"models": {"hrnet": {"name": "hrnet"}}}
+    etag = first.headers["etag"]
+
+    again = client.get("/api/v1/models", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+    assert client.get("/api/v1/models", headers={"If-None-Match": '"stale"'}).status_code == 200
+    assert len(calls) == 1
+
+
+@pytest.mark.unit
+def test_json_body_cache_rebuilds_only_on_key_change():
+    from api.routes import JSONBodyCache
+
+    builds = []
+    cache = JSONBodyCache()
+    build = lambda: builds.append(1) or {"n": len(builds)}
+    assert cache.get(("t0",), build) == b'{"n":1}'
+    assert cache.get(("t0",), build) == b'{"n":1}'
+    assert cache.get(("t1",), build) == b'{"n":2}'
+    assert len(builds) == 2
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_uploads_are_closed_once_decoded():
+    from starlette.datastructures import UploadFile
+
+    import api.routes as routes
+
+    good = UploadFile(io.BytesIO(_png_bytes(8)), filename="a.png")
+    assert (await routes._read_and_decode(good)).width == 8
+    assert good.file.closed
+
+    bad = UploadFile(io.BytesIO(b"not an image"), filename="b.png")
+    with pytest.raises(routes.InvalidImageError):
+        await routes._read_and_decode(bad)
+    assert bad.file.closed
@@ -143,13 +143,16 @@ def calculate_orthogonal_diameter(contour):
 
     return orthogonal_diameter
 
-def calculate_all(contour, hole_contours=None):
+def calculate_all(contour, hole_contours=None, return_hull_area=False):
     """
     Calculate all morphometric metrics for a contour
 
     Args:
         contour: Main contour (numpy array)
         hole_contours: Optional list of hole contours for perimeter calculation
+        return_hull_area: Also return the convex-hull area so callers that
+            re-derive Solidity (e.g. after subtracting holes) skip a second
+            convexHull pass. Returns ``(data, hull_area)`` when True.
     """
     area = calculate_area_from_contour(contour)
     perimeter = calculate_perimeter_from_contour(contour)
@@ -181,12 +184,14 @@ def calculate_all(contour, hole_contours=None):
     # these fragments, so this keeps the two reciprocal metrics consistent.
     compactness = max(1.0, calculate_compactness_from_contour(contour))
 
-    # Convexity uses perimeter with holes for boundary smoothness measure
+    # Convexity uses perimeter with holes for boundary smoothness measure.
+    # The same hull feeds Solidity (calculate_solidity_from_contour inlined).
     hull = cv2.convexHull(contour)
     hull_perimeter = cv2.arcLength(hull, True)
     convexity = hull_perimeter / perimeter_with_holes if perimeter_with_holes > 0 else 0
 
-    solidity = calculate_solidity_from_contour(contour)
+    hull_area = cv2.contourArea(hull)
+    solidity = area / hull_area if hull_area else 0
     sphericity = calculate_sphericity_from_contour(contour)
     extent = calculate_extent_from_contour(contour)
     bbox_width, bbox_height = calculate_bounding_box_dimensions(contour)
@@ -212,4 +217,6 @@ def calculate_all(contour, hole_contours=None):
         "BoundingBoxHeight": bbox_height
     }
 
+    if return_hull_area:
+        return data, hull_area
     return data
\ No newline at end of file